@@ -0,0 +1,14 @@
+"""Benchmarks for the toilet search SQL functions and ToiletService.
+
+Runs against a local, disposable PostGIS database:
+
+    make bench-db-up
+    python -m benchmarks.run --rows 10000 100000 1000000 --output bench/head.json
+    python -m benchmarks.compare bench/base.json bench/head.json
+
+Focused comparisons:
+
+    python -m benchmarks.nearest_geography --rows 1000000
+    python -m benchmarks.search_versions --rows 1000000
+    python -m benchmarks.import_time --runs 30     # no database needed
+"""
@@ -0,0 +1,76 @@
+"""Compare two benchmark result files (see ``benchmarks.run``).
+
+Prints head/base ratios for every dataset size and scenario present in both
+files and exits non-zero when a metric regressed by more than --threshold.
+
+Usage:
+    python -m benchmarks.compare bench/base.json bench/head.json --threshold 0.15
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# (metric, higher_is_better)
+METRICS = (
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+    ("rows_per_second", True),
+)
+
+
+def _runs_by_size(report: dict) -> Dict[int, Dict[str, dict]]:
+    return {run["rows"]: run["scenarios"] for run in report.get("runs", [])}
+
+
+def compare_reports(base: dict, head: dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """Return (report lines, regression lines)."""
+    lines: List[str] = []
+    regressions: List[str] = []
+    base_runs = _runs_by_size(base)
+    for rows, head_scenarios in _runs_by_size(head).items():
+        base_scenarios = base_runs.get(rows)
+        if base_scenarios is None:
+            continue
+        for name, head_summary in head_scenarios.items():
+            base_summary = base_scenarios.get(name)
+            if base_summary is None:
+                continue
+            for metric, higher_is_better in METRICS:
+                old, new = base_summary.get(metric), head_summary.get(metric)
+                if not old or new is None:
+                    continue
+                ratio = new / old
+                change = ratio - 1 if not higher_is_better else 1 - ratio
+                line = f"{rows:>9} {name:<18} {metric:<16} {old:>12.3f} -> {new:>12.3f}  ({ratio:.2f}x)"
+                if change > threshold:
+                    line += "  REGRESSION"
+                    regressions.append(line)
+                lines.append(line)
+    return lines, regressions
+
+
+def main(argv=None):
+    """Entry point for python -m benchmarks.compare."""
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base", type=Path, help="Baseline results JSON")
+    parser.add_argument("head", type=Path, help="New results JSON")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown counted as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    lines, regressions = compare_reports(base, head, args.threshold)
+    print(f"base {base['environment'].get('git_commit')} vs head {head['environment'].get('git_commit')}")
+    for line in lines:
+        print(line)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
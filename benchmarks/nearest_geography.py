@@ -0,0 +1,188 @@
+"""Geometry vs geography search path for find_nearest_toilets.
+
+Compares the pre-9f3d2b7a6c14 query (``ST_DWithin(geom, point::geography)``,
+ordered by planar ``geom <-> point``) with the current function (radius
+filter and KNN order on the ``geog`` GiST index):
+
+* correctness: both are checked against an exact reference (every toilet
+  within the radius sorted by geography distance). The new function must
+  match it exactly; the legacy query can differ where degree distance and
+  meter distance disagree on the order;
+* latency percentiles for the same workload;
+* EXPLAIN (ANALYZE, BUFFERS) of both bodies at an urban and a rural point.
+
+Usage:
+    python -m benchmarks.nearest_geography --rows 1000000 --output bench/nearest_geography.json
+"""
+import argparse
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from db.services import FIND_NEAREST_TOILETS_SQL
+
+from .run import add_common_arguments, environment, load_dataset, open_engine, time_calls, write_report
+from .synthetic import query_points
+
+RADIUS_METERS = 5000
+RESULT_LIMIT = 20
+
+# Explain points: dense city center and a sparse alpine valley
+EXPLAIN_POINTS = {
+    "urban": (47.3769, 8.5417),
+    "rural": (46.62, 9.92),
+}
+
+# Body of find_nearest_toilets before migration 9f3d2b7a6c14
+LEGACY_NEAREST_SQL = """
+    SELECT t.id, ST_Distance(t.geom, ST_SetSRID(ST_MakePoint(:user_lng, :user_lat), 4326)::geography) AS distance
+    FROM toilet_location t
+    WHERE ST_DWithin(t.geom, ST_SetSRID(ST_MakePoint(:user_lng, :user_lat), 4326)::geography, :radius_meters)
+    ORDER BY t.geom <-> ST_SetSRID(ST_MakePoint(:user_lng, :user_lat), 4326)
+    LIMIT :result_limit
+"""
+
+# Body of the current find_nearest_toilets
+GEOGRAPHY_NEAREST_SQL = """
+    SELECT k.id, k.distance
+    FROM (
+        SELECT t.id, ST_Distance(t.geog, ST_SetSRID(ST_MakePoint(:user_lng, :user_lat), 4326)::geography) AS distance
+        FROM toilet_location t
+        WHERE ST_DWithin(t.geog, ST_SetSRID(ST_MakePoint(:user_lng, :user_lat), 4326)::geography, :radius_meters)
+        ORDER BY t.geog <-> ST_SetSRID(ST_MakePoint(:user_lng, :user_lat), 4326)::geography
+        LIMIT :result_limit
+    ) k
+    ORDER BY k.distance, k.id
+"""
+
+# Exact answer: every toilet in range, sorted by geography distance (no KNN)
+REFERENCE_NEAREST_SQL = """
+    SELECT t.id, ST_Distance(t.geom::geography, ST_SetSRID(ST_MakePoint(:user_lng, :user_lat), 4326)::geography) AS distance
+    FROM toilet_location t
+    WHERE t.geom IS NOT NULL
+      AND ST_Distance(t.geom::geography, ST_SetSRID(ST_MakePoint(:user_lng, :user_lat), 4326)::geography) <= :radius_meters
+    ORDER BY distance, t.id
+    LIMIT :result_limit
+"""
+
+
+def _bind(lat: float, lng: float) -> dict:
+    return {
+        "user_lat": lat, "user_lng": lng, "radius_meters": RADIUS_METERS, "result_limit": RESULT_LIMIT, "open_at": None,
+    }
+
+
+def _ids(connection: Connection, sql: str, bind: dict) -> List[str]:
+    return [str(row.id) for row in connection.execute(text(sql), bind)]
+
+
+def check_results(connection: Connection, points: Sequence[Tuple[float, float]]) -> Dict[str, int]:
+    """Count queries whose results match the exact reference."""
+    counts = {"queries": len(points), "geography_matches_reference": 0, "legacy_matches_reference": 0,
+              "legacy_same_set_other_order": 0}
+    for lat, lng in points:
+        bind = _bind(lat, lng)
+        reference = _ids(connection, REFERENCE_NEAREST_SQL, bind)
+        geography = [str(row.id) for row in connection.execute(FIND_NEAREST_TOILETS_SQL, bind)]
+        legacy = _ids(connection, LEGACY_NEAREST_SQL, bind)
+        counts["geography_matches_reference"] += geography == reference
+        counts["legacy_matches_reference"] += legacy == reference
+        counts["legacy_same_set_other_order"] += legacy != reference and sorted(legacy) == sorted(reference)
+    return counts
+
+
+def _plan_summary(plan: dict) -> Dict[str, object]:
+    """Node types (depth first), index usage and buffer counts of an EXPLAIN (FORMAT JSON) plan."""
+    nodes, indexes, index_conditions, removed_by_filter = [], set(), [], 0
+    stack = [plan["Plan"]]
+    while stack:
+        node = stack.pop()
+        target = node.get("Relation Name") or node.get("Function Name")
+        nodes.append(f"{node['Node Type']} on {target}" if target else node["Node Type"])
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+        if "Index Cond" in node:
+            index_conditions.append(node["Index Cond"])
+        removed_by_filter += node.get("Rows Removed by Filter", 0)
+        stack.extend(reversed(node.get("Plans", [])))
+    root = plan["Plan"]
+    return {
+        "execution_ms": plan.get("Execution Time"),
+        "nodes": nodes,
+        "indexes": sorted(indexes),
+        "index_conditions": index_conditions,
+        "rows_removed_by_filter": removed_by_filter,
+        "shared_hit_blocks": root.get("Shared Hit Blocks"),
+        "shared_read_blocks": root.get("Shared Read Blocks"),
+    }
+
+
+def explain(connection: Connection, sql: str, bind: dict) -> Dict[str, object]:
+    plan = connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), bind).scalar_one()[0]
+    summary = _plan_summary(plan)
+    summary["plan"] = [row[0] for row in connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), bind)]
+    return summary
+
+
+def main(argv=None):
+    """Entry point for python -m benchmarks.nearest_geography."""
+    parser = argparse.ArgumentParser(description="Compare the geometry and geography find_nearest_toilets paths.")
+    add_common_arguments(parser)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Dataset size (default 1000000)")
+    args = parser.parse_args(argv)
+
+    engine = open_engine(parser, args)
+    try:
+        load_dataset(engine, args.rows, args)
+        points = query_points(args.warmup + args.queries, args.seed)
+        binds = [_bind(lat, lng) for lat, lng in points]
+        with engine.connect() as connection:
+            correctness = check_results(connection, points[args.warmup:])
+            latency = {
+                "legacy": time_calls(
+                    lambda bind: len(connection.execute(text(LEGACY_NEAREST_SQL), bind).all()), binds, args.warmup
+                ),
+                "geography": time_calls(
+                    lambda bind: len(connection.execute(FIND_NEAREST_TOILETS_SQL, bind).all()), binds, args.warmup
+                ),
+            }
+            plans = {
+                name: {
+                    "legacy": explain(connection, LEGACY_NEAREST_SQL, _bind(lat, lng)),
+                    "geography": explain(connection, GEOGRAPHY_NEAREST_SQL, _bind(lat, lng)),
+                }
+                for name, (lat, lng) in EXPLAIN_POINTS.items()
+            }
+        report = {
+            "environment": environment(engine, args),
+            "rows": args.rows,
+            "radius_meters": RADIUS_METERS,
+            "result_limit": RESULT_LIMIT,
+            "correctness": correctness,
+            "latency": latency,
+            "explain": plans,
+        }
+    finally:
+        engine.dispose()
+
+    print(
+        f"geography matches reference: {correctness['geography_matches_reference']}/{correctness['queries']}, "
+        f"legacy: {correctness['legacy_matches_reference']}/{correctness['queries']} "
+        f"({correctness['legacy_same_set_other_order']} same rows in planar order)"
+    )
+    for name, summary in latency.items():
+        print(f"{name}: p50 {summary['p50_ms']:.2f} ms, p95 {summary['p95_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+    for point, variants in plans.items():
+        for name, summary in variants.items():
+            print(
+                f"{point} {name}: {summary['execution_ms']} ms, indexes {summary['indexes']}, "
+                f"{summary['rows_removed_by_filter']} rows removed by filter, "
+                f"{summary['shared_hit_blocks']} hit / {summary['shared_read_blocks']} read blocks"
+            )
+    write_report(report, args.output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""v3 (plpgsql) vs v4 (inlinable sql) search functions.
+
+For each search (nearest, in view, in country, deterministic) both versions
+run the same workload and are compared on:
+
+* results: same rows (in order where the function defines one);
+* latency percentiles;
+* plan shape: EXPLAIN (ANALYZE, BUFFERS) node types and indexes. A v3 call
+  is an opaque Function Scan; an inlined v4 call plans the table access
+  directly.
+
+``--log-searches`` turns the toilet_radar.log_searches GUC on for the v4
+runs to measure the cost of opting into logging.
+
+Usage:
+    python -m benchmarks.search_versions --rows 1000000 --output bench/search_versions.json
+"""
+import argparse
+from typing import Callable, Dict, List, Sequence
+
+from sqlalchemy import TextClause, text
+from sqlalchemy.engine import Connection
+
+from db.models import NearestToiletsParams
+from db.services import (
+    SEARCH_STATEMENTS,
+    SearchVersion,
+    nearest_toilets_bind,
+    toilets_in_view_bind,
+)
+
+from .nearest_geography import explain
+from .run import (
+    DETERMINISTIC_V3_SQL,
+    add_common_arguments,
+    environment,
+    load_dataset,
+    open_engine,
+    time_calls,
+    write_report,
+)
+from .synthetic import query_points, viewports
+
+DETERMINISTIC_V4_SQL = text("""
+    SELECT id, name, lat, lng, accessible, open_hours, address, created_at
+    FROM get_toilets_deterministic_v4(:center_lat, :center_lng, NULL, NULL, :is_zoomed_in, :result_limit)
+""")
+
+INFER_COUNTRY_SQL = text("SELECT infer_country_code(:center_lat, :center_lng)")
+
+# Whether each search defines a row order. find_toilets_in_view does not, so
+# views holding more than max_results toilets may legitimately differ.
+ORDERED = {"nearest": True, "in_view": False, "in_country": True, "deterministic": True}
+
+
+def workloads(connection: Connection, count: int, seed: int) -> Dict[str, List[dict]]:
+    """Bind parameters per search."""
+    centers = [
+        {"center_lat": lat, "center_lng": lng, "is_zoomed_in": i % 2 == 0, "result_limit": 1000}
+        for i, (lat, lng) in enumerate(query_points(count, seed + 2))
+    ]
+    # The service resolves the country before get_toilets_in_country; do it up front
+    in_country = [
+        {**bind, "country_code": connection.execute(INFER_COUNTRY_SQL, bind).scalar_one()} for bind in centers
+    ]
+    return {
+        "nearest": [
+            nearest_toilets_bind(NearestToiletsParams(user_lat=lat, user_lng=lng, radius_meters=5000, result_limit=20))
+            for lat, lng in query_points(count, seed)
+        ],
+        "in_view": [toilets_in_view_bind(params) for params in viewports(count, seed)],
+        "in_country": in_country,
+        "deterministic": centers,
+    }
+
+
+def statements() -> Dict[str, Dict[str, TextClause]]:
+    v3, v4 = SEARCH_STATEMENTS[SearchVersion.V3], SEARCH_STATEMENTS[SearchVersion.V4]
+    return {
+        "nearest": {"v3": v3.nearest, "v4": v4.nearest},
+        "in_view": {"v3": v3.in_view, "v4": v4.in_view},
+        "in_country": {"v3": v3.in_country, "v4": v4.in_country},
+        "deterministic": {"v3": DETERMINISTIC_V3_SQL, "v4": DETERMINISTIC_V4_SQL},
+    }
+
+
+def _ids(connection: Connection, statement: TextClause, bind: dict, ordered: bool) -> List[str]:
+    ids = [str(row.id) for row in connection.execute(statement, bind)]
+    return ids if ordered else sorted(ids)
+
+
+def check_results(
+    connection: Connection, pairs: Dict[str, Dict[str, TextClause]], binds: Dict[str, Sequence[dict]]
+) -> Dict[str, Dict[str, int]]:
+    """Count calls where v4 returns the same rows as v3."""
+    counts = {}
+    for search, pair in pairs.items():
+        ordered = ORDERED[search]
+        matches = sum(
+            _ids(connection, pair["v3"], bind, ordered) == _ids(connection, pair["v4"], bind, ordered)
+            for bind in binds[search]
+        )
+        counts[search] = {"queries": len(binds[search]), "matches": matches}
+    return counts
+
+
+def set_logging(connection: Connection, enabled: bool) -> None:
+    connection.execute(text("SELECT set_config('toilet_radar.log_searches', :value, false)"),
+                       {"value": "on" if enabled else "off"})
+
+
+def main(argv=None):
+    """Entry point for python -m benchmarks.search_versions."""
+    parser = argparse.ArgumentParser(description="Compare the v3 and v4 search functions.")
+    add_common_arguments(parser)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Dataset size (default 1000000)")
+    parser.add_argument("--log-searches", action="store_true",
+                        help="Run v4 with toilet_radar.log_searches = on")
+    args = parser.parse_args(argv)
+
+    engine = open_engine(parser, args)
+    try:
+        load_dataset(engine, args.rows, args)
+        pairs = statements()
+        with engine.connect() as connection:
+            binds = workloads(connection, args.warmup + args.queries, args.seed)
+            correctness = check_results(connection, pairs, {name: b[args.warmup:] for name, b in binds.items()})
+            latency: Dict[str, Dict[str, Dict[str, float]]] = {}
+            plans: Dict[str, Dict[str, Dict[str, object]]] = {}
+            for search, pair in pairs.items():
+                latency[search], plans[search] = {}, {}
+                for version, statement in pair.items():
+                    set_logging(connection, version == "v4" and args.log_searches)
+                    call: Callable[[dict], int] = (
+                        lambda bind, statement=statement: len(connection.execute(statement, bind).all())
+                    )
+                    latency[search][version] = time_calls(call, binds[search], args.warmup)
+                    plans[search][version] = explain(connection, statement.text, binds[search][args.warmup])
+            set_logging(connection, False)
+        report = {
+            "environment": environment(engine, args),
+            "rows": args.rows,
+            "log_searches": args.log_searches,
+            "correctness": correctness,
+            "latency": latency,
+            "explain": plans,
+        }
+    finally:
+        engine.dispose()
+
+    for search, counts in correctness.items():
+        print(f"{search}: v4 matches v3 on {counts['matches']}/{counts['queries']}")
+    for search, versions in latency.items():
+        for version, summary in versions.items():
+            print(
+                f"{search} {version}: p50 {summary['p50_ms']:.2f} ms, p95 {summary['p95_ms']:.2f} ms, "
+                f"p99 {summary['p99_ms']:.2f} ms; plan {' > '.join(plans[search][version]['nodes'][:4])}"
+            )
+    write_report(report, args.output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Deterministic synthetic toilet datasets with national-scale densities.
+
+Rows are split across the ``CountryCode`` countries in proportion to their
+real-world OSM toilet counts. Within a country most toilets cluster around
+cities (Gaussian spread scaled by city size) and the rest are scattered
+over the country's bounding box, which gives the dense-urban / sparse-rural
+mix the search functions see in production.
+
+The same (rows, seed) always yields the same rows in the same order.
+"""
+import random
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from db.models import CountryCode, ToiletCreate, ToiletsInViewParams
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+# Share of toilets placed around cities; the rest is spread uniformly
+URBAN_SHARE = 0.75
+
+
+@dataclass(frozen=True)
+class City:
+    name: str
+    lat: float
+    lng: float
+    weight: float
+    postcode: str
+
+
+@dataclass(frozen=True)
+class CountryProfile:
+    code: CountryCode
+    bbox: BBox
+    weight: float  # relative number of toilets
+    cities: Tuple[City, ...]
+
+
+COUNTRY_PROFILES = (
+    CountryProfile(CountryCode.CH, (45.82, 5.96, 47.81, 10.49), 0.12, (
+        City("Zürich", 47.3769, 8.5417, 4.2, "8001"),
+        City("Genève", 46.2044, 6.1432, 2.0, "1201"),
+        City("Basel", 47.5596, 7.5886, 1.7, "4051"),
+        City("Lausanne", 46.5197, 6.6323, 1.4, "1003"),
+        City("Bern", 46.9480, 7.4474, 1.4, "3011"),
+        City("Luzern", 47.0502, 8.3093, 0.8, "6003"),
+        City("St. Gallen", 47.4245, 9.3767, 0.8, "9000"),
+        City("Lugano", 46.0037, 8.9511, 0.6, "6900"),
+    )),
+    CountryProfile(CountryCode.FR, (42.33, -4.79, 51.09, 8.23), 0.30, (
+        City("Paris", 48.8566, 2.3522, 11.0, "75001"),
+        City("Lyon", 45.7640, 4.8357, 2.3, "69001"),
+        City("Marseille", 43.2965, 5.3698, 1.9, "13001"),
+        City("Toulouse", 43.6047, 1.4442, 1.4, "31000"),
+        City("Bordeaux", 44.8378, -0.5792, 1.3, "33000"),
+        City("Lille", 50.6292, 3.0573, 1.2, "59000"),
+        City("Nantes", 47.2184, -1.5536, 1.0, "44000"),
+        City("Strasbourg", 48.5734, 7.7521, 0.8, "67000"),
+    )),
+    CountryProfile(CountryCode.DE, (47.27, 5.87, 55.06, 15.04), 0.33, (
+        City("Berlin", 52.5200, 13.4050, 6.0, "10115"),
+        City("Hamburg", 53.5511, 9.9937, 3.0, "20095"),
+        City("München", 48.1351, 11.5820, 2.9, "80331"),
+        City("Köln", 50.9375, 6.9603, 2.2, "50667"),
+        City("Frankfurt am Main", 50.1109, 8.6821, 1.8, "60311"),
+        City("Stuttgart", 48.7758, 9.1829, 1.6, "70173"),
+        City("Düsseldorf", 51.2277, 6.7735, 1.3, "40213"),
+        City("Leipzig", 51.3397, 12.3731, 1.1, "04109"),
+        City("Dresden", 51.0504, 13.7373, 1.0, "01067"),
+    )),
+    CountryProfile(CountryCode.IT, (36.62, 6.63, 47.09, 18.52), 0.17, (
+        City("Roma", 41.9028, 12.4964, 4.3, "00184"),
+        City("Milano", 45.4642, 9.1900, 3.2, "20121"),
+        City("Napoli", 40.8518, 14.2681, 2.2, "80132"),
+        City("Torino", 45.0703, 7.6869, 1.7, "10121"),
+        City("Firenze", 43.7696, 11.2558, 1.0, "50122"),
+        City("Bologna", 44.4949, 11.3426, 1.0, "40121"),
+        City("Palermo", 38.1157, 13.3615, 1.0, "90133"),
+        City("Venezia", 45.4408, 12.3155, 0.6, "30121"),
+    )),
+    CountryProfile(CountryCode.AT, (46.37, 9.53, 49.02, 17.16), 0.08, (
+        City("Wien", 48.2082, 16.3738, 5.0, "1010"),
+        City("Graz", 47.0707, 15.4395, 0.9, "8010"),
+        City("Linz", 48.3069, 14.2858, 0.7, "4020"),
+        City("Salzburg", 47.8095, 13.0550, 0.6, "5020"),
+        City("Innsbruck", 47.2692, 11.4041, 0.5, "6020"),
+    )),
+)
+
+NAMES = (
+    "Public Toilet", "WC", "Toilettes publiques", "Öffentliche Toilette",
+    "Bagni pubblici", "Bahnhof WC", "Park WC", "Toilette",
+)
+STREETS = (
+    "Bahnhofstrasse", "Hauptstrasse", "Rue de la Gare", "Via Roma",
+    "Marktplatz", "Place du Marché", "Kirchgasse", "Corso Italia",
+)
+OPEN_HOURS = (None, None, "24/7", "Mo-Su 06:00-22:00", "Mo-Fr 08:00-18:00; Sa 09:00-14:00")
+TYPES = ("Unknown", "Unknown", "Position: inside", "Position: outside")
+
+
+def country_row_counts(rows: int) -> List[Tuple[CountryProfile, int]]:
+    """Split rows across countries by weight (largest remainder)."""
+    total_weight = sum(profile.weight for profile in COUNTRY_PROFILES)
+    shares = [rows * profile.weight / total_weight for profile in COUNTRY_PROFILES]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in by_remainder[: rows - sum(counts)]:
+        counts[i] += 1
+    return list(zip(COUNTRY_PROFILES, counts))
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return min(max(value, low), high)
+
+
+def _sample_point(rng: random.Random, profile: CountryProfile) -> Tuple[float, float, Optional[City]]:
+    """One (lat, lng) from the country's urban/rural mixture."""
+    min_lat, min_lng, max_lat, max_lng = profile.bbox
+    if rng.random() < URBAN_SHARE:
+        city = rng.choices(profile.cities, weights=[city.weight for city in profile.cities])[0]
+        # Bigger cities sprawl further: ~2.5 km sigma at weight 1
+        sigma = 0.0225 * city.weight ** 0.5
+        lat = _clamp(rng.gauss(city.lat, sigma), min_lat, max_lat)
+        lng = _clamp(rng.gauss(city.lng, sigma * 1.4), min_lng, max_lng)
+        return lat, lng, city
+    return rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng), None
+
+
+def generate_toilets(rows: int, seed: int = 42) -> Iterator[ToiletCreate]:
+    """Yield rows synthetic toilets, country by country.
+
+    osm_id is unique across the dataset so OSM sync paths can be exercised.
+    """
+    osm_id = 1
+    for profile, count in country_row_counts(rows):
+        rng = random.Random(f"{seed}:{profile.code.value}")
+        for _ in range(count):
+            lat, lng, city = _sample_point(rng, profile)
+            address = None
+            if city is not None and rng.random() < 0.6:
+                address = f"{rng.choice(STREETS)} {rng.randint(1, 120)} {city.postcode} {city.name}"
+            # model_construct skips validation: the values are valid by construction
+            yield ToiletCreate.model_construct(
+                name=rng.choice(NAMES),
+                lat=round(lat, 7),
+                lng=round(lng, 7),
+                accessible=rng.choices((None, True, False), weights=(0.45, 0.35, 0.20))[0],
+                open_hours=rng.choice(OPEN_HOURS),
+                address=address,
+                rating=None,
+                is_free=rng.choices((None, True, False), weights=(0.40, 0.45, 0.15))[0],
+                type=rng.choice(TYPES),
+                status="in Betrieb" if rng.random() < 0.97 else "Disused",
+                notes=None,
+                city=city.name if city is not None else None,
+                country_code=profile.code,
+                osm_id=osm_id,
+                osm_version=1,
+            )
+            osm_id += 1
+
+
+def query_points(count: int, seed: int = 42) -> List[Tuple[float, float]]:
+    """Query locations drawn from the same mixture as the data (users are where toilets are)."""
+    rng = random.Random(f"{seed}:queries")
+    profiles: Sequence[CountryProfile] = COUNTRY_PROFILES
+    weights = [profile.weight for profile in profiles]
+    points = []
+    for _ in range(count):
+        profile = rng.choices(profiles, weights=weights)[0]
+        lat, lng, _ = _sample_point(rng, profile)
+        points.append((lat, lng))
+    return points
+
+
+def viewports(
+    count: int,
+    seed: int = 42,
+    spans: Sequence[float] = (0.01, 0.05, 0.2, 1.0),
+    max_results: int = 1000,
+) -> List[ToiletsInViewParams]:
+    """Map viewports (street level to region level) centered on query points."""
+    rng = random.Random(f"{seed}:viewports")
+    views = []
+    for lat, lng in query_points(count, seed + 1):
+        half_lat = rng.choice(spans) / 2
+        half_lng = half_lat * 1.5
+        views.append(ToiletsInViewParams(
+            min_lat=lat - half_lat,
+            min_lng=lng - half_lng,
+            max_lat=lat + half_lat,
+            max_lng=lng + half_lng,
+            max_results=max_results,
+        ))
+    return views
@@ -0,0 +1,349 @@
+"""Chunked, resumable backfills for large tables.
+
+A backfill walks a table in primary-key order and applies one statement to
+each chunk of keys, so no single statement holds row locks or writes WAL
+for the whole table. Each chunk runs as one statement that also upserts its
+progress into ``backfill_checkpoint``: a chunk and its checkpoint commit
+together, and an interrupted run resumes after the last committed key.
+
+The statement of a backfill is a data-modifying query over the ``chunk``
+CTE (one ``key`` column) that returns one row per row changed, e.g.::
+
+    UPDATE toilet_location t SET ...
+    FROM chunk WHERE t.id = chunk.key AND ...
+    RETURNING t.id
+
+Migrations call ``run_in_migration`` (chunks commit outside the migration
+transaction; ``--sql`` mode emits one full statement instead); other
+callers use ``run_backfill`` on an AUTOCOMMIT connection.
+
+Usage:
+    db-backfill --list
+    db-backfill toilet_location_geom --chunk-size 5000 --pause 0.2
+    db-backfill toilets_to_toilet_location --rows-per-second 20000
+    db-backfill toilets_to_toilet_location --restart
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+# Keep in sync with BackfillCheckpoint (db.models) and migration 6c0e4b9d2f17
+CHECKPOINT_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS backfill_checkpoint (
+        name character varying PRIMARY KEY,
+        last_key character varying,
+        rows bigint NOT NULL DEFAULT 0,
+        chunks integer NOT NULL DEFAULT 0,
+        started_at timestamp with time zone DEFAULT now(),
+        updated_at timestamp with time zone DEFAULT now(),
+        completed_at timestamp with time zone
+    )
+"""
+
+
+@dataclass(frozen=True)
+class Backfill:
+    """A chunked data change: ``statement`` applied to ``table`` in ``key`` order."""
+    name: str
+    table: str
+    statement: str
+    key: str = "id"
+    key_type: str = "uuid"
+    description: str = ""
+
+
+@dataclass
+class BackfillStats:
+    """Result of a backfill run."""
+    name: str
+    rows: int = 0
+    chunks: int = 0
+    last_key: Optional[str] = None
+    completed: bool = False
+    skipped: bool = False
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def chunk_sql(backfill: Backfill, resume: bool) -> str:
+    """One chunk after :after_key (or from the start), applied and checkpointed in one statement."""
+    after = f"WHERE {backfill.key} > CAST(:after_key AS {backfill.key_type})" if resume else ""
+    return f"""
+        WITH chunk AS (
+            SELECT {backfill.key} AS key FROM {backfill.table}
+            {after}
+            ORDER BY {backfill.key}
+            LIMIT :chunk_size
+        ), tail AS (
+            SELECT key::text AS key FROM chunk ORDER BY chunk.key DESC LIMIT 1
+        ), applied AS (
+            {backfill.statement}
+        ), checkpoint AS (
+            INSERT INTO backfill_checkpoint AS c (name, last_key, rows, chunks, updated_at)
+            SELECT :name, tail.key, (SELECT count(*) FROM applied), 1, now() FROM tail
+            ON CONFLICT (name) DO UPDATE SET
+                last_key = EXCLUDED.last_key,
+                rows = c.rows + EXCLUDED.rows,
+                chunks = c.chunks + 1,
+                updated_at = EXCLUDED.updated_at,
+                completed_at = NULL
+        )
+        SELECT (SELECT key FROM tail) AS last_key,
+               (SELECT count(*) FROM applied) AS rows
+    """
+
+
+def full_sql(backfill: Backfill) -> str:
+    """The whole backfill as one statement (offline migrations)."""
+    return f"""
+        WITH chunk AS (SELECT {backfill.key} AS key FROM {backfill.table})
+        {backfill.statement}
+    """
+
+
+def get_checkpoint(connection: Connection, name: str):
+    """Checkpoint row of a backfill, or None."""
+    return connection.execute(
+        text("SELECT * FROM backfill_checkpoint WHERE name = :name"), {"name": name}
+    ).one_or_none()
+
+
+def reset_checkpoint(connection: Connection, name: str) -> None:
+    """Forget the progress of a backfill, so the next run starts over."""
+    connection.execute(text("DELETE FROM backfill_checkpoint WHERE name = :name"), {"name": name})
+
+
+def _table_exists(connection: Connection, table: str) -> bool:
+    return connection.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar_one()
+
+
+def run_backfill(
+    connection: Connection,
+    backfill: Backfill,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    pause: float = 0.0,
+    rows_per_second: Optional[float] = None,
+    max_chunks: Optional[int] = None,
+    progress: Optional[Callable[[BackfillStats], None]] = None,
+) -> BackfillStats:
+    """Run (or resume) a backfill chunk by chunk.
+
+    ``connection`` should be in AUTOCOMMIT so every chunk commits on its own.
+    An unfinished run resumes after its checkpoint; a completed one starts
+    over. Between chunks the run sleeps ``pause`` seconds, and longer if
+    needed to stay under ``rows_per_second``. ``max_chunks`` bounds this
+    run; the next one resumes from the checkpoint.
+    """
+    stats = BackfillStats(name=backfill.name)
+    started = time.perf_counter()
+    if not _table_exists(connection, backfill.table):
+        stats.skipped = True
+        return stats
+    connection.execute(text(CHECKPOINT_TABLE_SQL))
+
+    checkpoint = get_checkpoint(connection, backfill.name)
+    if checkpoint is not None and checkpoint.completed_at is not None:
+        # Only unfinished runs resume; a finished backfill runs again in full
+        reset_checkpoint(connection, backfill.name)
+        checkpoint = None
+    stats.last_key = checkpoint.last_key if checkpoint else None
+    statements = {resume: text(chunk_sql(backfill, resume)) for resume in (False, True)}
+    while max_chunks is None or stats.chunks < max_chunks:
+        chunk_started = time.perf_counter()
+        row = connection.execute(
+            statements[stats.last_key is not None],
+            {"name": backfill.name, "after_key": stats.last_key, "chunk_size": chunk_size},
+        ).one()
+        if row.last_key is None:
+            stats.completed = True
+            break
+        stats.last_key = row.last_key
+        stats.rows += row.rows
+        stats.chunks += 1
+        if progress:
+            progress(stats)
+
+        wait = pause
+        if rows_per_second:
+            wait = max(wait, row.rows / rows_per_second - (time.perf_counter() - chunk_started))
+        if wait > 0:
+            time.sleep(wait)
+
+    if stats.completed:
+        connection.execute(text("""
+            INSERT INTO backfill_checkpoint AS c (name, last_key, completed_at)
+            VALUES (:name, :last_key, now())
+            ON CONFLICT (name) DO UPDATE SET completed_at = now()
+        """), {"name": backfill.name, "last_key": stats.last_key})
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def run_in_migration(backfill: Backfill, **options) -> Optional[BackfillStats]:
+    """Run a backfill from an Alembic migration.
+
+    The migration transaction so far is committed and the chunks run in
+    autocommit. In offline (--sql) mode the backfill is emitted as one
+    statement instead.
+    """
+    from alembic import context, op
+
+    if context.is_offline_mode():
+        op.execute(full_sql(backfill))
+        return None
+    with op.get_context().autocommit_block():
+        return run_backfill(op.get_bind(), backfill, **options)
+
+
+# Rows created before the geometry trigger: touching lat fires
+# update_toilet_location_geom, which sets geom and its derived columns
+TOILET_LOCATION_GEOM = Backfill(
+    name="toilet_location_geom",
+    table="toilet_location",
+    statement="""
+        UPDATE toilet_location t SET lat = t.lat
+        FROM chunk
+        WHERE t.id = chunk.key AND t.lat IS NOT NULL AND t.lng IS NOT NULL AND t.geom IS NULL
+        RETURNING t.id
+    """,
+    description="Fill geometry columns from lat/lng where geom is missing",
+)
+
+# Legacy rows keep their id, so re-runs and overlapping runs are no-ops.
+# Toilets present in both tables under different ids are left to db-dedup.
+TOILETS_TO_TOILET_LOCATION = Backfill(
+    name="toilets_to_toilet_location",
+    table="toilets",
+    statement="""
+        INSERT INTO toilet_location (
+            id, name, lat, lng, accessible, open_hours, address, rating,
+            is_free, type, status, notes, city, country_code, created_at
+        )
+        SELECT s.id, s.name, s.lat, s.lng, s.accessible, s.open_hours, s.address, s.rating,
+               s.is_free, s.type, s.status, s.notes, s.city, s.country_code::text::countrycode,
+               coalesce(s.created_at, now())
+        FROM toilets s
+        JOIN chunk ON s.id = chunk.key
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id
+    """,
+    description="Copy the legacy toilets table into toilet_location",
+)
+
+# Recompile opening hours, e.g. after toilet_open_minutes learns new syntax
+TOILET_LOCATION_OPEN_MINUTES = Backfill(
+    name="toilet_location_open_minutes",
+    table="toilet_location",
+    statement="""
+        UPDATE toilet_location t SET open_minutes = toilet_open_minutes(t.open_hours)
+        FROM chunk
+        WHERE t.id = chunk.key AND t.open_minutes IS DISTINCT FROM toilet_open_minutes(t.open_hours)
+        RETURNING t.id
+    """,
+    description="Compile open_hours into open_minutes",
+)
+
+# Geography copy of geom for the radius searches (migration 9f3d2b7a6c14)
+TOILET_LOCATION_GEOG = Backfill(
+    name="toilet_location_geog",
+    table="toilet_location",
+    statement="""
+        UPDATE toilet_location t SET geog = t.geom::geography
+        FROM chunk
+        WHERE t.id = chunk.key AND t.geom IS NOT NULL AND t.geog IS NULL
+        RETURNING t.id
+    """,
+    description="Fill geog from geom where geog is missing",
+)
+
+# Quadkey of the position for the density cells (migration d2a7c5e18b40)
+TOILET_LOCATION_QUADKEY = Backfill(
+    name="toilet_location_quadkey",
+    table="toilet_location",
+    statement="""
+        UPDATE toilet_location t SET quadkey = toilet_quadkey(t.lat, t.lng)
+        FROM chunk
+        WHERE t.id = chunk.key AND t.lat IS NOT NULL AND t.lng IS NOT NULL AND t.quadkey IS NULL
+        RETURNING t.id
+    """,
+    description="Fill quadkey from lat/lng where quadkey is missing",
+)
+
+BACKFILLS: Dict[str, Backfill] = {
+    backfill.name: backfill
+    for backfill in (
+        TOILET_LOCATION_GEOM, TOILETS_TO_TOILET_LOCATION, TOILET_LOCATION_OPEN_MINUTES, TOILET_LOCATION_GEOG,
+        TOILET_LOCATION_QUADKEY,
+    )
+}
+
+
+def main(argv=None):
+    """Entry point for the db-backfill script."""
+    parser = argparse.ArgumentParser(description="Run a chunked, resumable backfill.")
+    parser.add_argument("name", nargs="?", choices=sorted(BACKFILLS), help="Backfill to run")
+    parser.add_argument("--list", action="store_true", help="List backfills and their checkpoints")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Keys per chunk (default {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between chunks")
+    parser.add_argument("--rows-per-second", type=float, help="Throttle to at most this many rows per second")
+    parser.add_argument("--max-chunks", type=int, help="Stop after this many chunks (resume later)")
+    parser.add_argument("--restart", action="store_true", help="Discard the checkpoint and start over")
+    args = parser.parse_args(argv)
+    if not args.list and not args.name:
+        parser.error("a backfill name or --list is required")
+
+    from .engine import engine
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(CHECKPOINT_TABLE_SQL))
+        if args.list:
+            for name, backfill in sorted(BACKFILLS.items()):
+                checkpoint = get_checkpoint(connection, name)
+                if checkpoint is None:
+                    state = "not started"
+                elif checkpoint.completed_at:
+                    state = f"completed {checkpoint.completed_at:%Y-%m-%d %H:%M}, {checkpoint.rows} rows"
+                else:
+                    state = f"at {checkpoint.last_key}, {checkpoint.rows} rows in {checkpoint.chunks} chunks"
+                print(f"{name}: {backfill.description} ({state})")
+            return None
+
+        backfill = BACKFILLS[args.name]
+        if args.restart:
+            reset_checkpoint(connection, backfill.name)
+
+        def report(stats: BackfillStats) -> None:
+            print(f"  chunk {stats.chunks}: {stats.rows} rows, last key {stats.last_key}")
+
+        stats = run_backfill(
+            connection, backfill,
+            chunk_size=args.chunk_size,
+            pause=args.pause,
+            rows_per_second=args.rows_per_second,
+            max_chunks=args.max_chunks,
+            progress=report,
+        )
+
+    if stats.skipped:
+        print(f"{backfill.name}: table {backfill.table} does not exist, nothing to do")
+    else:
+        state = "completed" if stats.completed else "paused (run again to resume)"
+        print(
+            f"{backfill.name} {state}: {stats.rows} rows in {stats.chunks} chunks "
+            f"({stats.seconds:.2f}s, {stats.rows_per_second:.0f} rows/s)"
+        )
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Bounded in-process result cache with spatial write invalidation.
+
+Entries are registered against the lat/lng grid cells their answer depends
+on; a write at a point drops every entry touching that point's cell, so a
+cached answer never outlives a write made through the service. Entries
+whose extent is unbounded (or spans too many cells) are registered as
+global and dropped by any write.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+METERS_PER_DEGREE_LAT = 111195.0
+
+
+def quantize(value: float, quantum: float) -> float:
+    """Snap a coordinate to the nearest multiple of quantum."""
+    return round(value / quantum) * quantum
+
+
+def radius_bbox(lat: float, lng: float, radius_meters: float) -> BBox:
+    """Lat/lng box containing every point within radius_meters (with margin)."""
+    dlat = radius_meters / METERS_PER_DEGREE_LAT * 1.01
+    cos_lat = max(math.cos(math.radians(min(abs(lat) + dlat, 90.0))), 1e-6)
+    dlng = min(dlat / cos_lat, 180.0)
+    return (max(lat - dlat, -90.0), lng - dlng, min(lat + dlat, 90.0), lng + dlng)
+
+
+class QueryCache:
+    """Thread-safe LRU + TTL cache keyed by quantized query parameters."""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 60.0,
+        cell_degrees: float = 0.05,
+        max_cells_per_entry: int = 256,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cell_degrees = cell_degrees
+        self.max_cells_per_entry = max_cells_per_entry
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # key -> (expires_at, value, cells or None for global)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, Optional[Tuple[Tuple[int, int], ...]]]]" = OrderedDict()
+        self._by_cell: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._global: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def _cells(self, bbox: Optional[BBox]) -> Optional[Tuple[Tuple[int, int], ...]]:
+        if bbox is None:
+            return None
+        row0, col0 = self._cell(bbox[0], bbox[1])
+        row1, col1 = self._cell(bbox[2], bbox[3])
+        if (row1 - row0 + 1) * (col1 - col0 + 1) > self.max_cells_per_entry:
+            return None
+        return tuple((row, col) for row in range(row0, row1 + 1) for col in range(col0, col1 + 1))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any, bbox: Optional[BBox]) -> None:
+        """Store a value that depends on toilets inside bbox (None: anywhere)."""
+        cells = self._cells(bbox)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, cells)
+            if cells is None:
+                self._global.add(key)
+            else:
+                for cell in cells:
+                    self._by_cell.setdefault(cell, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, cells = self._entries.pop(key)
+        if cells is None:
+            self._global.discard(key)
+            return
+        for cell in cells:
+            keys = self._by_cell.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_cell[cell]
+
+    def invalidate_point(self, lat: Optional[float], lng: Optional[float]) -> int:
+        """Drop entries that a write at (lat, lng) may affect; returns the count."""
+        with self._lock:
+            keys = set(self._global)
+            if lat is not None and lng is not None:
+                keys |= self._by_cell.get(self._cell(lat, lng), set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_cell.clear()
+            self._global.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+default_query_cache = QueryCache()
@@ -0,0 +1,123 @@
+"""Quadkey cell ids for density aggregates.
+
+``toilet_location.quadkey`` holds the web-mercator tile of a toilet at level
+QUADKEY_LEVEL with the x/y bits interleaved (Morton order, as in Bing
+quadkeys: each level adds one base-4 digit, ``2 * y_bit + x_bit``). The
+cell at a coarser resolution r is the key shifted right by
+``2 * (QUADKEY_LEVEL - r)``, and every quadtree cell is one contiguous key
+range, so counts per cell are a GROUP BY over a btree range scan.
+
+The geometry trigger computes the key with the SQL twin of ``quadkey()``
+(``toilet_quadkey``, migration d2a7c5e18b40).
+"""
+import math
+from typing import List, Tuple
+
+QUADKEY_LEVEL = 24
+MAX_LATITUDE = 85.0511287798
+
+
+def tile_xy(lat: float, lng: float, level: int) -> Tuple[int, int]:
+    """Web-mercator tile containing a point (clamped to the map)."""
+    n = 1 << level
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = math.floor((lng + 180.0) / 360.0 * n)
+    y = math.floor((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _spread(v: int) -> int:
+    """Move bit i of a 24-bit integer to bit 2i."""
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    return (v | (v << 1)) & 0x5555555555555555
+
+
+def _compact(v: int) -> int:
+    """Inverse of _spread."""
+    v &= 0x5555555555555555
+    v = (v | (v >> 1)) & 0x3333333333333333
+    v = (v | (v >> 2)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v >> 4)) & 0x00FF00FF00FF00FF
+    v = (v | (v >> 8)) & 0x0000FFFF0000FFFF
+    return (v | (v >> 16)) & 0x00000000FFFFFFFF
+
+
+def interleave(x: int, y: int) -> int:
+    """Cell id of tile (x, y) at its level."""
+    return _spread(x) | (_spread(y) << 1)
+
+
+def deinterleave(cell: int) -> Tuple[int, int]:
+    """Tile (x, y) of a cell id."""
+    return _compact(cell), _compact(cell >> 1)
+
+
+def quadkey(lat: float, lng: float, level: int = QUADKEY_LEVEL) -> int:
+    """Cell id of a point at a level (QUADKEY_LEVEL matches the stored column)."""
+    return interleave(*tile_xy(lat, lng, level))
+
+
+def quadkey_digits(cell: int, level: int) -> str:
+    """Bing-style quadkey string ('' at level 0)."""
+    return "".join(str((cell >> (2 * i)) & 3) for i in reversed(range(level)))
+
+
+def cell_center(x: int, y: int, level: int) -> Tuple[float, float]:
+    """(lat, lng) of a tile's center."""
+    n = 1 << level
+    lng = (x + 0.5) / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * (y + 0.5) / n))))
+    return lat, lng
+
+
+def cell_bounds(
+    min_lat: float, min_lng: float, max_lat: float, max_lng: float, level: int
+) -> Tuple[int, int, int, int]:
+    """Tile range (x0, y0, x1, y1) intersecting a bbox; y grows southwards."""
+    x0, y0 = tile_xy(max_lat, min_lng, level)
+    x1, y1 = tile_xy(min_lat, max_lng, level)
+    return x0, y0, x1, y1
+
+
+def key_ranges(bounds: Tuple[int, int, int, int], resolution: int, max_ranges: int = 512) -> List[Tuple[int, int]]:
+    """Stored-key ranges [start, end) covering the cells in ``bounds`` at a resolution.
+
+    The quadtree is refined level by level; quadrants inside the bounds
+    become exact ranges. Once another level would exceed ``max_ranges``,
+    the remaining border quadrants are kept whole, so the ranges may cover
+    some cells outside the bounds (callers filter the grouped cells).
+    """
+    x0, y0, x1, y1 = bounds
+    blocks: List[Tuple[int, int, int]] = []
+    border = [(0, 0)]
+    level = 0
+    while border:
+        shift = resolution - level
+        refine = []
+        for x, y in border:
+            cx0, cy0 = x << shift, y << shift
+            cx1, cy1 = ((x + 1) << shift) - 1, ((y + 1) << shift) - 1
+            if cx1 < x0 or cx0 > x1 or cy1 < y0 or cy0 > y1:
+                continue
+            if x0 <= cx0 and cx1 <= x1 and y0 <= cy0 and cy1 <= y1:
+                blocks.append((level, x, y))
+            else:
+                refine.append((x, y))
+        if level == resolution or len(blocks) + 4 * len(refine) > max_ranges:
+            blocks.extend((level, x, y) for x, y in refine)
+            break
+        border = [(2 * x + dx, 2 * y + dy) for x, y in refine for dy in (0, 1) for dx in (0, 1)]
+        level += 1
+
+    ranges: List[Tuple[int, int]] = []
+    for block_level, x, y in sorted(blocks, key=lambda b: interleave(b[1], b[2]) << 2 * (QUADKEY_LEVEL - b[0])):
+        shift = 2 * (QUADKEY_LEVEL - block_level)
+        start, end = interleave(x, y) << shift, (interleave(x, y) + 1) << shift
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
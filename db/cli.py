@@ -0,0 +1,113 @@
+"""Migration commands (db-migrate, db-upgrade, db-downgrade, db-revision).
+
+Thin wrappers around Alembic that work from any directory: the repository's
+alembic.ini and db/migrations are located relative to this file. Alembic,
+the models and the database settings are only imported once a command
+runs, so ``--help`` and argument errors return immediately.
+
+    db-migrate -m "add foo"        # autogenerate a revision from the models
+    db-revision -m "add foo"       # empty revision (raw SQL migrations)
+    db-upgrade [head]
+    db-downgrade [-1]
+    python -m db.cli current | history
+"""
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+ALEMBIC_INI = ROOT / "alembic.ini"
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+def alembic_config():
+    """Alembic config for this repository, independent of the working directory."""
+    from alembic.config import Config
+
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    config.set_main_option("prepend_sys_path", str(ROOT))
+    return config
+
+
+def _command(name: str):
+    from alembic import command
+
+    return getattr(command, name)
+
+
+def _parser(prog: str, description: str) -> argparse.ArgumentParser:
+    return argparse.ArgumentParser(prog=prog, description=description)
+
+
+def migrate(argv=None):
+    """Entry point for the db-migrate script."""
+    parser = _parser("db-migrate", "Autogenerate a migration from the SQLModel models.")
+    parser.add_argument("-m", "--message", required=True, help="Revision message (used for the file name)")
+    args = parser.parse_args(argv)
+    _command("revision")(alembic_config(), message=args.message, autogenerate=True)
+
+
+def revision(argv=None):
+    """Entry point for the db-revision script."""
+    parser = _parser("db-revision", "Create an empty migration.")
+    parser.add_argument("-m", "--message", required=True, help="Revision message (used for the file name)")
+    parser.add_argument("--autogenerate", action="store_true", help="Fill in changes detected from the models")
+    args = parser.parse_args(argv)
+    _command("revision")(alembic_config(), message=args.message, autogenerate=args.autogenerate)
+
+
+def upgrade(argv=None):
+    """Entry point for the db-upgrade script."""
+    parser = _parser("db-upgrade", "Apply migrations.")
+    parser.add_argument("revision", nargs="?", default="head", help="Target revision (default head)")
+    parser.add_argument("--sql", action="store_true", help="Print the SQL instead of running it")
+    args = parser.parse_args(argv)
+    _command("upgrade")(alembic_config(), args.revision, sql=args.sql)
+
+
+def downgrade(argv=None):
+    """Entry point for the db-downgrade script."""
+    parser = _parser("db-downgrade", "Revert migrations.")
+    parser.add_argument("revision", nargs="?", default="-1", help="Target revision (default -1)")
+    parser.add_argument("--sql", action="store_true", help="Print the SQL instead of running it")
+    args = parser.parse_args(argv)
+    _command("downgrade")(alembic_config(), args.revision, sql=args.sql)
+
+
+def current(argv=None):
+    """Show the database's current revision."""
+    parser = _parser("db-current", "Show the current revision.")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    _command("current")(alembic_config(), verbose=args.verbose)
+
+
+def history(argv=None):
+    """Show the revision history."""
+    parser = _parser("db-history", "Show the migration history.")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    _command("history")(alembic_config(), verbose=args.verbose)
+
+
+COMMANDS = {
+    "migrate": migrate,
+    "revision": revision,
+    "upgrade": upgrade,
+    "downgrade": downgrade,
+    "current": current,
+    "history": history,
+}
+
+
+def main(argv=None):
+    """Entry point for python -m db.cli <command>."""
+    parser = argparse.ArgumentParser(prog="python -m db.cli", description="Database migration commands.")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the command")
+    args = parser.parse_args(argv)
+    COMMANDS[args.command](args.args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Folds the queued toilet_cluster deltas into the cluster pyramid.
+
+Writes to toilet_location do not touch toilet_cluster: the statement
+triggers of migration c61b9f2d7a05 append one +1 / -1 row per written
+position to ``toilet_cluster_delta``. ``toilet_cluster_fold()`` takes the
+oldest queued deltas, sums them per cell and applies them to the cells in
+``(zoom, cell_x, cell_y)`` order; only one fold runs at a time (advisory
+lock), so the low-zoom cells that every write touches are updated by one
+transaction instead of by every writer.
+
+``get_toilet_clusters`` lags toilet_location by the deltas still queued:
+run ``db-clusters --watch`` next to the API, and fold after bulk loads.
+
+Usage:
+    db-clusters                  # fold the queue once
+    db-clusters --watch 5        # fold every 5 seconds
+"""
+import argparse
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+DEFAULT_BATCH_SIZE = 100_000
+
+FOLD_SQL = text("SELECT toilet_cluster_fold(:max_rows)")
+
+
+@dataclass
+class FoldStats:
+    """Result of folding the delta queue."""
+    deltas: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+
+def fold_cluster_deltas(connection: Connection, batch_size: int = DEFAULT_BATCH_SIZE) -> FoldStats:
+    """Fold queued deltas batch_size at a time until the queue is empty.
+
+    connection must be in AUTOCOMMIT mode, so each batch commits on its own.
+    Stops early when another fold holds the lock.
+    """
+    stats = FoldStats()
+    started = time.perf_counter()
+    while True:
+        folded = connection.execute(FOLD_SQL, {"max_rows": batch_size}).scalar_one()
+        if not folded:
+            break
+        stats.deltas += folded
+        stats.batches += 1
+        if folded < batch_size:
+            break
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None):
+    """Entry point for the db-clusters script."""
+    parser = argparse.ArgumentParser(description="Fold queued toilet_cluster deltas.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Deltas per transaction (default {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="Keep folding, sleeping this many seconds between runs")
+    args = parser.parse_args(argv)
+
+    from .engine import engine
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        while True:
+            stats = fold_cluster_deltas(connection, args.batch_size)
+            if stats.deltas or args.watch is None:
+                print(f"Folded {stats.deltas} deltas in {stats.batches} batches ({stats.seconds:.2f}s)")
+            if args.watch is None:
+                return stats
+            time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
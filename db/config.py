@@ -1,40 +1,69 @@
-"""Database configuration for Toilet Radar."""
+"""Database configuration for Toilet Radar.
+
+Settings are built on first use (``get_settings()`` or ``db.config.settings``),
+which is also when the env file is loaded; importing this module reads
+nothing from the environment.
+"""
 import os
-from typing import Optional
+from functools import lru_cache
+from typing import List, Optional
 
-from pydantic import Field
+from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings
-from dotenv import load_dotenv
 
-# Load environment variables from .env.local
-load_dotenv('.env.prd')
+# Env file loaded by get_settings(); variables already set take precedence
+DEFAULT_ENV_FILE = ".env.prd"
 
 
 class DatabaseSettings(BaseSettings):
-    """Database configuration settings."""
+    """Database configuration settings.
+
+    Fields are read from the environment variable of the same name (case
+    insensitive) or from the variable listed in their validation_alias.
+    """
     
     # Direct database URL (for local development)
-    database_url_override: Optional[str] = Field(default=None, env="DATABASE_URL")
+    database_url_override: Optional[str] = Field(default=None, validation_alias=AliasChoices("database_url_override", "DATABASE_URL"))
     
     # Supabase connection details
-    supabase_url: str = Field(default="", env="NEXT_PUBLIC_SUPABASE_URL")
-    supabase_service_key: str = Field(default="", env="SUPABASE_SERVICE_KEY")
+    supabase_url: str = Field(default="", validation_alias=AliasChoices("supabase_url", "NEXT_PUBLIC_SUPABASE_URL"))
+    supabase_service_key: str = Field(default="")
     
     # Schema configuration
-    db_schema: str = Field(default="public", env="DB_SCHEMA")
+    db_schema: str = Field(default="public")
     
     # Database connection components (for non-Supabase setups)
-    db_host: Optional[str] = Field(default=None, env="DB_HOST")
-    db_port: int = Field(default=5432, env="DB_PORT")
-    db_name: Optional[str] = Field(default=None, env="DB_NAME")
-    db_user: Optional[str] = Field(default=None, env="DB_USER")
-    db_password: Optional[str] = Field(default=None, env="DB_PASSWORD")
+    db_host: Optional[str] = Field(default=None)
+    db_port: int = Field(default=5432)
+    db_name: Optional[str] = Field(default=None)
+    db_user: Optional[str] = Field(default=None)
+    db_password: Optional[str] = Field(default=None)
     
     # Connection pool settings
-    pool_size: int = Field(default=10, env="DB_POOL_SIZE")
-    max_overflow: int = Field(default=20, env="DB_MAX_OVERFLOW")
-    pool_timeout: int = Field(default=30, env="DB_POOL_TIMEOUT")
-    pool_recycle: int = Field(default=3600, env="DB_POOL_RECYCLE")
+    pool_size: int = Field(default=10, validation_alias=AliasChoices("pool_size", "DB_POOL_SIZE"))
+    max_overflow: int = Field(default=20, validation_alias=AliasChoices("max_overflow", "DB_MAX_OVERFLOW"))
+    pool_timeout: int = Field(default=30, validation_alias=AliasChoices("pool_timeout", "DB_POOL_TIMEOUT"))
+    pool_recycle: int = Field(default=3600, validation_alias=AliasChoices("pool_recycle", "DB_POOL_RECYCLE"))
+
+    # Async (asyncpg) pool settings - coroutines wait on the pool, not threads
+    async_pool_size: int = Field(default=20, validation_alias=AliasChoices("async_pool_size", "DB_ASYNC_POOL_SIZE"))
+    async_max_overflow: int = Field(default=20, validation_alias=AliasChoices("async_max_overflow", "DB_ASYNC_MAX_OVERFLOW"))
+    # Disable asyncpg prepared statement caching (required behind PgBouncer / Supabase pooler).
+    # None means auto-detect from the port (6543 is the Supabase transaction pooler).
+    disable_statement_cache: Optional[bool] = Field(default=None, validation_alias=AliasChoices("disable_statement_cache", "DB_DISABLE_STATEMENT_CACHE"))
+
+    # Read replicas: comma-separated URLs; reads are routed there by db.routing
+    replica_urls: str = Field(default="", validation_alias=AliasChoices("replica_urls", "DB_REPLICA_URLS"))
+    # Replicas lagging more than this are skipped (reads fall back to the primary)
+    replica_max_lag_seconds: float = Field(default=30.0, validation_alias=AliasChoices("replica_max_lag_seconds", "DB_REPLICA_MAX_LAG_SECONDS"))
+    replica_check_interval: float = Field(default=10.0, validation_alias=AliasChoices("replica_check_interval", "DB_REPLICA_CHECK_INTERVAL"))
+    replica_connect_timeout: int = Field(default=5, validation_alias=AliasChoices("replica_connect_timeout", "DB_REPLICA_CONNECT_TIMEOUT"))
+
+    # Instrumentation (see db.metrics)
+    metrics_enabled: bool = Field(default=True, validation_alias=AliasChoices("metrics_enabled", "DB_METRICS_ENABLED"))
+    # Log statements slower than this on the db.slow_query logger (None disables)
+    slow_query_ms: Optional[float] = Field(default=None, validation_alias=AliasChoices("slow_query_ms", "DB_SLOW_QUERY_MS"))
+    slow_query_log_parameters: bool = Field(default=False, validation_alias=AliasChoices("slow_query_log_parameters", "DB_SLOW_QUERY_LOG_PARAMETERS"))
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -79,6 +108,30 @@ class DatabaseSettings(BaseSettings):
         """Get the async database URL."""
         return self.database_url.replace("postgresql://", "postgresql+asyncpg://")
 
+    @property
+    def replica_database_urls(self) -> List[str]:
+        """Read replica URLs (may be empty)."""
+        return [url.strip() for url in self.replica_urls.split(",") if url.strip()]
+
+    @property
+    def uses_transaction_pooler(self) -> bool:
+        """Whether prepared statements must not be cached across transactions."""
+        if self.disable_statement_cache is not None:
+            return self.disable_statement_cache
+        return ":6543/" in self.database_url
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> DatabaseSettings:
+    """Load the env file (DB_ENV_FILE, default .env.prd) and build the settings once."""
+    from dotenv import load_dotenv
+
+    load_dotenv(os.environ.get("DB_ENV_FILE", DEFAULT_ENV_FILE))
+    return DatabaseSettings()
+
 
-# Global settings instance
-settings = DatabaseSettings()
\ No newline at end of file
+def __getattr__(name):
+    # Global settings instance, built on first access
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,182 @@
+"""Country boundaries: GeoJSON loader and cached point -> country lookup.
+
+``infer_country_code(lat, lng)`` (SQL) answers with an ST_Contains lookup on
+``country_boundary``. Map centers move by a few meters while panning, so
+``CountryResolver`` caches answers per quantized cell in-process: the
+deterministic fetch skips inference entirely on a cache hit, and on a miss
+infers the country in the same statement as the search and caches it. Only cells that
+lie entirely inside one country polygon are cached; near borders (and where
+the nearest-toilet fallback answers) every point is resolved on its own.
+
+Usage:
+    db-countries countries.geojson
+"""
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from .models import CountryCode
+
+INFER_COUNTRY_SQL = text("SELECT infer_country_code(:lat, :lng)")
+
+# Whether the cache cell (:min_lat .. :max_lng) lies inside country r.country_code
+CELL_INSIDE_SQL = """
+    EXISTS (
+        SELECT 1 FROM country_boundary b
+        WHERE b.country_code::text = r.country_code
+          AND ST_Covers(b.geom, ST_MakeEnvelope(:min_lng, :min_lat, :max_lng, :max_lat, 4326))
+    )
+"""
+
+# Country of the point, and whether its whole cache cell is inside that country
+RESOLVE_COUNTRY_SQL = text(f"""
+    WITH resolved AS (SELECT infer_country_code(:lat, :lng) AS country_code)
+    SELECT r.country_code, {CELL_INSIDE_SQL} AS cell_inside
+    FROM resolved r
+""")
+
+# GeoJSON property names that commonly hold the ISO 3166-1 alpha-2 code
+CODE_PROPERTIES = ("ISO3166-1-Alpha-2", "ISO_A2", "iso_a2", "ISO_A2_EH", "country_code", "iso2")
+NAME_PROPERTIES = ("name", "NAME", "ADMIN", "admin", "name_en")
+
+_UPSERT_SQL = text("""
+    INSERT INTO country_boundary (country_code, name, geom)
+    VALUES (
+        CAST(:country_code AS countrycode), :name,
+        ST_Multi(ST_CollectionExtract(ST_MakeValid(ST_SetSRID(ST_GeomFromGeoJSON(:geometry), 4326)), 3))
+    )
+    ON CONFLICT (country_code) DO UPDATE SET name = EXCLUDED.name, geom = EXCLUDED.geom
+""")
+
+
+class CountryResolver:
+    """Thread-safe LRU cache of infer_country_code() per quantized cell."""
+    
+    def __init__(self, quantum_degrees: float = 0.01, max_entries: int = 100_000):
+        self.quantum_degrees = quantum_degrees
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[Tuple[int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def key(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (round(lat / self.quantum_degrees), round(lng / self.quantum_degrees))
+    
+    def cached(self, lat: float, lng: float) -> Optional[str]:
+        """Cached country code for a point, or None when it must be resolved."""
+        key = self.key(lat, lng)
+        with self._lock:
+            code = self._cache.get(key)
+            if code is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return code
+    
+    def cell_bind(self, lat: float, lng: float) -> dict:
+        """Bounds of the point's cache cell, as bind parameters for CELL_INSIDE_SQL."""
+        half = self.quantum_degrees / 2
+        key = self.key(lat, lng)
+        cell_lat, cell_lng = key[0] * self.quantum_degrees, key[1] * self.quantum_degrees
+        return {
+            "min_lat": cell_lat - half, "min_lng": cell_lng - half,
+            "max_lat": cell_lat + half, "max_lng": cell_lng + half,
+        }
+    
+    def remember(self, lat: float, lng: float, code: str, cell_inside: bool) -> str:
+        """Record a resolved country code; returns it."""
+        # A cell crossing a border (or outside every polygon) is not cached:
+        # its points may belong to different countries
+        if cell_inside:
+            self.put(self.key(lat, lng), code)
+        return code
+    
+    def resolve(self, session: Session, lat: float, lng: float) -> str:
+        """Country code for a point, from the cache or the database."""
+        code = self.cached(lat, lng)
+        return code if code is not None else self.fetch(session, lat, lng)
+    
+    def fetch(self, session: Session, lat: float, lng: float) -> str:
+        """Country code for a point from the database, remembered for its cell."""
+        row = session.execute(RESOLVE_COUNTRY_SQL, {"lat": lat, "lng": lng, **self.cell_bind(lat, lng)}).one()
+        return self.remember(lat, lng, row.country_code, row.cell_inside)
+    
+    async def resolve_async(self, session, lat: float, lng: float) -> str:
+        """Async variant of resolve() for an AsyncSession."""
+        code = self.cached(lat, lng)
+        if code is not None:
+            return code
+        result = await session.execute(RESOLVE_COUNTRY_SQL, {"lat": lat, "lng": lng, **self.cell_bind(lat, lng)})
+        row = result.one()
+        return self.remember(lat, lng, row.country_code, row.cell_inside)
+    
+    def put(self, key: Tuple[int, int], code: str) -> None:
+        with self._lock:
+            self._cache[key] = code
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Forget cached answers (e.g. after reloading boundaries)."""
+        with self._lock:
+            self._cache.clear()
+
+
+default_country_resolver = CountryResolver()
+
+
+def _first_property(properties: dict, names) -> Optional[str]:
+    for name in names:
+        value = properties.get(name)
+        if value:
+            return str(value)
+    return None
+
+
+def load_country_boundaries(session: Session, path: Path) -> int:
+    """Upsert country polygons from a GeoJSON FeatureCollection; returns the count."""
+    supported = {code.value for code in CountryCode}
+    with open(path, encoding="utf-8") as f:
+        features = json.load(f).get("features") or []
+    
+    loaded = 0
+    for feature in features:
+        properties = feature.get("properties") or {}
+        code = (_first_property(properties, CODE_PROPERTIES) or "").upper()
+        if code not in supported or not feature.get("geometry"):
+            continue
+        session.execute(_UPSERT_SQL, {
+            "country_code": code,
+            "name": _first_property(properties, NAME_PROPERTIES),
+            "geometry": json.dumps(feature["geometry"]),
+        })
+        loaded += 1
+    session.commit()
+    default_country_resolver.clear()
+    return loaded
+
+
+def main(argv=None):
+    """Entry point for the db-countries script."""
+    parser = argparse.ArgumentParser(description="Load country boundaries from a GeoJSON file.")
+    parser.add_argument("path", type=Path, help="GeoJSON FeatureCollection with ISO alpha-2 codes")
+    args = parser.parse_args(argv)
+    
+    from .engine import SessionLocal
+    
+    with SessionLocal() as session:
+        loaded = load_country_boundaries(session, args.path)
+    print(f"Loaded {loaded} country boundaries from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
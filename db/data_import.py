@@ -0,0 +1,219 @@
+"""Bulk import of toilets into toilet_location using PostgreSQL COPY.
+
+Rows are streamed from the source file, serialized to CSV in bounded chunks
+and sent with ``COPY ... FROM STDIN``; the geometry is written in the same
+pass as EWKT, so no follow-up ``UPDATE ... WHERE geom IS NULL`` is needed.
+
+Usage:
+    db-import toilets.csv --country CH
+    db-import toilets.jsonl --chunk-size 100000 --truncate
+    db-import switzerland-latest.osm.pbf --country CH
+"""
+import argparse
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+from .models import CountryCode, ToiletCreate
+from .osm import read_osm
+
+COPY_COLUMNS = (
+    "name", "lat", "lng", "accessible", "open_hours", "address", "rating",
+    "is_free", "type", "status", "notes", "city", "country_code",
+    "osm_id", "osm_version", "geom",
+)
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+@dataclass
+class ImportStats:
+    """Result of a COPY import."""
+    rows: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def _csv_field(value) -> str:
+    """Serialize one value for COPY csv with NULL '\\N'."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, CountryCode):
+        value = value.value
+    # Always quote text so a literal '\N' is not read as NULL
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_sql(table: str = "toilet_location", columns: Sequence[str] = COPY_COLUMNS) -> str:
+    """COPY statement for the given table and column list."""
+    return f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+
+def toilet_to_copy_line(toilet: ToiletCreate, columns: Sequence[str] = COPY_COLUMNS) -> str:
+    """One COPY csv line for a toilet, including its EWKT geometry."""
+    values = []
+    for column in columns:
+        if column == "geom":
+            value = None
+            if toilet.lat is not None and toilet.lng is not None:
+                value = f"SRID=4326;POINT({toilet.lng!r} {toilet.lat!r})"
+        else:
+            value = getattr(toilet, column)
+        values.append(_csv_field(value))
+    return ",".join(values) + "\n"
+
+
+def copy_toilets(
+    dbapi_connection,
+    toilets: Iterable[ToiletCreate],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: bool = False,
+    table: str = "toilet_location",
+    columns: Sequence[str] = COPY_COLUMNS,
+) -> ImportStats:
+    """Stream toilets into a table with COPY, chunk_size rows at a time.
+
+    Uses a raw psycopg2 connection; the caller commits or rolls back.
+    """
+    stats = ImportStats()
+    started = time.perf_counter()
+    sql = copy_sql(table, columns)
+    buffer = io.StringIO()
+    pending = 0
+
+    with dbapi_connection.cursor() as cursor:
+        def flush():
+            nonlocal buffer, pending
+            if not pending:
+                return
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            stats.rows += pending
+            stats.chunks += 1
+            if progress:
+                elapsed = time.perf_counter() - started
+                print(f"  {stats.rows} rows copied ({stats.rows / elapsed:,.0f} rows/s)")
+            buffer = io.StringIO()
+            pending = 0
+
+        for toilet in toilets:
+            buffer.write(toilet_to_copy_line(toilet, columns))
+            pending += 1
+            if pending >= chunk_size:
+                flush()
+        flush()
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def read_csv(path: Path, country_code: Optional[str] = None) -> Iterator[ToiletCreate]:
+    """Read toilets from a CSV file with ToiletCreate column names."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            data = {key: (value if value != "" else None) for key, value in row.items()}
+            if country_code and not data.get("country_code"):
+                data["country_code"] = country_code
+            yield ToiletCreate.model_validate(data)
+
+
+def read_jsonl(path: Path, country_code: Optional[str] = None) -> Iterator[ToiletCreate]:
+    """Read toilets from a JSON-lines file, one ToiletCreate object per line."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if country_code and not data.get("country_code"):
+                data["country_code"] = country_code
+            yield ToiletCreate.model_validate(data)
+
+
+READERS = {
+    ".csv": read_csv,
+    ".jsonl": read_jsonl,
+    ".ndjson": read_jsonl,
+}
+
+
+def read_toilets(path: Path, country_code: Optional[str] = None) -> Iterator[ToiletCreate]:
+    """Read toilets from a file, choosing the reader from its extension.
+    
+    Anything other than CSV / JSON lines is treated as an OSM dump
+    (Overpass JSON, OSM XML or PBF) and streamed through ``db.osm``.
+    """
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        return read_osm(path, country_code)
+    return reader(path, country_code)
+
+
+def import_file(
+    path: Path,
+    country_code: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    truncate: bool = False,
+    progress: bool = True,
+) -> ImportStats:
+    """Import a file into toilet_location in a single transaction."""
+    from .clusters import fold_cluster_deltas
+    from .engine import engine
+
+    connection = engine.raw_connection()
+    try:
+        if truncate:
+            with connection.cursor() as cursor:
+                if country_code:
+                    cursor.execute("DELETE FROM toilet_location WHERE country_code = %s", (country_code,))
+                else:
+                    cursor.execute("TRUNCATE toilet_location, toilet_cluster, toilet_cluster_delta")
+        stats = copy_toilets(connection, read_toilets(path, country_code), chunk_size, progress)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    # Fold the queued cluster deltas now rather than at the next db-clusters run
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        fold_cluster_deltas(connection)
+    return stats
+
+
+def main(argv=None):
+    """Entry point for the db-import script."""
+    parser = argparse.ArgumentParser(description="Bulk import toilets into toilet_location using COPY.")
+    parser.add_argument("path", type=Path,
+                        help="Input file (" + ", ".join(READERS) + ", or an OSM .json/.osm/.pbf dump)")
+    parser.add_argument("--country", choices=[code.value for code in CountryCode],
+                        help="Country code for rows that do not set one")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per COPY chunk (default {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--truncate", action="store_true",
+                        help="Delete existing rows (of --country, if given) before importing")
+    args = parser.parse_args(argv)
+
+    print(f"Importing {args.path} into toilet_location...")
+    stats = import_file(args.path, args.country, args.chunk_size, args.truncate)
+    print(
+        f"Imported {stats.rows} rows in {stats.chunks} chunks, "
+        f"{stats.seconds:.2f}s ({stats.rows_per_second:,.0f} rows/s)"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Near-duplicate detection and merging for toilet_location and the legacy toilets table.
+
+Points are hashed into a grid of cells at least ``threshold_m`` wide: rows
+are latitude bands, columns are longitude steps sized for the run's largest
+|latitude|, where meridians are closest. Cells are then at least as wide
+everywhere, so every pair closer than the threshold lies in the same or an
+adjacent cell. Each cell is compared with itself and four forward neighbours
+only, which keeps the job linear in the number of points for bounded
+density instead of all-pairs O(n^2). Longitudes do not wrap at +/-180.
+
+Candidate pairs are scored on proximity and on name / address similarity;
+pairs above ``min_score`` are grouped (union-find) into merge plans that
+keep one survivor per group, fill its empty fields from the duplicates and
+drop the rest. Plans are written as JSON lines and, with ``--apply``,
+applied in batches of one transaction each.
+
+Usage:
+    db-dedup --table toilet_location --country CH --plan bench/dedup_ch.jsonl
+    db-dedup --table toilets --threshold 10 --apply
+"""
+import argparse
+import json
+import math
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .models import CountryCode
+
+# Tables that can be deduplicated, and whether they carry OSM ids
+TABLES = {"toilet_location": True, "toilets": False}
+
+# Survivor fields filled from its duplicates when empty
+FILL_COLUMNS = ("name", "address", "open_hours", "accessible", "is_free")
+
+DEFAULT_THRESHOLD_M = 15.0
+DEFAULT_MIN_SCORE = 0.7
+DEFAULT_BATCH_SIZE = 1000
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# Score weights; components missing on either side are left out
+PROXIMITY_WEIGHT = 0.4
+NAME_WEIGHT = 0.35
+ADDRESS_WEIGHT = 0.25
+# Two distinct OSM nodes were mapped separately on purpose more often than not
+DISTINCT_OSM_FACTOR = 0.8
+
+# Forward neighbours: with the cell itself they visit every adjacent pair once
+_NEIGHBOURS = ((1, -1), (1, 0), (1, 1), (0, 1))
+
+
+class DedupPoint(NamedTuple):
+    """One row as read for deduplication."""
+    id: str
+    lat: float
+    lng: float
+    name: Optional[str]
+    address: Optional[str]
+    open_hours: Optional[str]
+    accessible: Optional[bool]
+    is_free: Optional[bool]
+    osm_id: Optional[int]
+    osm_version: Optional[int]
+    created_at: Optional[datetime]
+
+
+@dataclass
+class MergePlan:
+    """Keep one toilet of a duplicate group, fill its empty fields, drop the others."""
+    keep_id: str
+    drop_ids: List[str]
+    fill: Dict[str, object] = field(default_factory=dict)
+    min_score: float = 0.0
+    max_distance_m: float = 0.0
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+
+@dataclass
+class DedupStats:
+    """Counters of a dedup run."""
+    points: int = 0
+    cells: int = 0
+    comparisons: int = 0
+    candidates: int = 0
+    plans: int = 0
+    dropped: int = 0
+    applied: int = 0
+    seconds: float = 0.0
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Lowercase, accent-free, single-spaced alphanumerics."""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    stripped = "".join(c if c.isalnum() else " " for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.split())
+
+
+def similarity(a: Optional[str], b: Optional[str]) -> Optional[float]:
+    """Similarity of two normalized strings in [0, 1]; None when either is empty."""
+    a, b = normalize_text(a), normalize_text(b)
+    if not a or not b:
+        return None
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lng2 - lng1)
+    h = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+def lng_scale(points: Iterable[DedupPoint]) -> float:
+    """cos of the largest |latitude| of a run, where meridians are closest."""
+    max_lat = max((abs(point.lat) for point in points), default=0.0)
+    return max(math.cos(math.radians(min(max_lat, 90.0))), 1e-9)
+
+
+def grid_cell(lat: float, lng: float, cell_m: float, scale: float = 1.0) -> Tuple[int, int]:
+    """Grid cell of a point; ``scale`` is the same lng_scale for every point of a run."""
+    y = math.radians(lat) * EARTH_RADIUS_M
+    x = math.radians(lng) * EARTH_RADIUS_M * scale
+    return math.floor(x / cell_m), math.floor(y / cell_m)
+
+
+def candidate_pairs(
+    points: Sequence[DedupPoint], threshold_m: float, stats: Optional[DedupStats] = None
+) -> Iterator[Tuple[int, int, float]]:
+    """(i, j, meters) for every pair of points closer than threshold_m."""
+    # Cells slightly wider than the threshold absorb the difference between
+    # great-circle and along-the-parallel distances
+    cell_m = threshold_m * 1.01
+    scale = lng_scale(points)
+    cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for index, point in enumerate(points):
+        cells[grid_cell(point.lat, point.lng, cell_m, scale)].append(index)
+    if stats is not None:
+        stats.cells = len(cells)
+
+    comparisons = 0
+    for (cx, cy), members in cells.items():
+        neighbours = [cells.get((cx + dx, cy + dy), ()) for dx, dy in _NEIGHBOURS]
+        for position, i in enumerate(members):
+            a = points[i]
+            others = members[position + 1:]
+            for group in (others, *neighbours):
+                for j in group:
+                    b = points[j]
+                    comparisons += 1
+                    distance = haversine_m(a.lat, a.lng, b.lat, b.lng)
+                    if distance <= threshold_m:
+                        yield i, j, distance
+    if stats is not None:
+        stats.comparisons = comparisons
+
+
+def score_pair(a: DedupPoint, b: DedupPoint, distance_m: float, threshold_m: float) -> float:
+    """Duplicate likelihood in [0, 1] from proximity and name / address similarity."""
+    components = [(PROXIMITY_WEIGHT, 1.0 - distance_m / threshold_m)]
+    name = similarity(a.name, b.name)
+    if name is not None:
+        components.append((NAME_WEIGHT, name))
+    address = similarity(a.address, b.address)
+    if address is not None:
+        components.append((ADDRESS_WEIGHT, address))
+    score = sum(weight * value for weight, value in components) / sum(weight for weight, _ in components)
+    if a.osm_id is not None and b.osm_id is not None and a.osm_id != b.osm_id:
+        score *= DISTINCT_OSM_FACTOR
+    return score
+
+
+def _survivor_key(point: DedupPoint):
+    """Sort key: OSM rows first, newest OSM version, most fields, oldest, lowest id."""
+    filled = sum(getattr(point, column) is not None for column in FILL_COLUMNS)
+    created = point.created_at.timestamp() if point.created_at else math.inf
+    return (point.osm_id is None, -(point.osm_version or 0), -filled, created, point.id)
+
+
+def build_plans(points: Sequence[DedupPoint], pairs: Iterable[Tuple[int, int, float, float]]) -> List[MergePlan]:
+    """Group accepted (i, j, meters, score) pairs into merge plans."""
+    parent: Dict[int, int] = {}
+
+    def find(i: int) -> int:
+        parent.setdefault(i, i)
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    edges: Dict[int, List[Tuple[float, float]]] = defaultdict(list)
+    accepted = list(pairs)
+    for i, j, _, _ in accepted:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    for i, _, distance, score in accepted:
+        edges[find(i)].append((distance, score))
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i in parent:
+        groups[find(i)].append(i)
+
+    plans = []
+    for root, members in groups.items():
+        ordered = sorted((points[i] for i in members), key=_survivor_key)
+        keep, duplicates = ordered[0], ordered[1:]
+        fill = {}
+        for column in FILL_COLUMNS:
+            if getattr(keep, column) is None:
+                value = next((getattr(d, column) for d in duplicates if getattr(d, column) is not None), None)
+                if value is not None:
+                    fill[column] = value
+        plans.append(MergePlan(
+            keep_id=keep.id,
+            drop_ids=[d.id for d in duplicates],
+            fill=fill,
+            min_score=round(min(score for _, score in edges[root]), 4),
+            max_distance_m=round(max(distance for distance, _ in edges[root]), 2),
+        ))
+    plans.sort(key=lambda plan: plan.keep_id)
+    return plans
+
+
+def find_duplicates(
+    points: Sequence[DedupPoint],
+    threshold_m: float = DEFAULT_THRESHOLD_M,
+    min_score: float = DEFAULT_MIN_SCORE,
+) -> Tuple[List[MergePlan], DedupStats]:
+    """Merge plans for the near-duplicates among points."""
+    started = time.perf_counter()
+    stats = DedupStats(points=len(points))
+    accepted = []
+    for i, j, distance in candidate_pairs(points, threshold_m, stats):
+        stats.candidates += 1
+        score = score_pair(points[i], points[j], distance, threshold_m)
+        if score >= min_score:
+            accepted.append((i, j, distance, score))
+    plans = build_plans(points, accepted)
+    stats.plans = len(plans)
+    stats.dropped = sum(len(plan.drop_ids) for plan in plans)
+    stats.seconds = time.perf_counter() - started
+    return plans, stats
+
+
+def read_points(dbapi_connection, table: str, country_code: Optional[str] = None) -> List[DedupPoint]:
+    """Positioned rows of a table, streamed with a server-side cursor."""
+    osm_columns = "osm_id, osm_version" if TABLES[table] else "NULL::bigint, NULL::integer"
+    sql = f"""
+        SELECT id::text, lat, lng, name, address, open_hours, accessible, is_free,
+               {osm_columns}, created_at
+        FROM {table}
+        WHERE lat IS NOT NULL AND lng IS NOT NULL
+    """
+    params: Tuple = ()
+    if country_code:
+        sql += " AND country_code = %s"
+        params = (country_code,)
+    with dbapi_connection.cursor(name="dedup_points") as cursor:
+        cursor.itersize = 50_000
+        cursor.execute(sql, params)
+        return [DedupPoint(*row) for row in cursor]
+
+
+def apply_plans(dbapi_connection, table: str, plans: Sequence[MergePlan], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Apply merge plans, committing every batch_size plans; returns the plans applied."""
+    from psycopg2.extras import execute_values
+
+    fill_sql = f"""
+        UPDATE {table} t SET
+            {', '.join(f'{column} = coalesce(t.{column}, v.{column})' for column in FILL_COLUMNS)}
+        FROM (VALUES %s) AS v(id, {', '.join(FILL_COLUMNS)})
+        WHERE t.id = v.id
+    """
+    fill_template = "(%s::uuid, %s::varchar, %s::varchar, %s::varchar, %s::boolean, %s::boolean)"
+    applied = 0
+    for start in range(0, len(plans), batch_size):
+        batch = plans[start:start + batch_size]
+        with dbapi_connection.cursor() as cursor:
+            fills = [
+                (plan.keep_id, *(plan.fill.get(column) for column in FILL_COLUMNS))
+                for plan in batch if plan.fill
+            ]
+            if fills:
+                execute_values(cursor, fill_sql, fills, template=fill_template)
+            drop_ids = [drop_id for plan in batch for drop_id in plan.drop_ids]
+            cursor.execute(f"DELETE FROM {table} WHERE id = ANY(%s::uuid[])", (drop_ids,))
+        dbapi_connection.commit()
+        applied += len(batch)
+    return applied
+
+
+def write_plans(plans: Iterable[MergePlan], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for plan in plans:
+            f.write(plan.to_json() + "\n")
+
+
+def main(argv=None):
+    """Entry point for the db-dedup script."""
+    parser = argparse.ArgumentParser(description="Find and merge near-duplicate toilets.")
+    parser.add_argument("--table", choices=sorted(TABLES), default="toilet_location",
+                        help="Table to deduplicate (default toilet_location)")
+    parser.add_argument("--country", choices=[code.value for code in CountryCode],
+                        help="Only consider toilets of this country")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_M,
+                        help=f"Maximum distance in meters between duplicates (default {DEFAULT_THRESHOLD_M:g})")
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE,
+                        help=f"Minimum pair score to merge (default {DEFAULT_MIN_SCORE})")
+    parser.add_argument("--plan", type=Path, help="Write the merge plans here (JSON lines)")
+    parser.add_argument("--apply", action="store_true", help="Apply the merge plans")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Plans per transaction with --apply (default {DEFAULT_BATCH_SIZE})")
+    args = parser.parse_args(argv)
+
+    from .engine import engine
+
+    connection = engine.raw_connection()
+    try:
+        print(f"Reading {args.table}...")
+        points = read_points(connection, args.table, args.country)
+        connection.commit()
+        plans, stats = find_duplicates(points, args.threshold, args.min_score)
+        print(
+            f"Points: {stats.points}, Cells: {stats.cells}, Comparisons: {stats.comparisons}, "
+            f"Candidates: {stats.candidates}, Plans: {stats.plans}, Duplicates: {stats.dropped} "
+            f"({stats.seconds:.2f}s)"
+        )
+        if args.plan:
+            write_plans(plans, args.plan)
+            print(f"Merge plans written to {args.plan}")
+        if args.apply:
+            stats.applied = apply_plans(connection, args.table, plans, args.batch_size)
+            print(f"Applied: {stats.applied} plans, {stats.dropped} rows deleted")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return stats
+
+
+if __name__ == "__main__":
+    main()
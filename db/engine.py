@@ -1,45 +1,253 @@
-"""Database engine and session management."""
-from sqlalchemy import create_engine
+"""Database engine and session management.
+
+Engines, pools and session factories are created on first use, so importing
+this module reads no settings and opens no pool. ``engine``, ``async_engine``,
+``SessionLocal``, ``RoutingSessionLocal``, ``AsyncSessionLocal``,
+``replica_engines`` and ``replica_set`` remain importable by name; each is
+built when first accessed (or via the matching ``get_*`` function).
+"""
+import functools
+import threading
+from uuid import uuid4
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import Session
 
-from .config import settings
+from .config import get_settings
+from .metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument_engine
+from .routing import ReplicaSet, RoutingSession
+
+_build_lock = threading.RLock()
+
+
+def _once(build):
+    """Build on the first call and return the same object afterwards."""
+    built = []
+
+    @functools.wraps(build)
+    def get():
+        if not built:
+            with _build_lock:
+                if not built:
+                    built.append(build())
+        return built[0]
+
+    get.is_built = lambda: bool(built)
+    return get
+
+
+def _instrument(engine, name):
+    """Statement latency, rows, pool wait/churn and slow-query log (db.metrics)."""
+    settings = get_settings()
+    if settings.metrics_enabled:
+        instrument_engine(
+            engine,
+            name=name,
+            slow_query_ms=settings.slow_query_ms,
+            log_parameters=settings.slow_query_log_parameters,
+        )
+    return engine
+
+
+def get_connect_args() -> dict:
+    """psycopg2 connect arguments for the sync engines."""
+    settings = get_settings()
+    connect_args = {
+        "sslmode": "require",
+        "client_encoding": "utf8",
+        "connect_timeout": 60,
+    }
+
+    # Add schema to search_path if not using default 'public' schema
+    if settings.db_schema and settings.db_schema != 'public':
+        connect_args["options"] = f"-c search_path={settings.db_schema}"
+    return connect_args
+
+
+def get_async_connect_args() -> dict:
+    """asyncpg connect arguments for the async engine."""
+    settings = get_settings()
+    async_connect_args = {
+        "ssl": "require",
+        "timeout": 60,
+        "server_settings": {"client_encoding": "utf8"},
+    }
+
+    if settings.db_schema and settings.db_schema != 'public':
+        async_connect_args["server_settings"]["search_path"] = settings.db_schema
+
+    if settings.uses_transaction_pooler:
+        # The transaction pooler hands each transaction to an arbitrary backend, so
+        # named prepared statements from a previous transaction may not exist (or may
+        # clash). Disable asyncpg's statement cache and SQLAlchemy's prepared
+        # statement cache, and give every statement a unique name.
+        async_connect_args["statement_cache_size"] = 0
+        async_connect_args["prepared_statement_cache_size"] = 0
+        async_connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    return async_connect_args
+
+
+@_once
+def get_engine():
+    """Synchronous engine (psycopg2)."""
+    settings = get_settings()
+    engine = create_engine(
+        settings.database_url,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        echo=False,  # Set to True for SQL debugging
+        connect_args=get_connect_args(),
+        poolclass=TimedQueuePool,
+    )
+    return _instrument(engine, "sync")
+
+
+@_once
+def get_session_factory():
+    """Session factory bound to the primary."""
+    return sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=get_engine(),
+        class_=Session,
+    )
 
 
-# Synchronous engine
-connect_args = {
-    "sslmode": "require",
-    "client_encoding": "utf8",
-    "connect_timeout": 60,
+@_once
+def get_replica_set():
+    """Read replicas (see db.routing)."""
+    settings = get_settings()
+    # A short connect timeout keeps a dead replica from stalling the health check
+    connect_args = {**get_connect_args(), "connect_timeout": settings.replica_connect_timeout}
+    replica_engines = [
+        create_engine(
+            url,
+            pool_size=settings.pool_size,
+            max_overflow=settings.max_overflow,
+            pool_timeout=settings.pool_timeout,
+            pool_recycle=settings.pool_recycle,
+            pool_pre_ping=True,
+            echo=False,
+            connect_args=connect_args,
+            poolclass=TimedQueuePool,
+        )
+        for url in settings.replica_database_urls
+    ]
+    replica_set = ReplicaSet(
+        replica_engines,
+        max_lag_seconds=settings.replica_max_lag_seconds,
+        check_interval=settings.replica_check_interval,
+    )
+
+    def mark_replica_down(exception_context):
+        # Take a replica out of rotation as soon as it drops connections
+        if exception_context.is_disconnect:
+            replica_set.mark_down(exception_context.engine, str(exception_context.original_exception))
+
+    for i, replica in enumerate(replica_engines):
+        event.listen(replica, "handle_error", mark_replica_down)
+        _instrument(replica, f"replica{i}")
+    return replica_set
+
+
+@_once
+def get_routing_session_factory():
+    """Session factory routing reads to replicas and writes to the primary."""
+    return sessionmaker(
+        class_=RoutingSession,
+        autoflush=False,
+        primary=get_engine(),
+        replicas=get_replica_set(),
+    )
+
+
+@_once
+def get_async_engine():
+    """Asynchronous engine (asyncpg)."""
+    # sqlalchemy.ext.asyncio is only imported by processes that use it
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    settings = get_settings()
+    async_engine = create_async_engine(
+        settings.async_database_url,
+        pool_size=settings.async_pool_size,
+        max_overflow=settings.async_max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=True,
+        echo=False,
+        connect_args=get_async_connect_args(),
+        poolclass=TimedAsyncAdaptedQueuePool,
+    )
+    return _instrument(async_engine, "async")
+
+
+@_once
+def get_async_session_factory():
+    """Async session factory."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    return async_sessionmaker(
+        bind=get_async_engine(),
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+def dispose_engines() -> None:
+    """Close the pools of the engines built so far (e.g. at the end of a job)."""
+    if get_engine.is_built():
+        get_engine().dispose()
+    if get_replica_set.is_built():
+        for replica in get_replica_set().engines:
+            replica.dispose()
+    if get_async_engine.is_built():
+        get_async_engine().sync_engine.dispose()
+
+
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "SessionLocal": get_session_factory,
+    "replica_set": get_replica_set,
+    "replica_engines": lambda: get_replica_set().engines,
+    "RoutingSessionLocal": get_routing_session_factory,
+    "async_engine": get_async_engine,
+    "AsyncSessionLocal": get_async_session_factory,
+    "connect_args": get_connect_args,
+    "async_connect_args": get_async_connect_args,
 }
 
-# Add schema to search_path if not using default 'public' schema
-if settings.db_schema and settings.db_schema != 'public':
-    connect_args["options"] = f"-c search_path={settings.db_schema}"
-
-engine = create_engine(
-    settings.database_url,
-    pool_size=settings.pool_size,
-    max_overflow=settings.max_overflow,
-    pool_timeout=settings.pool_timeout,
-    pool_recycle=settings.pool_recycle,
-    echo=False,  # Set to True for SQL debugging
-    connect_args=connect_args
-)
-
-# Session factory
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine,
-    class_=Session,
-)
+
+def __getattr__(name):
+    # Module-level engines and factories, built on first access
+    try:
+        factory = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return factory()
 
 
 def get_session():
     """Get a database session."""
-    with SessionLocal() as session:
+    with get_session_factory()() as session:
         try:
             yield session
         finally:
-            session.close() 
\ No newline at end of file
+            session.close()
+
+
+def get_routing_session():
+    """Get a session whose reads go to a read replica when one is healthy."""
+    with get_routing_session_factory()() as session:
+        yield session
+
+
+async def get_async_session():
+    """Get an async database session."""
+    async with get_async_session_factory()() as session:
+        yield session
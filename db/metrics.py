@@ -0,0 +1,380 @@
+"""Statement, row-mapping and pool metrics for the SQLAlchemy engines.
+
+``instrument_engine`` attaches event hooks that record, per engine:
+
+* statement latency histograms keyed by the SQL function called
+  (``find_nearest_toilets``, ``get_toilets_deterministic_v3``, ...) or by
+  verb and table for plain statements (``select toilet_location``);
+* rows returned per statement label, and errors;
+* pool checkout wait (with a ``Timed*Pool`` pool class) and connection
+  churn (connects, closes, invalidations, checkouts);
+* a slow-query log on the ``db.slow_query`` logger above a threshold.
+
+``QueryMetrics.time_mapping`` times the Python row mapping in
+``db.services``, so a slow request can be attributed to PostGIS, the pool
+or Python. Everything is exported with ``to_prometheus()`` (text
+exposition format) or ``to_dict()`` / ``to_json()``.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+slow_query_logger = logging.getLogger("db.slow_query")
+
+# Upper bounds in seconds (Prometheus "le"); +Inf is implicit
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Functions that are not worth a label of their own in "SELECT f(...)"
+_BUILTIN_FUNCTIONS = {"count", "sum", "min", "max", "avg", "coalesce", "now", "version", "exists"}
+
+_FROM_FUNCTION = re.compile(r"\bFROM\s+(?:\w+\.)?(\w+)\s*\(", re.IGNORECASE)
+_SELECT_FUNCTION = re.compile(r"^\s*SELECT\s+(?:\w+\.)?(\w+)\s*\(", re.IGNORECASE)
+_TABLE = re.compile(
+    r"\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+(?:\w+\.)?\"?(\w+)", re.IGNORECASE
+)
+
+_STARTED_KEY = "db_metrics_started"
+
+
+@lru_cache(maxsize=2048)
+def statement_label(statement: str) -> str:
+    """Low-cardinality label for a SQL statement.
+
+    The SQL function called (``find_nearest_toilets``), else the verb and
+    first table (``select toilet_location``), else the verb.
+    """
+    match = _FROM_FUNCTION.search(statement)
+    if match:
+        return match.group(1).lower()
+    match = _SELECT_FUNCTION.match(statement)
+    if match and match.group(1).lower() not in _BUILTIN_FUNCTIONS:
+        return match.group(1).lower()
+    words = statement.split(None, 1)
+    verb = words[0].lower() if words else "unknown"
+    match = _TABLE.search(statement)
+    return f"{verb} {match.group(1).lower()}" if match else verb
+
+
+class Histogram:
+    """Fixed-bucket histogram (not thread-safe; QueryMetrics holds the lock)."""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cumulative count) pairs including +Inf."""
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return pairs
+
+    def quantile(self, q: float) -> float:
+        """Bucket upper bound containing the q-quantile (an over-estimate)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class QueryMetrics:
+    """Thread-safe registry of statement, row-mapping and pool metrics."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._engines: Dict[str, object] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop every recorded value (registered engines are kept)."""
+        with self._lock:
+            # (engine, label) keys
+            self.statements: Dict[Tuple[str, str], Histogram] = {}
+            self.rows: Dict[Tuple[str, str], int] = {}
+            self.errors: Dict[Tuple[str, str], int] = {}
+            self.slow: Dict[Tuple[str, str], int] = {}
+            # engine keys
+            self.checkout_wait: Dict[str, Histogram] = {}
+            # (engine, event) keys: connect, close, invalidate, checkout, checkin
+            self.pool_events: Dict[Tuple[str, str], int] = {}
+            # (rows, mode) keys
+            self.mapping: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe_statement(self, engine: str, label: str, seconds: float, rows: Optional[int]) -> None:
+        key = (engine, label)
+        with self._lock:
+            histogram = self.statements.get(key)
+            if histogram is None:
+                histogram = self.statements[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if rows is not None:
+                self.rows[key] = self.rows.get(key, 0) + rows
+
+    def observe_error(self, engine: str, label: str) -> None:
+        with self._lock:
+            self.errors[(engine, label)] = self.errors.get((engine, label), 0) + 1
+
+    def observe_slow(self, engine: str, label: str) -> None:
+        with self._lock:
+            self.slow[(engine, label)] = self.slow.get((engine, label), 0) + 1
+
+    def observe_checkout_wait(self, engine: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.checkout_wait.get(engine)
+            if histogram is None:
+                histogram = self.checkout_wait[engine] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count_pool_event(self, engine: str, name: str) -> None:
+        with self._lock:
+            self.pool_events[(engine, name)] = self.pool_events.get((engine, name), 0) + 1
+
+    def observe_mapping(self, rows: str, mode: str, seconds: float) -> None:
+        key = (rows, mode)
+        with self._lock:
+            histogram = self.mapping.get(key)
+            if histogram is None:
+                histogram = self.mapping[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time_mapping(self, rows: str, mode: str) -> Iterator[None]:
+        """Time a block of Python row mapping."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_mapping(rows, mode, time.perf_counter() - started)
+
+    def register_engine(self, name: str, engine) -> None:
+        """Report live pool gauges (checked out, size, overflow) for engine."""
+        self._engines[name] = engine
+
+    def _pool_gauges(self) -> Dict[str, Dict[str, int]]:
+        gauges = {}
+        for name, engine in self._engines.items():
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                gauges[name] = {
+                    "checked_out": pool.checkedout(),
+                    "size": pool.size(),
+                    "overflow": max(pool.overflow(), 0),
+                }
+        return gauges
+
+    def to_dict(self) -> dict:
+        """JSON-serializable snapshot of every metric."""
+        with self._lock:
+            statements: Dict[str, Dict[str, dict]] = {}
+            for (engine, label), histogram in self.statements.items():
+                entry = histogram.to_dict()
+                entry["rows"] = self.rows.get((engine, label), 0)
+                entry["errors"] = self.errors.get((engine, label), 0)
+                entry["slow"] = self.slow.get((engine, label), 0)
+                statements.setdefault(engine, {})[label] = entry
+            pool: Dict[str, dict] = {}
+            for engine, histogram in self.checkout_wait.items():
+                pool.setdefault(engine, {})["checkout_wait"] = histogram.to_dict()
+            for (engine, name), count in self.pool_events.items():
+                pool.setdefault(engine, {}).setdefault("events", {})[name] = count
+            mapping: Dict[str, Dict[str, dict]] = {}
+            for (rows, mode), histogram in self.mapping.items():
+                mapping.setdefault(rows, {})[mode] = histogram.to_dict()
+        for engine, gauges in self._pool_gauges().items():
+            pool.setdefault(engine, {}).update(gauges)
+        return {"statements": statements, "pool": pool, "row_mapping": mapping}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self, prefix: str = "toilet_db") -> str:
+        """Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def histograms(name: str, help_text: str, items: Dict[Tuple[str, ...], Histogram], label_names):
+            if not items:
+                return
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for key, histogram in sorted(items.items()):
+                labels = _labels(label_names, key)
+                for le, count in histogram.cumulative():
+                    lines.append(f'{prefix}_{name}_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"{prefix}_{name}_sum{{{labels}}} {histogram.sum!r}")
+                lines.append(f"{prefix}_{name}_count{{{labels}}} {histogram.count}")
+
+        def samples(name: str, kind: str, help_text: str, items: Dict[Tuple[str, ...], int], label_names):
+            if not items:
+                return
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for key, value in sorted(items.items()):
+                lines.append(f"{prefix}_{name}{{{_labels(label_names, key)}}} {value}")
+
+        with self._lock:
+            histograms("statement_duration_seconds", "Statement execution time (cursor execute, including fetch).",
+                       self.statements, ("engine", "statement"))
+            samples("statement_rows_total", "counter", "Rows returned by statements.",
+                    self.rows, ("engine", "statement"))
+            samples("statement_errors_total", "counter", "Statements that raised.",
+                    self.errors, ("engine", "statement"))
+            samples("statement_slow_total", "counter", "Statements slower than the slow-query threshold.",
+                    self.slow, ("engine", "statement"))
+            histograms("pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+                       {(engine,): histogram for engine, histogram in self.checkout_wait.items()}, ("engine",))
+            samples("pool_events_total", "counter", "Pool connection events (connect, close, invalidate, checkout, checkin).",
+                    self.pool_events, ("engine", "event"))
+            histograms("row_mapping_seconds", "Python time spent mapping result rows.",
+                       self.mapping, ("rows", "mode"))
+
+        gauges = {
+            (engine, gauge): value
+            for engine, values in self._pool_gauges().items()
+            for gauge, value in values.items()
+        }
+        for gauge in ("checked_out", "size", "overflow"):
+            values = {(engine,): value for (engine, name), value in gauges.items() if name == gauge}
+            samples(f"pool_{gauge}", "gauge", f"Current pool {gauge.replace('_', ' ')} connections.",
+                    values, ("engine",))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+class _TimedCheckout:
+    """Pool mixin timing how long checkouts wait for a connection."""
+
+    observe_checkout: Optional[Callable[[float], None]] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.observe_checkout is not None:
+                self.observe_checkout(time.perf_counter() - started)
+
+    def recreate(self):
+        # engine.dispose() replaces the pool; keep reporting from the new one
+        pool = super().recreate()
+        pool.observe_checkout = self.observe_checkout
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool reporting checkout wait to instrument_engine."""
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool reporting checkout wait to instrument_engine."""
+
+
+def _shorten(statement: str, limit: int = 500) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+def instrument_engine(
+    engine,
+    metrics: Optional[QueryMetrics] = None,
+    name: str = "sync",
+    slow_query_ms: Optional[float] = None,
+    log_parameters: bool = False,
+) -> QueryMetrics:
+    """Attach statement and pool hooks to a sync or async engine.
+
+    Statements slower than slow_query_ms are logged on ``db.slow_query``
+    (with their bind parameters only if log_parameters is set).
+    """
+    metrics = metrics or default_metrics
+    sync_engine = getattr(engine, "sync_engine", engine)
+    slow_seconds = slow_query_ms / 1000 if slow_query_ms is not None else None
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_STARTED_KEY, []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info[_STARTED_KEY].pop()
+        label = statement_label(statement)
+        rows = None
+        if cursor.description is not None and cursor.rowcount >= 0:
+            rows = cursor.rowcount
+        metrics.observe_statement(name, label, seconds, rows)
+        if slow_seconds is not None and seconds >= slow_seconds:
+            metrics.observe_slow(name, label)
+            slow_query_logger.warning(
+                "Slow query on %s engine (%s, %.1f ms, %s rows): %s%s",
+                name, label, seconds * 1000, "?" if rows is None else rows, _shorten(statement),
+                f" parameters={parameters!r}" if log_parameters else "",
+            )
+
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get(_STARTED_KEY):
+            conn.info[_STARTED_KEY].pop()
+        if exception_context.statement is not None:
+            metrics.observe_error(name, statement_label(exception_context.statement))
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+    for pool_event in ("connect", "close", "invalidate", "checkout", "checkin"):
+        event.listen(
+            sync_engine, pool_event,
+            lambda *args, _event=pool_event: metrics.count_pool_event(name, _event),
+        )
+
+    if isinstance(sync_engine.pool, _TimedCheckout):
+        sync_engine.pool.observe_checkout = lambda seconds: metrics.observe_checkout_wait(name, seconds)
+    metrics.register_engine(name, sync_engine)
+    return metrics
+
+
+default_metrics = QueryMetrics()
@@ -5,14 +5,15 @@ from alembic import context
 
 # Import your models here to ensure they are registered with SQLModel
 from db.models import *  # noqa: F401, F403
-from db.config import settings
+from db.config import get_settings
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
-# Set the database URL
-config.set_main_option("sqlalchemy.url", settings.database_url)
+# Set the database URL, unless a caller (e.g. the benchmarks) passes a connection
+if config.attributes.get("connection") is None:
+    config.set_main_option("sqlalchemy.url", get_settings().database_url)
 
 # Interpret the config file for Python logging.
 if config.config_file_name is not None:
@@ -40,6 +41,13 @@ def run_migrations_offline() -> None:
 
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode."""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata, transaction_per_migration=True)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -47,9 +55,12 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # One transaction per migration: backfills (db.backfill) commit the
+        # migration so far before running their chunks in autocommit
         context.configure(
             connection=connection, 
             target_metadata=target_metadata,
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
@@ -10,6 +10,8 @@ import sqlalchemy as sa
 import sqlmodel
 import geoalchemy2
 
+from db.backfill import Backfill, run_in_migration
+
 
 # revision identifiers, used by Alembic.
 revision = 'e3a2cb33db43'
@@ -18,13 +20,25 @@ branch_labels = None
 depends_on = None
 
 
+# Geometry at this revision only; db.backfill.TOILET_LOCATION_GEOM is the
+# current-schema version for later runs
+GEOM_BACKFILL = Backfill(
+    name="e3a2cb33db43_geom",
+    table="toilet_location",
+    statement="""
+        UPDATE toilet_location t
+        SET geom = ST_SetSRID(ST_MakePoint(t.lng, t.lat), 4326)
+        FROM chunk
+        WHERE t.id = chunk.key AND t.lng IS NOT NULL AND t.lat IS NOT NULL AND t.geom IS NULL
+        RETURNING t.id
+    """,
+)
+
+
 def upgrade() -> None:
-    # Update geometry data from existing lat/lng coordinates
-    op.execute("""
-        UPDATE toilet_location 
-        SET geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326) 
-        WHERE lng IS NOT NULL AND lat IS NOT NULL AND geom IS NULL;
-    """)
+    # Update geometry data from existing lat/lng coordinates, in resumable
+    # chunks instead of one full-table UPDATE
+    run_in_migration(GEOM_BACKFILL)
     
     # Create a trigger to automatically update geometry when lat/lng changes
     op.execute("""
@@ -0,0 +1,74 @@
+"""add_find_nearest_toilets_batch
+
+Revision ID: 3b7c1d9e4f20
+Revises: e3a2cb33db43
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7c1d9e4f20'
+down_revision = 'e3a2cb33db43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Nearest toilets for many points in one statement: unnest the input
+    # arrays and run the same KNN as find_nearest_toilets per point.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets_batch(
+            user_lats double precision[],
+            user_lngs double precision[],
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3
+        )
+        RETURNS TABLE (
+            point_index integer,
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying, 
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+        BEGIN
+            IF coalesce(array_length(user_lats, 1), 0) <> coalesce(array_length(user_lngs, 1), 0) THEN
+                RAISE EXCEPTION 'user_lats and user_lngs must have the same length';
+            END IF;
+
+            RETURN QUERY
+            SELECT (p.ord - 1)::integer,
+                   n.id, n.name, n.lat, n.lng, n.address, n.accessible, n.is_free,
+                   n.type, n.status, n.notes, n.city, n.open_hours,
+                   n.distance, n.created_at
+            FROM unnest(user_lats, user_lngs) WITH ORDINALITY AS p(p_lat, p_lng, ord)
+            CROSS JOIN LATERAL (
+                SELECT k.*, row_number() OVER () AS rank
+                FROM (
+                    SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                           t.type, t.status, t.notes, t.city, t.open_hours,
+                           ST_Distance(t.geom, ST_SetSRID(ST_MakePoint(p.p_lng, p.p_lat), 4326)::geography)::double precision AS distance,
+                           t.created_at
+                    FROM toilet_location t
+                    WHERE ST_DWithin(t.geom, ST_SetSRID(ST_MakePoint(p.p_lng, p.p_lat), 4326)::geography, radius_meters)
+                    ORDER BY t.geom <-> ST_SetSRID(ST_MakePoint(p.p_lng, p.p_lat), 4326)
+                    LIMIT result_limit
+                ) k
+            ) n
+            ORDER BY p.ord, n.rank;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DROP FUNCTION IF EXISTS find_nearest_toilets_batch(
+            double precision[], double precision[], double precision, integer
+        )
+    """)
@@ -0,0 +1,36 @@
+"""add_osm_id_and_version
+
+Revision ID: 5a2e8c41b7d3
+Revises: 3b7c1d9e4f20
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = '5a2e8c41b7d3'
+down_revision = '3b7c1d9e4f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # OpenStreetMap identity so imports can upsert instead of duplicating rows
+    op.add_column('toilet_location', sa.Column('osm_id', sa.BigInteger(), nullable=True))
+    op.add_column('toilet_location', sa.Column('osm_version', sa.Integer(), nullable=True))
+    
+    # Unique (NULLs allowed for non-OSM rows); target of ON CONFLICT (osm_id)
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_toilet_location_osm_id
+        ON toilet_location (osm_id);
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS uq_toilet_location_osm_id")
+    op.drop_column('toilet_location', 'osm_version')
+    op.drop_column('toilet_location', 'osm_id')
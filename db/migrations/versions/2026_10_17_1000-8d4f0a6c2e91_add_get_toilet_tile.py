@@ -0,0 +1,62 @@
+"""add_get_toilet_tile
+
+Revision ID: 8d4f0a6c2e91
+Revises: 5a2e8c41b7d3
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4f0a6c2e91'
+down_revision = '5a2e8c41b7d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Mapbox Vector Tile for one z/x/y cell, layer "toilets" (requires PostGIS >= 3.1)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION get_toilet_tile(
+            z integer, x integer, y integer,
+            max_features integer DEFAULT 4096
+        )
+        RETURNS bytea
+        AS $$
+        DECLARE
+            tile bytea;
+            tile_bounds geometry;
+        BEGIN
+            IF z < 0 OR z > 24 OR x < 0 OR y < 0 OR x >= (1 << z) OR y >= (1 << z) THEN
+                RAISE EXCEPTION 'Invalid tile coordinates: %/%/%', z, x, y;
+            END IF;
+
+            -- 64/4096 margin so markers near the edge are drawn on both tiles
+            tile_bounds := ST_TileEnvelope(z, x, y, margin => 64.0 / 4096);
+
+            SELECT ST_AsMVT(mvt, 'toilets', 4096, 'geom')
+            INTO tile
+            FROM (
+                SELECT ST_AsMVTGeom(ST_Transform(t.geom, 3857), ST_TileEnvelope(z, x, y), 4096, 64, true) AS geom,
+                       t.id::text AS id, t.name, t.accessible, t.is_free, t.type, t.status,
+                       t.open_hours, t.address, t.city
+                FROM toilet_location t
+                WHERE t.geom && ST_Transform(tile_bounds, 4326)
+                -- A stable pick, so an over-full tile (and its ETag) is reproducible
+                ORDER BY t.id
+                LIMIT max_features
+            ) mvt
+            WHERE mvt.geom IS NOT NULL;
+
+            RETURN coalesce(tile, ''::bytea);
+        END;
+        $$ LANGUAGE plpgsql STABLE PARALLEL SAFE;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS get_toilet_tile(integer, integer, integer, integer)")
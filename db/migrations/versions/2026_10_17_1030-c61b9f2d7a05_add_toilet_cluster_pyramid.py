@@ -0,0 +1,305 @@
+"""add_toilet_cluster_pyramid
+
+Revision ID: c61b9f2d7a05
+Revises: 8d4f0a6c2e91
+Create Date: 2026-10-17 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = 'c61b9f2d7a05'
+down_revision = '8d4f0a6c2e91'
+branch_labels = None
+depends_on = None
+
+# Keep in sync with db.models.toilets.CLUSTER_MAX_ZOOM / CLUSTER_GRID_OFFSET
+CLUSTER_MAX_ZOOM = 14
+CLUSTER_GRID_OFFSET = 2
+
+
+def upgrade() -> None:
+    # One row per (zoom, cell); sums are kept so the centroid can be
+    # maintained incrementally. Cells at map zoom z are web-mercator tiles
+    # at level z + CLUSTER_GRID_OFFSET (4x4 cells per map tile).
+    op.create_table(
+        'toilet_cluster',
+        sa.Column('zoom', sa.SMALLINT(), nullable=False),
+        sa.Column('cell_x', sa.INTEGER(), nullable=False),
+        sa.Column('cell_y', sa.INTEGER(), nullable=False),
+        sa.Column('count', sa.INTEGER(), nullable=False),
+        sa.Column('sum_lat', sa.FLOAT(), nullable=False),
+        sa.Column('sum_lng', sa.FLOAT(), nullable=False),
+        sa.Column('representative_id', sa.UUID(), nullable=True),
+        sa.PrimaryKeyConstraint('zoom', 'cell_x', 'cell_y')
+    )
+    
+    # Covering index so viewport lookups are index-only scans
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_toilet_cluster_lookup
+        ON toilet_cluster (zoom, cell_x, cell_y)
+        INCLUDE (count, sum_lat, sum_lng, representative_id);
+    """)
+    
+    # toilet_cluster_fix_representatives looks cells up by representative
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_toilet_cluster_representative
+        ON toilet_cluster (representative_id);
+    """)
+    
+    # Pending pyramid changes: +1 / -1 per toilet position written. Writers
+    # only append here, so they never wait on the shared low-zoom cells;
+    # toilet_cluster_fold() folds the queue into toilet_cluster.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS toilet_cluster_delta (
+            seq bigserial PRIMARY KEY,
+            id uuid NOT NULL,
+            lat double precision NOT NULL,
+            lng double precision NOT NULL,
+            sign smallint NOT NULL
+        );
+    """)
+    
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION toilet_cluster_cell(
+            p_lat double precision, p_lng double precision, p_zoom integer
+        )
+        RETURNS TABLE (cell_x integer, cell_y integer)
+        AS $$
+            SELECT
+                least(greatest(floor((p_lng + 180.0) / 360.0 * n), 0), n - 1)::integer,
+                least(greatest(floor(
+                    (1.0 - ln(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi()) / 2.0 * n
+                ), 0), n - 1)::integer
+            FROM (
+                SELECT (1 << (p_zoom + {CLUSTER_GRID_OFFSET}))::double precision AS n,
+                       least(greatest(p_lat, -85.0511287798), 85.0511287798) AS lat
+            ) g;
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+    """)
+    
+    # Applies signed deltas (+1 add, -1 remove) per cell. Cells are upserted
+    # in (zoom, cell_x, cell_y) order, so concurrent callers lock them in the
+    # same order and cannot deadlock.
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION toilet_cluster_apply(
+            p_ids uuid[], p_lats double precision[], p_lngs double precision[], p_signs smallint[]
+        )
+        RETURNS void
+        AS $$
+        DECLARE
+            empty_zooms smallint[]; empty_xs integer[]; empty_ys integer[];
+        BEGIN
+            WITH changed AS (
+                INSERT INTO toilet_cluster AS tc (zoom, cell_x, cell_y, count, sum_lat, sum_lng, representative_id)
+                SELECT z.zoom, c.cell_x, c.cell_y, sum(r.sign)::integer,
+                       sum(r.sign * r.lat), sum(r.sign * r.lng),
+                       min(r.id::text) FILTER (WHERE r.sign > 0)::uuid
+                FROM unnest(p_ids, p_lats, p_lngs, p_signs) AS r(id, lat, lng, sign)
+                CROSS JOIN generate_series(0, {CLUSTER_MAX_ZOOM}) AS z(zoom)
+                CROSS JOIN LATERAL toilet_cluster_cell(r.lat, r.lng, z.zoom) c
+                WHERE r.lat IS NOT NULL AND r.lng IS NOT NULL
+                GROUP BY z.zoom, c.cell_x, c.cell_y
+                ORDER BY z.zoom, c.cell_x, c.cell_y
+                ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET
+                    count = tc.count + EXCLUDED.count,
+                    sum_lat = tc.sum_lat + EXCLUDED.sum_lat,
+                    sum_lng = tc.sum_lng + EXCLUDED.sum_lng,
+                    representative_id = coalesce(
+                        least(tc.representative_id, EXCLUDED.representative_id),
+                        tc.representative_id, EXCLUDED.representative_id
+                    )
+                RETURNING tc.zoom, tc.cell_x, tc.cell_y, tc.count
+            )
+            SELECT array_agg(zoom), array_agg(cell_x), array_agg(cell_y)
+            INTO empty_zooms, empty_xs, empty_ys
+            FROM changed
+            WHERE count <= 0;
+            
+            -- Only the cells emptied above, by primary key (a statement cannot
+            -- delete the rows its own INSERT CTE changed, hence two statements)
+            IF empty_zooms IS NOT NULL THEN
+                DELETE FROM toilet_cluster tc
+                USING unnest(empty_zooms, empty_xs, empty_ys) AS e(zoom, cell_x, cell_y)
+                WHERE tc.zoom = e.zoom AND tc.cell_x = e.cell_x AND tc.cell_y = e.cell_y
+                  AND tc.count <= 0;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    
+    # Representatives that were removed or moved are re-picked from the
+    # toilets still in the cell (bbox-filtered through the geom GiST index).
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION toilet_cluster_fix_representatives(p_ids uuid[])
+        RETURNS void
+        AS $$
+        BEGIN
+            UPDATE toilet_cluster tc
+            SET representative_id = (
+                SELECT t.id
+                FROM toilet_location t
+                WHERE t.geom && ST_Transform(ST_TileEnvelope(tc.zoom + {CLUSTER_GRID_OFFSET}, tc.cell_x, tc.cell_y), 4326)
+                  AND EXISTS (
+                      SELECT 1 FROM toilet_cluster_cell(t.lat, t.lng, tc.zoom) c
+                      WHERE c.cell_x = tc.cell_x AND c.cell_y = tc.cell_y
+                  )
+                ORDER BY t.id
+                LIMIT 1
+            )
+            WHERE tc.representative_id = ANY(p_ids);
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    
+    # Statement-level triggers with transition tables queue one delta per
+    # written position; only rows whose position changed affect the pyramid.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_toilet_cluster()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO toilet_cluster_delta (id, lat, lng, sign)
+                SELECT n.id, n.lat, n.lng, 1 FROM new_rows n
+                WHERE n.lat IS NOT NULL AND n.lng IS NOT NULL;
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO toilet_cluster_delta (id, lat, lng, sign)
+                SELECT o.id, o.lat, o.lng, -1 FROM old_rows o
+                WHERE o.lat IS NOT NULL AND o.lng IS NOT NULL;
+            ELSE
+                INSERT INTO toilet_cluster_delta (id, lat, lng, sign)
+                SELECT d.id, d.lat, d.lng, d.sign
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                CROSS JOIN LATERAL (VALUES (o.id, o.lat, o.lng, -1), (n.id, n.lat, n.lng, 1)) AS d(id, lat, lng, sign)
+                WHERE (o.lat, o.lng) IS DISTINCT FROM (n.lat, n.lng)
+                  AND d.lat IS NOT NULL AND d.lng IS NOT NULL;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    
+    # Folds up to max_rows queued deltas into toilet_cluster and returns how
+    # many it folded (0 when another fold is running). Run it periodically
+    # (db-clusters --watch) and after bulk loads; get_toilet_clusters lags
+    # the table by the deltas still queued.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION toilet_cluster_fold(max_rows integer DEFAULT 100000)
+        RETURNS integer
+        AS $$
+        DECLARE
+            ids uuid[]; lats double precision[]; lngs double precision[]; signs smallint[];
+            removed uuid[];
+        BEGIN
+            IF NOT pg_try_advisory_xact_lock(hashtext('toilet_cluster_fold')) THEN
+                RETURN 0;
+            END IF;
+            
+            WITH taken AS (
+                DELETE FROM toilet_cluster_delta d
+                WHERE d.seq IN (SELECT q.seq FROM toilet_cluster_delta q ORDER BY q.seq LIMIT max_rows)
+                RETURNING d.id, d.lat, d.lng, d.sign
+            )
+            SELECT array_agg(id), array_agg(lat), array_agg(lng), array_agg(sign),
+                   array_agg(id) FILTER (WHERE sign < 0)
+            INTO ids, lats, lngs, signs, removed
+            FROM taken;
+            
+            IF ids IS NULL THEN
+                RETURN 0;
+            END IF;
+            PERFORM toilet_cluster_apply(ids, lats, lngs, signs);
+            IF removed IS NOT NULL THEN
+                PERFORM toilet_cluster_fix_representatives(removed);
+            END IF;
+            RETURN cardinality(ids);
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    
+    op.execute("""
+        DROP TRIGGER IF EXISTS trigger_toilet_cluster_insert ON toilet_location;
+        CREATE TRIGGER trigger_toilet_cluster_insert
+            AFTER INSERT ON toilet_location
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION update_toilet_cluster();
+        
+        DROP TRIGGER IF EXISTS trigger_toilet_cluster_update ON toilet_location;
+        CREATE TRIGGER trigger_toilet_cluster_update
+            AFTER UPDATE ON toilet_location
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION update_toilet_cluster();
+        
+        DROP TRIGGER IF EXISTS trigger_toilet_cluster_delete ON toilet_location;
+        CREATE TRIGGER trigger_toilet_cluster_delete
+            AFTER DELETE ON toilet_location
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION update_toilet_cluster();
+    """)
+    
+    # Build the pyramid for existing rows
+    op.execute(f"""
+        INSERT INTO toilet_cluster (zoom, cell_x, cell_y, count, sum_lat, sum_lng, representative_id)
+        SELECT z.zoom, c.cell_x, c.cell_y, count(*), sum(t.lat), sum(t.lng),
+               (array_agg(t.id ORDER BY t.id))[1]
+        FROM toilet_location t
+        CROSS JOIN generate_series(0, {CLUSTER_MAX_ZOOM}) AS z(zoom)
+        CROSS JOIN LATERAL toilet_cluster_cell(t.lat, t.lng, z.zoom) c
+        WHERE t.lat IS NOT NULL AND t.lng IS NOT NULL
+        GROUP BY z.zoom, c.cell_x, c.cell_y;
+    """)
+    
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION get_toilet_clusters(
+            min_lat double precision, min_lng double precision,
+            max_lat double precision, max_lng double precision,
+            p_zoom integer
+        )
+        RETURNS TABLE (
+            zoom integer, cell_x integer, cell_y integer, count integer,
+            lat double precision, lng double precision, representative_id uuid
+        )
+        AS $$
+        DECLARE
+            z integer := least(greatest(p_zoom, 0), {CLUSTER_MAX_ZOOM});
+            x0 integer; y0 integer; x1 integer; y1 integer;
+        BEGIN
+            -- Tile y grows southwards: the north-west corner has the smallest x/y
+            SELECT c.cell_x, c.cell_y INTO x0, y0 FROM toilet_cluster_cell(max_lat, min_lng, z) c;
+            SELECT c.cell_x, c.cell_y INTO x1, y1 FROM toilet_cluster_cell(min_lat, max_lng, z) c;
+            
+            RETURN QUERY
+            SELECT tc.zoom::integer, tc.cell_x, tc.cell_y, tc.count,
+                   tc.sum_lat / tc.count, tc.sum_lng / tc.count, tc.representative_id
+            FROM toilet_cluster tc
+            WHERE tc.zoom = z
+              AND tc.cell_x BETWEEN x0 AND x1
+              AND tc.cell_y BETWEEN y0 AND y1;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DROP FUNCTION IF EXISTS get_toilet_clusters(
+            double precision, double precision, double precision, double precision, integer
+        )
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trigger_toilet_cluster_insert ON toilet_location")
+    op.execute("DROP TRIGGER IF EXISTS trigger_toilet_cluster_update ON toilet_location")
+    op.execute("DROP TRIGGER IF EXISTS trigger_toilet_cluster_delete ON toilet_location")
+    op.execute("DROP FUNCTION IF EXISTS update_toilet_cluster()")
+    op.execute("DROP FUNCTION IF EXISTS toilet_cluster_fold(integer)")
+    op.execute("DROP FUNCTION IF EXISTS toilet_cluster_fix_representatives(uuid[])")
+    op.execute(
+        "DROP FUNCTION IF EXISTS toilet_cluster_apply(uuid[], double precision[], double precision[], smallint[])"
+    )
+    op.execute("DROP TABLE IF EXISTS toilet_cluster_delta")
+    op.execute("DROP FUNCTION IF EXISTS toilet_cluster_cell(double precision, double precision, integer)")
+    op.drop_table('toilet_cluster')
@@ -0,0 +1,210 @@
+"""add_country_boundary_lookup
+
+Revision ID: e47a3c8b1f62
+Revises: c61b9f2d7a05
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e47a3c8b1f62'
+down_revision = 'c61b9f2d7a05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Country polygons, loaded with `db-countries <file.geojson>`
+    op.create_table(
+        'country_boundary',
+        sa.Column('country_code', postgresql.ENUM('CH', 'FR', 'DE', 'IT', 'AT', name='countrycode', create_type=False), nullable=False),
+        sa.Column('name', sa.VARCHAR(), nullable=True),
+        sa.Column('geom', geoalchemy2.Geometry(geometry_type='MULTIPOLYGON', srid=4326, spatial_index=False), nullable=False),
+        sa.PrimaryKeyConstraint('country_code')
+    )
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_country_boundary_geom
+        ON country_boundary USING gist (geom);
+    """)
+    
+    # Country at a point: polygon lookup, falling back to the previous
+    # K-nearest-toilets vote (e.g. offshore or before boundaries are loaded)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION infer_country_code(
+            p_lat double precision, p_lng double precision
+        )
+        RETURNS text
+        AS $$
+        DECLARE
+            point_geom geometry := ST_SetSRID(ST_MakePoint(p_lng, p_lat), 4326);
+            result text;
+        BEGIN
+            SELECT b.country_code::text INTO result
+            FROM country_boundary b
+            WHERE ST_Contains(b.geom, point_geom)
+            LIMIT 1;
+            
+            IF result IS NULL THEN
+                SELECT (mode() WITHIN GROUP (ORDER BY nk.country_code))::text
+                INTO result
+                FROM (
+                    SELECT t.country_code
+                    FROM toilet_location t
+                    WHERE t.geom IS NOT NULL AND t.country_code IS NOT NULL
+                    ORDER BY t.geom <-> point_geom
+                    LIMIT 5
+                ) nk;
+            END IF;
+            
+            RETURN coalesce(result, 'CH');
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+    
+    # Deterministic fetch for an already known country
+    op.execute("""
+        CREATE OR REPLACE FUNCTION get_toilets_in_country (
+          p_country_code text,
+          p_center_lat double precision,
+          p_center_lng double precision,
+          p_is_zoomed_in boolean DEFAULT true,
+          result_limit integer DEFAULT 1000
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision, 
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+        DECLARE
+          center_geom geometry := ST_SetSRID(ST_MakePoint(p_center_lng, p_center_lat), 4326);
+        BEGIN
+          IF p_is_zoomed_in THEN
+            -- ZOOMED IN: KNN relative to MAP CENTER
+            RETURN QUERY
+            SELECT
+              t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE t.geom IS NOT NULL AND t.country_code::text = p_country_code
+            ORDER BY t.geom <-> center_geom
+            LIMIT result_limit;
+          ELSE
+            -- ZOOMED OUT: Deterministic sample (ORDER BY id) within the country
+            RETURN QUERY
+            SELECT
+              t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE t.geom IS NOT NULL AND t.country_code::text = p_country_code
+            ORDER BY t.id
+            LIMIT result_limit;
+          END IF;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+    
+    # v3 keeps its signature; country inference is now a polygon lookup
+    op.execute("""
+        CREATE OR REPLACE FUNCTION get_toilets_deterministic_v3 (
+          p_center_lat double precision, -- Map center latitude (required)
+          p_center_lng double precision, -- Map center longitude (required)
+          p_user_lat double precision DEFAULT NULL, -- Optional user location (not used for sorting)
+          p_user_lng double precision DEFAULT NULL,
+          p_is_zoomed_in boolean DEFAULT true,
+          result_limit integer DEFAULT 1000
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision, 
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+        DECLARE
+          inferred_country_code text;
+        BEGIN
+          -- Validate map center coordinates
+          IF p_center_lat IS NULL OR p_center_lng IS NULL OR
+             p_center_lat < -90 OR p_center_lat > 90 OR
+             p_center_lng < -180 OR p_center_lng > 180
+          THEN
+             RAISE EXCEPTION 'Invalid map center coordinates provided: %, %', p_center_lat, p_center_lng;
+          END IF;
+
+          inferred_country_code := infer_country_code(p_center_lat, p_center_lng);
+          RAISE LOG 'V3 Fetch: Inferred country from map center: %', inferred_country_code;
+
+          RETURN QUERY
+          SELECT * FROM get_toilets_in_country(
+            inferred_country_code, p_center_lat, p_center_lng, p_is_zoomed_in, result_limit
+          );
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+
+def downgrade() -> None:
+    # Restore the KNN-vote version of get_toilets_deterministic_v3
+    op.execute("""
+        CREATE OR REPLACE FUNCTION get_toilets_deterministic_v3 (
+          p_center_lat double precision,
+          p_center_lng double precision,
+          p_user_lat double precision DEFAULT NULL,
+          p_user_lng double precision DEFAULT NULL,
+          p_is_zoomed_in boolean DEFAULT true,
+          result_limit integer DEFAULT 1000
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision, 
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+        DECLARE
+          center_geom geometry;
+          inferred_country_code text := 'CH';
+        BEGIN
+          IF p_center_lat IS NULL OR p_center_lng IS NULL OR
+             p_center_lat < -90 OR p_center_lat > 90 OR
+             p_center_lng < -180 OR p_center_lng > 180
+          THEN
+             RAISE EXCEPTION 'Invalid map center coordinates provided: %, %', p_center_lat, p_center_lng;
+          ELSE
+             center_geom := ST_SetSRID(ST_MakePoint(p_center_lng, p_center_lat), 4326);
+          END IF;
+
+          WITH nearest_k_toilets AS (
+            SELECT t.country_code
+            FROM toilet_location t
+            WHERE t.geom IS NOT NULL AND t.country_code IS NOT NULL
+            ORDER BY t.geom <-> center_geom
+            LIMIT 5
+          )
+          SELECT (mode() WITHIN GROUP (ORDER BY nk.country_code))::text
+          INTO inferred_country_code
+          FROM nearest_k_toilets nk;
+
+          IF inferred_country_code IS NULL THEN
+              inferred_country_code := 'CH';
+          END IF;
+
+          IF p_is_zoomed_in THEN
+            RETURN QUERY
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE t.geom IS NOT NULL AND t.country_code::text = inferred_country_code
+            ORDER BY t.geom <-> center_geom
+            LIMIT result_limit;
+          ELSE
+            RETURN QUERY
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE t.geom IS NOT NULL AND t.country_code::text = inferred_country_code
+            ORDER BY t.id
+            LIMIT result_limit;
+          END IF;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+    op.execute("""
+        DROP FUNCTION IF EXISTS get_toilets_in_country(
+            text, double precision, double precision, boolean, integer
+        )
+    """)
+    op.execute("DROP FUNCTION IF EXISTS infer_country_code(double precision, double precision)")
+    op.drop_table('country_boundary')
@@ -0,0 +1,234 @@
+"""add_geography_search_column
+
+Revision ID: 9f3d2b7a6c14
+Revises: e47a3c8b1f62
+Create Date: 2026-10-17 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+from db.backfill import TOILET_LOCATION_GEOG, run_in_migration
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3d2b7a6c14'
+down_revision = 'e47a3c8b1f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # ST_DWithin(geom, <point>::geography, r) casts every row's geometry to
+    # geography, so the GiST index on geom cannot serve the radius filter.
+    # Keep a geography copy of geom with its own GiST index instead.
+    op.execute("ALTER TABLE toilet_location ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)")
+
+    # The geom trigger now maintains geog as well
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_toilet_location_geom()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- Update geometry (and its geography copy) when lat/lng is set
+            IF NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL THEN
+                NEW.geom = ST_SetSRID(ST_MakePoint(NEW.lng, NEW.lat), 4326);
+                NEW.geog = NEW.geom::geography;
+            ELSE
+                NEW.geom = NULL;
+                NEW.geog = NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Existing rows, in chunks; the trigger covers writes made meanwhile.
+    # Positions do not change, so the cluster trigger queues no deltas.
+    run_in_migration(TOILET_LOCATION_GEOG)
+
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_toilet_location_geog
+        ON toilet_location USING gist (geog);
+    """)
+    op.execute("ANALYZE toilet_location")
+
+    # Radius filter and KNN order both run on idx_toilet_location_geog. The
+    # KNN order is by sphere distance; the reported distance is the spheroid
+    # distance, as before, and the final order follows it.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets(
+            user_lat double precision,
+            user_lng double precision,
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3
+        )
+        RETURNS TABLE (
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+        DECLARE
+            user_point geography := ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography;
+        BEGIN
+            RETURN QUERY
+            SELECT k.id, k.name, k.lat, k.lng, k.address, k.accessible, k.is_free,
+                   k.type, k.status, k.notes, k.city, k.open_hours,
+                   k.distance, k.created_at
+            FROM (
+                SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                       t.type, t.status, t.notes, t.city, t.open_hours,
+                       ST_Distance(t.geog, user_point)::double precision AS distance,
+                       t.created_at
+                FROM toilet_location t
+                WHERE ST_DWithin(t.geog, user_point, radius_meters)
+                ORDER BY t.geog <-> user_point
+                LIMIT result_limit
+            ) k
+            ORDER BY k.distance, k.id;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets_batch(
+            user_lats double precision[],
+            user_lngs double precision[],
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3
+        )
+        RETURNS TABLE (
+            point_index integer,
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+        BEGIN
+            IF coalesce(array_length(user_lats, 1), 0) <> coalesce(array_length(user_lngs, 1), 0) THEN
+                RAISE EXCEPTION 'user_lats and user_lngs must have the same length';
+            END IF;
+
+            RETURN QUERY
+            SELECT (p.ord - 1)::integer,
+                   n.id, n.name, n.lat, n.lng, n.address, n.accessible, n.is_free,
+                   n.type, n.status, n.notes, n.city, n.open_hours,
+                   n.distance, n.created_at
+            FROM (
+                SELECT u.ord, ST_SetSRID(ST_MakePoint(u.p_lng, u.p_lat), 4326)::geography AS user_point
+                FROM unnest(user_lats, user_lngs) WITH ORDINALITY AS u(p_lat, p_lng, ord)
+            ) p
+            CROSS JOIN LATERAL (
+                SELECT k.*, row_number() OVER (ORDER BY k.distance, k.id) AS rank
+                FROM (
+                    SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                           t.type, t.status, t.notes, t.city, t.open_hours,
+                           ST_Distance(t.geog, p.user_point)::double precision AS distance,
+                           t.created_at
+                    FROM toilet_location t
+                    WHERE ST_DWithin(t.geog, p.user_point, radius_meters)
+                    ORDER BY t.geog <-> p.user_point
+                    LIMIT result_limit
+                ) k
+            ) n
+            ORDER BY p.ord, n.rank;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+
+def downgrade() -> None:
+    # Restore the geometry-based search functions
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets(
+            user_lat double precision,
+            user_lng double precision,
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3
+        )
+        RETURNS TABLE (
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+        BEGIN
+            RETURN QUERY
+            SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                   t.type, t.status, t.notes, t.city, t.open_hours,
+                   ST_Distance(t.geom, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography)::double precision,
+                   t.created_at
+            FROM toilet_location t
+            WHERE ST_DWithin(t.geom, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography, radius_meters)
+            ORDER BY t.geom <-> ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)
+            LIMIT result_limit;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets_batch(
+            user_lats double precision[],
+            user_lngs double precision[],
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3
+        )
+        RETURNS TABLE (
+            point_index integer,
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+        BEGIN
+            IF coalesce(array_length(user_lats, 1), 0) <> coalesce(array_length(user_lngs, 1), 0) THEN
+                RAISE EXCEPTION 'user_lats and user_lngs must have the same length';
+            END IF;
+
+            RETURN QUERY
+            SELECT (p.ord - 1)::integer,
+                   n.id, n.name, n.lat, n.lng, n.address, n.accessible, n.is_free,
+                   n.type, n.status, n.notes, n.city, n.open_hours,
+                   n.distance, n.created_at
+            FROM unnest(user_lats, user_lngs) WITH ORDINALITY AS p(p_lat, p_lng, ord)
+            CROSS JOIN LATERAL (
+                SELECT k.*, row_number() OVER () AS rank
+                FROM (
+                    SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                           t.type, t.status, t.notes, t.city, t.open_hours,
+                           ST_Distance(t.geom, ST_SetSRID(ST_MakePoint(p.p_lng, p.p_lat), 4326)::geography)::double precision AS distance,
+                           t.created_at
+                    FROM toilet_location t
+                    WHERE ST_DWithin(t.geom, ST_SetSRID(ST_MakePoint(p.p_lng, p.p_lat), 4326)::geography, radius_meters)
+                    ORDER BY t.geom <-> ST_SetSRID(ST_MakePoint(p.p_lng, p.p_lat), 4326)
+                    LIMIT result_limit
+                ) k
+            ) n
+            ORDER BY p.ord, n.rank;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_toilet_location_geom()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- Update geometry when lat/lng is set
+            IF NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL THEN
+                NEW.geom = ST_SetSRID(ST_MakePoint(NEW.lng, NEW.lat), 4326);
+            ELSE
+                NEW.geom = NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("DROP INDEX IF EXISTS idx_toilet_location_geog")
+    op.execute("ALTER TABLE toilet_location DROP COLUMN IF EXISTS geog")
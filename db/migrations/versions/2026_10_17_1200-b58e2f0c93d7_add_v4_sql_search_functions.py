@@ -0,0 +1,214 @@
+"""add_v4_sql_search_functions
+
+Revision ID: b58e2f0c93d7
+Revises: 9f3d2b7a6c14
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e2f0c93d7'
+down_revision = '9f3d2b7a6c14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # v4 search functions are single-statement LANGUAGE sql functions, so the
+    # planner inlines them into the calling query: constant arguments are
+    # folded into the index conditions and there is no plpgsql call or
+    # per-call RAISE LOG. Logging is opt-in through the toilet_radar.log_searches
+    # GUC (SET toilet_radar.log_searches = on, or ALTER DATABASE/ROLE ... SET).
+    #
+    # Helpers are called with constant arguments only, so each runs once per
+    # query as a one-time filter. toilet_search_log is declared STABLE (its only
+    # side effect is the log line) so it does not block inlining.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION toilet_search_log(function_name text, detail text)
+        RETURNS boolean
+        AS $$
+        BEGIN
+            IF coalesce(nullif(current_setting('toilet_radar.log_searches', true), ''), 'off')::boolean THEN
+                RAISE LOG '%: %', function_name, detail;
+            END IF;
+            RETURN true;
+        END;
+        $$ LANGUAGE plpgsql STABLE PARALLEL SAFE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION toilet_search_check_center(
+            p_center_lat double precision, p_center_lng double precision
+        )
+        RETURNS boolean
+        AS $$
+        BEGIN
+            IF p_center_lat IS NULL OR p_center_lng IS NULL OR
+               p_center_lat < -90 OR p_center_lat > 90 OR
+               p_center_lng < -180 OR p_center_lng > 180
+            THEN
+               RAISE EXCEPTION 'Invalid map center coordinates provided: %, %', p_center_lat, p_center_lng;
+            END IF;
+            RETURN true;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE;
+    """)
+
+    # Read-only, so it must not force serial plans on the queries calling it
+    op.execute("ALTER FUNCTION infer_country_code(double precision, double precision) PARALLEL SAFE")
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets_v4(
+            user_lat double precision,
+            user_lng double precision,
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3
+        )
+        RETURNS TABLE (
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+            SELECT k.id, k.name, k.lat, k.lng, k.address, k.accessible, k.is_free,
+                   k.type, k.status, k.notes, k.city, k.open_hours,
+                   k.distance, k.created_at
+            FROM (
+                SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                       t.type, t.status, t.notes, t.city, t.open_hours,
+                       ST_Distance(t.geog, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography)::double precision AS distance,
+                       t.created_at
+                FROM toilet_location t
+                WHERE ST_DWithin(t.geog, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography, radius_meters)
+                ORDER BY t.geog <-> ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography
+                LIMIT result_limit
+            ) k
+            WHERE toilet_search_log('find_nearest_toilets_v4', format('%s, %s within %s m', user_lat, user_lng, radius_meters))
+            ORDER BY k.distance, k.id
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_toilets_in_view_v4 (
+          min_lat double precision, min_lng double precision,
+          max_lat double precision, max_lng double precision,
+          max_results integer DEFAULT 4000
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision,
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+          SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+          FROM toilet_location t
+          WHERE t.geom && ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+            AND toilet_search_log('find_toilets_in_view_v4', format('%s, %s, %s, %s', min_lat, min_lng, max_lat, max_lng))
+          LIMIT max_results
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+    # The zoom branches of get_toilets_in_country become UNION ALL arms gated
+    # on p_is_zoomed_in; the planner drops the arm that cannot return rows
+    op.execute("""
+        CREATE OR REPLACE FUNCTION get_toilets_in_country_v4 (
+          p_country_code text,
+          p_center_lat double precision,
+          p_center_lng double precision,
+          p_is_zoomed_in boolean DEFAULT true,
+          result_limit integer DEFAULT 1000
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision,
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+          (
+            -- ZOOMED IN: KNN relative to MAP CENTER
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE p_is_zoomed_in
+              AND t.geom IS NOT NULL AND t.country_code::text = p_country_code
+              AND toilet_search_log('get_toilets_in_country_v4', format('zoomed in, KNN within %s', p_country_code))
+            ORDER BY t.geom <-> ST_SetSRID(ST_MakePoint(p_center_lng, p_center_lat), 4326)
+            LIMIT result_limit
+          )
+          UNION ALL
+          (
+            -- ZOOMED OUT: Deterministic sample (ORDER BY id) within the country
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE NOT p_is_zoomed_in
+              AND t.geom IS NOT NULL AND t.country_code::text = p_country_code
+              AND toilet_search_log('get_toilets_in_country_v4', format('zoomed out, sample within %s', p_country_code))
+            ORDER BY t.id
+            LIMIT result_limit
+          )
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+    # Same arms; the country is an InitPlan, so it is inferred once per call
+    op.execute("""
+        CREATE OR REPLACE FUNCTION get_toilets_deterministic_v4 (
+          p_center_lat double precision, -- Map center latitude (required)
+          p_center_lng double precision, -- Map center longitude (required)
+          p_user_lat double precision DEFAULT NULL, -- Optional user location (not used for sorting)
+          p_user_lng double precision DEFAULT NULL,
+          p_is_zoomed_in boolean DEFAULT true,
+          result_limit integer DEFAULT 1000
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision,
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+          (
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE p_is_zoomed_in
+              AND toilet_search_check_center(p_center_lat, p_center_lng)
+              AND t.geom IS NOT NULL
+              AND t.country_code::text = (SELECT infer_country_code(p_center_lat, p_center_lng))
+              AND toilet_search_log('get_toilets_deterministic_v4', format('zoomed in at %s, %s', p_center_lat, p_center_lng))
+            ORDER BY t.geom <-> ST_SetSRID(ST_MakePoint(p_center_lng, p_center_lat), 4326)
+            LIMIT result_limit
+          )
+          UNION ALL
+          (
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE NOT p_is_zoomed_in
+              AND toilet_search_check_center(p_center_lat, p_center_lng)
+              AND t.geom IS NOT NULL
+              AND t.country_code::text = (SELECT infer_country_code(p_center_lat, p_center_lng))
+              AND toilet_search_log('get_toilets_deterministic_v4', format('zoomed out at %s, %s', p_center_lat, p_center_lng))
+            ORDER BY t.id
+            LIMIT result_limit
+          )
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DROP FUNCTION IF EXISTS get_toilets_deterministic_v4(
+            double precision, double precision, double precision, double precision, boolean, integer
+        )
+    """)
+    op.execute("""
+        DROP FUNCTION IF EXISTS get_toilets_in_country_v4(
+            text, double precision, double precision, boolean, integer
+        )
+    """)
+    op.execute("""
+        DROP FUNCTION IF EXISTS find_toilets_in_view_v4(
+            double precision, double precision, double precision, double precision, integer
+        )
+    """)
+    op.execute("""
+        DROP FUNCTION IF EXISTS find_nearest_toilets_v4(
+            double precision, double precision, double precision, integer
+        )
+    """)
+    op.execute("ALTER FUNCTION infer_country_code(double precision, double precision) PARALLEL UNSAFE")
+    op.execute("DROP FUNCTION IF EXISTS toilet_search_check_center(double precision, double precision)")
+    op.execute("DROP FUNCTION IF EXISTS toilet_search_log(text, text)")
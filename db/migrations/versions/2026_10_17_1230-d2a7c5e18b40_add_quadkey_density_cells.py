@@ -0,0 +1,134 @@
+"""add_quadkey_density_cells
+
+Revision ID: d2a7c5e18b40
+Revises: b58e2f0c93d7
+Create Date: 2026-10-17 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+from db.backfill import TOILET_LOCATION_QUADKEY, run_in_migration
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a7c5e18b40'
+down_revision = 'b58e2f0c93d7'
+branch_labels = None
+depends_on = None
+
+# Keep in sync with db.cells.QUADKEY_LEVEL
+QUADKEY_LEVEL = 24
+
+
+def upgrade() -> None:
+    # Web-mercator tile at QUADKEY_LEVEL with x/y bits interleaved (see
+    # db.cells.quadkey); cells at coarser levels are key prefixes.
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION toilet_quadkey(p_lat double precision, p_lng double precision)
+        RETURNS bigint
+        AS $$
+        DECLARE
+            n double precision := (1::bigint << {QUADKEY_LEVEL})::double precision;
+            lat double precision := least(greatest(p_lat, -85.0511287798), 85.0511287798);
+            x bigint;
+            y bigint;
+        BEGIN
+            IF p_lat IS NULL OR p_lng IS NULL THEN
+                RETURN NULL;
+            END IF;
+            x := least(greatest(floor((p_lng + 180.0) / 360.0 * n), 0), n - 1);
+            y := least(greatest(floor(
+                (1.0 - ln(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi()) / 2.0 * n
+            ), 0), n - 1);
+
+            -- Spread the bits of x and y to the even / odd positions
+            x := (x | (x << 16)) & 281470681808895;
+            x := (x | (x << 8)) & 71777214294589695;
+            x := (x | (x << 4)) & 1085102592571150095;
+            x := (x | (x << 2)) & 3689348814741910323;
+            x := (x | (x << 1)) & 6148914691236517205;
+            y := (y | (y << 16)) & 281470681808895;
+            y := (y | (y << 8)) & 71777214294589695;
+            y := (y | (y << 4)) & 1085102592571150095;
+            y := (y | (y << 2)) & 3689348814741910323;
+            y := (y | (y << 1)) & 6148914691236517205;
+            RETURN x | (y << 1);
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE;
+    """)
+
+    op.execute("ALTER TABLE toilet_location ADD COLUMN IF NOT EXISTS quadkey bigint")
+
+    # The geom trigger maintains the cell id with geom and geog
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_toilet_location_geom()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- Update geometry (its geography copy and cell id) when lat/lng is set
+            IF NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL THEN
+                NEW.geom = ST_SetSRID(ST_MakePoint(NEW.lng, NEW.lat), 4326);
+                NEW.geog = NEW.geom::geography;
+                NEW.quadkey = toilet_quadkey(NEW.lat, NEW.lng);
+            ELSE
+                NEW.geom = NULL;
+                NEW.geog = NULL;
+                NEW.quadkey = NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Existing rows, in chunks; the trigger covers writes made meanwhile.
+    # Positions do not change, so the cluster trigger queues no deltas.
+    run_in_migration(TOILET_LOCATION_QUADKEY)
+
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_toilet_location_quadkey
+        ON toilet_location (quadkey);
+    """)
+    op.execute("ANALYZE toilet_location")
+
+    # Counts per cell at p_resolution over key ranges [start, end) computed by
+    # db.cells.key_ranges: one index-only range scan per range, grouped on the
+    # key prefix. Cells are returned as interleaved ids at p_resolution.
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION get_toilet_density(
+            p_starts bigint[], p_ends bigint[], p_resolution integer
+        )
+        RETURNS TABLE (cell bigint, count bigint)
+        AS $$
+            SELECT t.quadkey >> (2 * ({QUADKEY_LEVEL} - p_resolution)), count(*)
+            FROM unnest(p_starts, p_ends) AS r(range_start, range_end)
+            JOIN toilet_location t ON t.quadkey >= r.range_start AND t.quadkey < r.range_end
+            GROUP BY 1
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS get_toilet_density(bigint[], bigint[], integer)")
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_toilet_location_geom()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- Update geometry (and its geography copy) when lat/lng is set
+            IF NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL THEN
+                NEW.geom = ST_SetSRID(ST_MakePoint(NEW.lng, NEW.lat), 4326);
+                NEW.geog = NEW.geom::geography;
+            ELSE
+                NEW.geom = NULL;
+                NEW.geog = NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("DROP INDEX IF EXISTS idx_toilet_location_quadkey")
+    op.execute("ALTER TABLE toilet_location DROP COLUMN IF EXISTS quadkey")
+    op.execute("DROP FUNCTION IF EXISTS toilet_quadkey(double precision, double precision)")
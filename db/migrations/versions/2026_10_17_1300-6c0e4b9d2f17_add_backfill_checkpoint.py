@@ -0,0 +1,45 @@
+"""add_backfill_checkpoint
+
+Revision ID: 6c0e4b9d2f17
+Revises: d2a7c5e18b40
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+from db.backfill import TOILETS_TO_TOILET_LOCATION, run_in_migration
+
+
+# revision identifiers, used by Alembic.
+revision = '6c0e4b9d2f17'
+down_revision = 'd2a7c5e18b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Progress of chunked backfills (db.backfill); may already exist if an
+    # earlier backfill created it. Keep in sync with CHECKPOINT_TABLE_SQL.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_checkpoint (
+            name character varying PRIMARY KEY,
+            last_key character varying,
+            rows bigint NOT NULL DEFAULT 0,
+            chunks integer NOT NULL DEFAULT 0,
+            started_at timestamp with time zone DEFAULT now(),
+            updated_at timestamp with time zone DEFAULT now(),
+            completed_at timestamp with time zone
+        );
+    """)
+
+    # Fold the legacy toilets table into toilet_location (skipped when the
+    # table does not exist); ids are kept, so the copy is idempotent
+    run_in_migration(TOILETS_TO_TOILET_LOCATION)
+
+
+def downgrade() -> None:
+    # Copied rows stay in toilet_location; the legacy table is untouched
+    op.execute("DROP TABLE IF EXISTS backfill_checkpoint")
@@ -0,0 +1,205 @@
+"""add_toilet_change_feed
+
+Revision ID: a4f81c3e6b95
+Revises: 6c0e4b9d2f17
+Create Date: 2026-10-17 13:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4f81c3e6b95'
+down_revision = '6c0e4b9d2f17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Every write stamps the row with its transaction id (change_xid). The
+    # feed only returns changes older than the snapshot's xmin, i.e. from
+    # transactions that have all finished, in (change_xid, id) order: any
+    # transaction still running gets a larger xid than everything already
+    # returned, so nothing is skipped however long it runs.
+    #
+    # now() is evaluated once here, so existing rows take the migration time
+    # as updated_at and xid 0 without a table rewrite.
+    #
+    # created_xid is the inserting transaction, stamped by the insert trigger
+    # only: the feed reports a row as an insert when it was created after the
+    # caller's since_token (timestamps can't tell, inserts may supply their
+    # own created_at).
+    op.execute("""
+        ALTER TABLE toilet_location
+            ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone DEFAULT now(),
+            ADD COLUMN IF NOT EXISTS change_xid bigint NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS created_xid bigint NOT NULL DEFAULT 0;
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_toilet_location_change
+        ON toilet_location (change_xid, id);
+    """)
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS toilet_location_tombstone (
+            id uuid PRIMARY KEY,
+            lat double precision,
+            lng double precision,
+            country_code countrycode,
+            deleted_at timestamp with time zone NOT NULL DEFAULT now(),
+            change_xid bigint NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_toilet_location_tombstone_change
+        ON toilet_location_tombstone (change_xid, id);
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION toilet_location_stamp_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.updated_at = now();
+            NEW.change_xid = pg_current_xact_id()::text::bigint;
+            IF TG_OP = 'INSERT' THEN
+                NEW.created_xid = NEW.change_xid;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION toilet_location_write_tombstones()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO toilet_location_tombstone (id, lat, lng, country_code, deleted_at, change_xid)
+            SELECT o.id, o.lat, o.lng, o.country_code, now(), pg_current_xact_id()::text::bigint
+            FROM old_rows o
+            ON CONFLICT (id) DO UPDATE SET
+                lat = EXCLUDED.lat, lng = EXCLUDED.lng, country_code = EXCLUDED.country_code,
+                deleted_at = EXCLUDED.deleted_at, change_xid = EXCLUDED.change_xid;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- A re-inserted id is live again
+        CREATE OR REPLACE FUNCTION toilet_location_clear_tombstones()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            DELETE FROM toilet_location_tombstone d
+            USING new_rows n
+            WHERE d.id = n.id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Updates that change nothing (e.g. SET lat = lat) are not changes, and
+    # neither are changes to columns derived from others by triggers, such as
+    # backfills of geom / geog / quadkey. Keep the list in sync with later
+    # migrations adding derived columns (7e2d9b4c1a68).
+    op.execute("""
+        DROP TRIGGER IF EXISTS trigger_toilet_location_insert_change ON toilet_location;
+        CREATE TRIGGER trigger_toilet_location_insert_change
+            BEFORE INSERT ON toilet_location
+            FOR EACH ROW EXECUTE FUNCTION toilet_location_stamp_change();
+
+        DROP TRIGGER IF EXISTS trigger_toilet_location_update_change ON toilet_location;
+        CREATE TRIGGER trigger_toilet_location_update_change
+            BEFORE UPDATE ON toilet_location
+            FOR EACH ROW WHEN (
+                to_jsonb(OLD) - ARRAY['geom', 'geog', 'quadkey', 'updated_at', 'change_xid', 'created_xid']
+                IS DISTINCT FROM to_jsonb(NEW) - ARRAY['geom', 'geog', 'quadkey', 'updated_at', 'change_xid', 'created_xid']
+            )
+            EXECUTE FUNCTION toilet_location_stamp_change();
+
+        DROP TRIGGER IF EXISTS trigger_toilet_location_tombstone ON toilet_location;
+        CREATE TRIGGER trigger_toilet_location_tombstone
+            AFTER DELETE ON toilet_location
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION toilet_location_write_tombstones();
+
+        DROP TRIGGER IF EXISTS trigger_toilet_location_untombstone ON toilet_location;
+        CREATE TRIGGER trigger_toilet_location_untombstone
+            AFTER INSERT ON toilet_location
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION toilet_location_clear_tombstones();
+    """)
+
+    # since_token is '<change_xid>:<id>' of the last change seen (NULL or ''
+    # for everything). Each arm is an index range scan on (change_xid, id);
+    # a row is an insert if its creation, at (created_xid, id), comes after
+    # since_token, i.e. the caller has not seen it yet.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION get_changes(
+            since_token text DEFAULT NULL,
+            result_limit integer DEFAULT 1000
+        )
+        RETURNS TABLE (
+            op text, id uuid, name character varying, lat double precision, lng double precision,
+            accessible boolean, open_hours character varying, address character varying, rating integer,
+            is_free boolean, type character varying, status character varying, notes character varying,
+            city character varying, country_code text, created_at timestamp with time zone,
+            updated_at timestamp with time zone, deleted_at timestamp with time zone,
+            change_xid bigint, change_token text
+        )
+        AS $$
+            WITH since AS (
+                SELECT coalesce(nullif(split_part(since_token, ':', 1), '')::bigint, -1) AS xid,
+                       coalesce(nullif(split_part(since_token, ':', 2), '')::uuid,
+                                '00000000-0000-0000-0000-000000000000'::uuid) AS id,
+                       pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS horizon
+            )
+            SELECT c.*, c.change_xid || ':' || c.id AS change_token
+            FROM (
+                (
+                    SELECT CASE
+                               WHEN (t.created_xid, t.id) > ((SELECT xid FROM since), (SELECT s.id FROM since s))
+                               THEN 'insert' ELSE 'update'
+                           END,
+                           t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.rating,
+                           t.is_free, t.type, t.status, t.notes, t.city, t.country_code::text, t.created_at,
+                           t.updated_at, NULL::timestamp with time zone, t.change_xid
+                    FROM toilet_location t
+                    WHERE (t.change_xid, t.id) > ((SELECT xid FROM since), (SELECT s.id FROM since s))
+                      AND t.change_xid < (SELECT horizon FROM since)
+                    ORDER BY t.change_xid, t.id
+                    LIMIT result_limit
+                )
+                UNION ALL
+                (
+                    SELECT 'delete', d.id, NULL, d.lat, d.lng, NULL, NULL, NULL, NULL,
+                           NULL, NULL, NULL, NULL, NULL, d.country_code::text, NULL,
+                           NULL, d.deleted_at, d.change_xid
+                    FROM toilet_location_tombstone d
+                    WHERE (d.change_xid, d.id) > ((SELECT xid FROM since), (SELECT s.id FROM since s))
+                      AND d.change_xid < (SELECT horizon FROM since)
+                    ORDER BY d.change_xid, d.id
+                    LIMIT result_limit
+                )
+            ) AS c (op, id, name, lat, lng, accessible, open_hours, address, rating,
+                    is_free, type, status, notes, city, country_code, created_at,
+                    updated_at, deleted_at, change_xid)
+            ORDER BY c.change_xid, c.id
+            LIMIT result_limit
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS get_changes(text, integer)")
+    op.execute("DROP TRIGGER IF EXISTS trigger_toilet_location_untombstone ON toilet_location")
+    op.execute("DROP TRIGGER IF EXISTS trigger_toilet_location_tombstone ON toilet_location")
+    op.execute("DROP TRIGGER IF EXISTS trigger_toilet_location_update_change ON toilet_location")
+    op.execute("DROP TRIGGER IF EXISTS trigger_toilet_location_insert_change ON toilet_location")
+    op.execute("DROP FUNCTION IF EXISTS toilet_location_clear_tombstones()")
+    op.execute("DROP FUNCTION IF EXISTS toilet_location_write_tombstones()")
+    op.execute("DROP FUNCTION IF EXISTS toilet_location_stamp_change()")
+    op.execute("DROP TABLE IF EXISTS toilet_location_tombstone")
+    op.execute("DROP INDEX IF EXISTS idx_toilet_location_change")
+    op.execute("""
+        ALTER TABLE toilet_location
+            DROP COLUMN IF EXISTS created_xid,
+            DROP COLUMN IF EXISTS change_xid,
+            DROP COLUMN IF EXISTS updated_at;
+    """)
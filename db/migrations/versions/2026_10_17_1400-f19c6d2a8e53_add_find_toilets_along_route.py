@@ -0,0 +1,81 @@
+"""add_find_toilets_along_route
+
+Revision ID: f19c6d2a8e53
+Revises: a4f81c3e6b95
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19c6d2a8e53'
+down_revision = 'a4f81c3e6b95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The corridor is searched segment by segment: a long diagonal route has
+    # a huge bounding box, while each segment's ST_DWithin is a tight probe
+    # of the geography GiST index. Toilets near several segments keep their
+    # smallest detour.
+    #
+    # route_meters is the position along the route (ST_LineLocatePoint on
+    # the planar line, scaled to the route's geodesic length); results are
+    # ordered by route_meters + detour_meters, the distance travelled to
+    # reach the toilet.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_toilets_along_route(
+            route_lats double precision[],
+            route_lngs double precision[],
+            corridor_meters double precision DEFAULT 500,
+            result_limit integer DEFAULT 50
+        )
+        RETURNS TABLE (
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            route_meters double precision, detour_meters double precision, created_at timestamp with time zone
+        )
+        AS $$
+            WITH points AS (
+                SELECT p.ord, ST_SetSRID(ST_MakePoint(p.lng, p.lat), 4326) AS geom
+                FROM unnest(route_lats, route_lngs) WITH ORDINALITY AS p(lat, lng, ord)
+                WHERE p.lat IS NOT NULL AND p.lng IS NOT NULL
+            ), route AS (
+                SELECT l.line, ST_Length(l.line::geography) AS meters
+                FROM (SELECT ST_MakeLine(geom ORDER BY ord) AS line FROM points) l
+            ), segments AS (
+                SELECT ST_MakeLine(a.geom, b.geom)::geography AS geog
+                FROM points a
+                JOIN points b ON b.ord = a.ord + 1
+            ), candidates AS (
+                SELECT t.id, min(ST_Distance(t.geog, s.geog)) AS detour
+                FROM segments s
+                JOIN toilet_location t ON ST_DWithin(t.geog, s.geog, corridor_meters)
+                GROUP BY t.id
+            )
+            SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                   t.type, t.status, t.notes, t.city, t.open_hours,
+                   (ST_LineLocatePoint(r.line, t.geom) * r.meters)::double precision AS route_meters,
+                   c.detour::double precision AS detour_meters,
+                   t.created_at
+            FROM candidates c
+            JOIN toilet_location t ON t.id = c.id
+            CROSS JOIN route r
+            ORDER BY ST_LineLocatePoint(r.line, t.geom) * r.meters + c.detour, t.id
+            LIMIT result_limit
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DROP FUNCTION IF EXISTS find_toilets_along_route(
+            double precision[], double precision[], double precision, integer
+        )
+    """)
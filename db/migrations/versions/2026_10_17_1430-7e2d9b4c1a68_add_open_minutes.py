@@ -0,0 +1,525 @@
+"""add_open_minutes
+
+Revision ID: 7e2d9b4c1a68
+Revises: f19c6d2a8e53
+Create Date: 2026-10-17 14:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import geoalchemy2
+
+from db.backfill import TOILET_LOCATION_OPEN_MINUTES, run_in_migration
+
+
+# revision identifiers, used by Alembic.
+revision = '7e2d9b4c1a68'
+down_revision = 'f19c6d2a8e53'
+branch_labels = None
+depends_on = None
+
+# Derived columns left out of the change-feed stamp (see a4f81c3e6b95)
+CHANGE_IGNORED_COLUMNS = "ARRAY['geom', 'geog', 'quadkey', 'open_minutes', 'updated_at', 'change_xid', 'created_xid']"
+PREVIOUS_CHANGE_IGNORED_COLUMNS = "ARRAY['geom', 'geog', 'quadkey', 'updated_at', 'change_xid', 'created_xid']"
+
+
+def upgrade() -> None:
+    # open_hours is compiled on write into open_minutes, the weekly opening
+    # intervals as minutes of the week (Monday 00:00 = 0). "Open at" is then
+    # open_minutes @> toilet_minute_of_week(at), which the (geog, open_minutes)
+    # and (geom, open_minutes) GiST indexes check inside the KNN / bbox scan.
+    #
+    # toilet_open_minutes is the SQL twin of db.opening_hours.parse_opening_hours;
+    # keep the two in sync. Unsupported syntax gives NULL: never open.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION toilet_open_spans(p_times text)
+        RETURNS int4range[]
+        AS $$
+        DECLARE
+            item text;
+            m text[];
+            start_minute integer;
+            end_minute integer;
+            spans int4range[] := '{}';
+        BEGIN
+            IF p_times IN ('off', 'closed') THEN
+                RETURN spans;
+            ELSIF p_times IN ('', 'open', '24/7') THEN
+                -- A weekday selector on its own means open all day
+                RETURN ARRAY[int4range(0, 1440)];
+            END IF;
+            FOREACH item IN ARRAY string_to_array(p_times, ',') LOOP
+                m := regexp_match(btrim(item), '^(\\d{1,2}):(\\d{2})-(\\d{1,2}):(\\d{2})$');
+                IF m IS NULL OR m[1]::integer > 24 OR m[3]::integer > 48
+                   OR m[2]::integer > 59 OR m[4]::integer > 59
+                THEN
+                    RETURN NULL;
+                END IF;
+                start_minute := m[1]::integer * 60 + m[2]::integer;
+                end_minute := m[3]::integer * 60 + m[4]::integer;
+                IF end_minute <= start_minute THEN
+                    end_minute := end_minute + 1440;
+                END IF;
+                spans := spans || int4range(start_minute, end_minute);
+            END LOOP;
+            RETURN spans;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION toilet_open_minutes(p_value text)
+        RETURNS int4multirange
+        AS $$
+        DECLARE
+            weekdays constant text[] := ARRAY['mo', 'tu', 'we', 'th', 'fr', 'sa', 'su'];
+            normalized text;
+            rule_item text;
+            selector text[];
+            item text;
+            times text;
+            first_day integer;
+            last_day integer;
+            day_index integer;
+            rule_days integer[];
+            day_times text[] := array_fill(NULL::text, ARRAY[7]);
+            span int4range;
+            start_minute integer;
+            end_minute integer;
+            result int4multirange := '{}';
+        BEGIN
+            normalized := regexp_replace(
+                lower(btrim(regexp_replace(p_value, '\\s+', ' ', 'g'))), '\\s*([,-])\\s*', '\\1', 'g'
+            );
+            IF normalized IS NULL OR normalized = '' THEN
+                RETURN NULL;
+            ELSIF normalized = '24/7' THEN
+                RETURN int4multirange(int4range(0, 10080));
+            END IF;
+
+            -- Later rules replace the hours of the days they select
+            FOREACH rule_item IN ARRAY string_to_array(replace(normalized, '||', ';'), ';') LOOP
+                rule_item := btrim(rule_item);
+                CONTINUE WHEN rule_item = '' OR rule_item ~ '^(ph|sh)\\M';
+                selector := regexp_match(rule_item,
+                    '^((?:mo|tu|we|th|fr|sa|su)(?:-(?:mo|tu|we|th|fr|sa|su))?'
+                    '(?:,(?:mo|tu|we|th|fr|sa|su)(?:-(?:mo|tu|we|th|fr|sa|su))?)*)(?:\\s+|$)(.*)$');
+                IF selector IS NULL THEN
+                    rule_days := ARRAY[0, 1, 2, 3, 4, 5, 6];
+                    times := rule_item;
+                ELSE
+                    rule_days := '{}';
+                    FOREACH item IN ARRAY string_to_array(selector[1], ',') LOOP
+                        first_day := array_position(weekdays, split_part(item, '-', 1)) - 1;
+                        last_day := coalesce(array_position(weekdays, nullif(split_part(item, '-', 2), '')) - 1, first_day);
+                        FOR offset_day IN 0 .. (last_day - first_day + 7) % 7 LOOP
+                            rule_days := rule_days || (first_day + offset_day) % 7;
+                        END LOOP;
+                    END LOOP;
+                    times := btrim(selector[2]);
+                END IF;
+                IF toilet_open_spans(times) IS NULL THEN
+                    RETURN NULL;
+                END IF;
+                FOREACH day_index IN ARRAY rule_days LOOP
+                    day_times[day_index + 1] := times;
+                END LOOP;
+            END LOOP;
+
+            FOR day_index IN 0 .. 6 LOOP
+                CONTINUE WHEN day_times[day_index + 1] IS NULL;
+                FOREACH span IN ARRAY toilet_open_spans(day_times[day_index + 1]) LOOP
+                    start_minute := day_index * 1440 + lower(span);
+                    end_minute := day_index * 1440 + upper(span);
+                    -- Sunday night runs into Monday morning
+                    IF end_minute > 10080 THEN
+                        result := result + int4multirange(int4range(0, end_minute - 10080));
+                        end_minute := 10080;
+                    END IF;
+                    result := result + int4multirange(int4range(start_minute, end_minute));
+                END LOOP;
+            END LOOP;
+            RETURN result;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE;
+    """)
+
+    # Keep the time zone in sync with OPENING_HOURS_TIMEZONE
+    op.execute("""
+        CREATE OR REPLACE FUNCTION toilet_minute_of_week(p_at timestamp with time zone)
+        RETURNS integer
+        AS $$
+            SELECT ((extract(isodow FROM p_at AT TIME ZONE 'Europe/Zurich') - 1) * 1440
+                    + extract(hour FROM p_at AT TIME ZONE 'Europe/Zurich') * 60
+                    + extract(minute FROM p_at AT TIME ZONE 'Europe/Zurich'))::integer
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+    """)
+
+    op.execute("ALTER TABLE toilet_location ADD COLUMN IF NOT EXISTS open_minutes int4multirange")
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_toilet_location_open_minutes()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.open_minutes = toilet_open_minutes(NEW.open_hours);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trigger_toilet_location_open_minutes ON toilet_location;
+        CREATE TRIGGER trigger_toilet_location_open_minutes
+            BEFORE INSERT OR UPDATE OF open_hours ON toilet_location
+            FOR EACH ROW EXECUTE FUNCTION update_toilet_location_open_minutes();
+    """)
+
+    # open_minutes is derived, so compiling it is not a change-feed update
+    op.execute(f"""
+        DROP TRIGGER IF EXISTS trigger_toilet_location_update_change ON toilet_location;
+        CREATE TRIGGER trigger_toilet_location_update_change
+            BEFORE UPDATE ON toilet_location
+            FOR EACH ROW WHEN (
+                to_jsonb(OLD) - {CHANGE_IGNORED_COLUMNS} IS DISTINCT FROM to_jsonb(NEW) - {CHANGE_IGNORED_COLUMNS}
+            )
+            EXECUTE FUNCTION toilet_location_stamp_change();
+    """)
+
+    # Existing rows, in chunks; the trigger covers writes made meanwhile
+    run_in_migration(TOILET_LOCATION_OPEN_MINUTES)
+
+    # Only toilets with known hours can be open, so the indexes skip the rest
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_toilet_location_geog_open
+        ON toilet_location USING gist (geog, open_minutes)
+        WHERE open_minutes IS NOT NULL;
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_toilet_location_geom_open
+        ON toilet_location USING gist (geom, open_minutes)
+        WHERE open_minutes IS NOT NULL;
+    """)
+    op.execute("ANALYZE toilet_location")
+
+    # The search functions take a trailing open_at; NULL searches as before
+    op.execute("""
+        DROP FUNCTION IF EXISTS find_nearest_toilets(double precision, double precision, double precision, integer);
+        DROP FUNCTION IF EXISTS find_toilets_in_view(
+            double precision, double precision, double precision, double precision, integer
+        );
+        DROP FUNCTION IF EXISTS find_nearest_toilets_v4(double precision, double precision, double precision, integer);
+        DROP FUNCTION IF EXISTS find_toilets_in_view_v4(
+            double precision, double precision, double precision, double precision, integer
+        );
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets(
+            user_lat double precision,
+            user_lng double precision,
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3,
+            open_at timestamp with time zone DEFAULT NULL
+        )
+        RETURNS TABLE (
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+        DECLARE
+            user_point geography := ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography;
+            open_minute integer := toilet_minute_of_week(open_at);
+        BEGIN
+            IF open_at IS NULL THEN
+                RETURN QUERY
+                SELECT k.id, k.name, k.lat, k.lng, k.address, k.accessible, k.is_free,
+                       k.type, k.status, k.notes, k.city, k.open_hours,
+                       k.distance, k.created_at
+                FROM (
+                    SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                           t.type, t.status, t.notes, t.city, t.open_hours,
+                           ST_Distance(t.geog, user_point)::double precision AS distance,
+                           t.created_at
+                    FROM toilet_location t
+                    WHERE ST_DWithin(t.geog, user_point, radius_meters)
+                    ORDER BY t.geog <-> user_point
+                    LIMIT result_limit
+                ) k
+                ORDER BY k.distance, k.id;
+            ELSE
+                RETURN QUERY
+                SELECT k.id, k.name, k.lat, k.lng, k.address, k.accessible, k.is_free,
+                       k.type, k.status, k.notes, k.city, k.open_hours,
+                       k.distance, k.created_at
+                FROM (
+                    SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                           t.type, t.status, t.notes, t.city, t.open_hours,
+                           ST_Distance(t.geog, user_point)::double precision AS distance,
+                           t.created_at
+                    FROM toilet_location t
+                    WHERE ST_DWithin(t.geog, user_point, radius_meters)
+                      AND t.open_minutes @> open_minute
+                    ORDER BY t.geog <-> user_point
+                    LIMIT result_limit
+                ) k
+                ORDER BY k.distance, k.id;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_toilets_in_view (
+          min_lat double precision, min_lng double precision,
+          max_lat double precision, max_lng double precision,
+          max_results integer DEFAULT 4000,
+          open_at timestamp with time zone DEFAULT NULL
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision,
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+        DECLARE
+          open_minute integer := toilet_minute_of_week(open_at);
+        BEGIN
+          IF open_at IS NULL THEN
+            RETURN QUERY
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE t.geom && ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+            LIMIT max_results;
+          ELSE
+            RETURN QUERY
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE t.geom && ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+              AND t.open_minutes @> open_minute
+            LIMIT max_results;
+          END IF;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+    # v4: the open_at filter is a UNION ALL arm, like the zoom branches of
+    # get_toilets_in_country_v4, so both arms keep a plain index scan
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets_v4(
+            user_lat double precision,
+            user_lng double precision,
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3,
+            open_at timestamp with time zone DEFAULT NULL
+        )
+        RETURNS TABLE (
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+            SELECT k.id, k.name, k.lat, k.lng, k.address, k.accessible, k.is_free,
+                   k.type, k.status, k.notes, k.city, k.open_hours,
+                   k.distance, k.created_at
+            FROM (
+                (
+                    SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                           t.type, t.status, t.notes, t.city, t.open_hours,
+                           ST_Distance(t.geog, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography)::double precision AS distance,
+                           t.created_at
+                    FROM toilet_location t
+                    WHERE open_at IS NULL
+                      AND ST_DWithin(t.geog, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography, radius_meters)
+                    ORDER BY t.geog <-> ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography
+                    LIMIT result_limit
+                )
+                UNION ALL
+                (
+                    SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                           t.type, t.status, t.notes, t.city, t.open_hours,
+                           ST_Distance(t.geog, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography)::double precision AS distance,
+                           t.created_at
+                    FROM toilet_location t
+                    WHERE open_at IS NOT NULL
+                      AND ST_DWithin(t.geog, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography, radius_meters)
+                      AND t.open_minutes @> toilet_minute_of_week(open_at)
+                    ORDER BY t.geog <-> ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography
+                    LIMIT result_limit
+                )
+            ) k
+            WHERE toilet_search_log('find_nearest_toilets_v4', format('%s, %s within %s m, open at %s', user_lat, user_lng, radius_meters, open_at))
+            ORDER BY k.distance, k.id
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_toilets_in_view_v4 (
+          min_lat double precision, min_lng double precision,
+          max_lat double precision, max_lng double precision,
+          max_results integer DEFAULT 4000,
+          open_at timestamp with time zone DEFAULT NULL
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision,
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+          (
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE open_at IS NULL
+              AND t.geom && ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+              AND toilet_search_log('find_toilets_in_view_v4', format('%s, %s, %s, %s', min_lat, min_lng, max_lat, max_lng))
+            LIMIT max_results
+          )
+          UNION ALL
+          (
+            SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+            FROM toilet_location t
+            WHERE open_at IS NOT NULL
+              AND t.geom && ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+              AND t.open_minutes @> toilet_minute_of_week(open_at)
+              AND toilet_search_log('find_toilets_in_view_v4', format('%s, %s, %s, %s open at %s', min_lat, min_lng, max_lat, max_lng, open_at))
+            LIMIT max_results
+          )
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DROP FUNCTION IF EXISTS find_toilets_in_view_v4(
+            double precision, double precision, double precision, double precision, integer, timestamp with time zone
+        );
+        DROP FUNCTION IF EXISTS find_nearest_toilets_v4(
+            double precision, double precision, double precision, integer, timestamp with time zone
+        );
+        DROP FUNCTION IF EXISTS find_toilets_in_view(
+            double precision, double precision, double precision, double precision, integer, timestamp with time zone
+        );
+        DROP FUNCTION IF EXISTS find_nearest_toilets(
+            double precision, double precision, double precision, integer, timestamp with time zone
+        );
+    """)
+
+    # Restore the definitions from 9f3d2b7a6c14, 0e002d492d08 and b58e2f0c93d7
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets(
+            user_lat double precision,
+            user_lng double precision,
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3
+        )
+        RETURNS TABLE (
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+        DECLARE
+            user_point geography := ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography;
+        BEGIN
+            RETURN QUERY
+            SELECT k.id, k.name, k.lat, k.lng, k.address, k.accessible, k.is_free,
+                   k.type, k.status, k.notes, k.city, k.open_hours,
+                   k.distance, k.created_at
+            FROM (
+                SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                       t.type, t.status, t.notes, t.city, t.open_hours,
+                       ST_Distance(t.geog, user_point)::double precision AS distance,
+                       t.created_at
+                FROM toilet_location t
+                WHERE ST_DWithin(t.geog, user_point, radius_meters)
+                ORDER BY t.geog <-> user_point
+                LIMIT result_limit
+            ) k
+            ORDER BY k.distance, k.id;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_toilets_in_view (
+          min_lat double precision, min_lng double precision,
+          max_lat double precision, max_lng double precision,
+          max_results integer DEFAULT 4000
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision,
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+        BEGIN
+          RETURN QUERY
+          SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+          FROM toilet_location t
+          WHERE t.geom && ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+          LIMIT max_results;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_nearest_toilets_v4(
+            user_lat double precision,
+            user_lng double precision,
+            radius_meters double precision DEFAULT 20000,
+            result_limit integer DEFAULT 3
+        )
+        RETURNS TABLE (
+            id uuid, name character varying, lat double precision, lng double precision,
+            address character varying, accessible boolean, is_free boolean, type character varying,
+            status character varying, notes character varying, city character varying, open_hours character varying,
+            distance double precision, created_at timestamp with time zone
+        )
+        AS $$
+            SELECT k.id, k.name, k.lat, k.lng, k.address, k.accessible, k.is_free,
+                   k.type, k.status, k.notes, k.city, k.open_hours,
+                   k.distance, k.created_at
+            FROM (
+                SELECT t.id, t.name, t.lat, t.lng, t.address, t.accessible, t.is_free,
+                       t.type, t.status, t.notes, t.city, t.open_hours,
+                       ST_Distance(t.geog, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography)::double precision AS distance,
+                       t.created_at
+                FROM toilet_location t
+                WHERE ST_DWithin(t.geog, ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography, radius_meters)
+                ORDER BY t.geog <-> ST_SetSRID(ST_MakePoint(user_lng, user_lat), 4326)::geography
+                LIMIT result_limit
+            ) k
+            WHERE toilet_search_log('find_nearest_toilets_v4', format('%s, %s within %s m', user_lat, user_lng, radius_meters))
+            ORDER BY k.distance, k.id
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION find_toilets_in_view_v4 (
+          min_lat double precision, min_lng double precision,
+          max_lat double precision, max_lng double precision,
+          max_results integer DEFAULT 4000
+        ) RETURNS TABLE (
+          id uuid, name character varying, lat double precision, lng double precision,
+          accessible boolean, open_hours character varying, address character varying, created_at timestamp with time zone
+        ) AS $$
+          SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at
+          FROM toilet_location t
+          WHERE t.geom && ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+            AND toilet_search_log('find_toilets_in_view_v4', format('%s, %s, %s, %s', min_lat, min_lng, max_lat, max_lng))
+          LIMIT max_results
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """)
+
+    op.execute(f"""
+        DROP TRIGGER IF EXISTS trigger_toilet_location_update_change ON toilet_location;
+        CREATE TRIGGER trigger_toilet_location_update_change
+            BEFORE UPDATE ON toilet_location
+            FOR EACH ROW WHEN (
+                to_jsonb(OLD) - {PREVIOUS_CHANGE_IGNORED_COLUMNS}
+                IS DISTINCT FROM to_jsonb(NEW) - {PREVIOUS_CHANGE_IGNORED_COLUMNS}
+            )
+            EXECUTE FUNCTION toilet_location_stamp_change();
+    """)
+    op.execute("DROP INDEX IF EXISTS idx_toilet_location_geom_open")
+    op.execute("DROP INDEX IF EXISTS idx_toilet_location_geog_open")
+    op.execute("DROP TRIGGER IF EXISTS trigger_toilet_location_open_minutes ON toilet_location")
+    op.execute("DROP FUNCTION IF EXISTS update_toilet_location_open_minutes()")
+    op.execute("ALTER TABLE toilet_location DROP COLUMN IF EXISTS open_minutes")
+    op.execute("DROP FUNCTION IF EXISTS toilet_minute_of_week(timestamp with time zone)")
+    op.execute("DROP FUNCTION IF EXISTS toilet_open_minutes(text)")
+    op.execute("DROP FUNCTION IF EXISTS toilet_open_spans(text)")
+    op.execute("DELETE FROM backfill_checkpoint WHERE name = 'toilet_location_open_minutes'")
@@ -1,14 +1,13 @@
 """SQLModel models for Toilet Radar database."""
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional, Tuple
 from uuid import UUID, uuid4
 
-from geoalchemy2 import Geometry
+from geoalchemy2 import Geography, Geometry
 from sqlmodel import Field, SQLModel
-from sqlalchemy import Column, Index, text, TIMESTAMP
-from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
-from db.config import settings
+from sqlalchemy import BigInteger, Column, Index, Integer, SmallInteger, text, TIMESTAMP
+from sqlalchemy.dialects.postgresql import INT4MULTIRANGE, UUID as PostgresUUID
 
 
 class CountryCode(str, Enum):
@@ -42,7 +41,19 @@ class ToiletLocation(ToiletBase, table=True):
     __tablename__ = "toilet_location"
     __table_args__ = (
         Index("idx_toilet_location_geom", "geom", postgresql_using="gist"),
+        Index("idx_toilet_location_geog", "geog", postgresql_using="gist"),
+        Index("idx_toilet_location_quadkey", "quadkey"),
         Index("idx_toilet_location_country_code", "country_code"),
+        Index("uq_toilet_location_osm_id", "osm_id", unique=True),
+        Index("idx_toilet_location_change", "change_xid", "id"),
+        Index(
+            "idx_toilet_location_geog_open", "geog", "open_minutes",
+            postgresql_using="gist", postgresql_where=text("open_minutes IS NOT NULL"),
+        ),
+        Index(
+            "idx_toilet_location_geom_open", "geom", "open_minutes",
+            postgresql_using="gist", postgresql_where=text("open_minutes IS NOT NULL"),
+        ),
     )
     
     id: UUID = Field(
@@ -57,6 +68,138 @@ class ToiletLocation(ToiletBase, table=True):
         default=None,
         sa_column=Column("geom", Geometry("POINT", srid=4326), nullable=True)
     )
+    # Geography copy of geom (set by the geom trigger) for indexed meter-radius search
+    geog: Optional[str] = Field(
+        default=None,
+        sa_column=Column("geog", Geography("POINT", srid=4326, spatial_index=False), nullable=True)
+    )
+    # Level-24 quadkey cell id (set by the geom trigger, see db.cells)
+    quadkey: Optional[int] = Field(
+        default=None,
+        sa_column=Column("quadkey", BigInteger, nullable=True)
+    )
+    osm_id: Optional[int] = Field(
+        default=None,
+        sa_column=Column("osm_id", BigInteger, nullable=True)
+    )
+    osm_version: Optional[int] = Field(
+        default=None,
+        sa_column=Column("osm_version", Integer, nullable=True)
+    )
+    # Change feed position (set by trigger on insert/update, see get_changes)
+    updated_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column("updated_at", TIMESTAMP(timezone=True), server_default=text("now()"))
+    )
+    change_xid: Optional[int] = Field(
+        default=None,
+        sa_column=Column("change_xid", BigInteger, nullable=False, server_default=text("0"))
+    )
+    created_xid: Optional[int] = Field(
+        default=None,
+        sa_column=Column("created_xid", BigInteger, nullable=False, server_default=text("0"))
+    )
+    # open_hours as minute-of-week intervals (set by trigger, see db.opening_hours);
+    # NULL when the hours are missing or unsupported
+    open_minutes: Optional[str] = Field(
+        default=None,
+        sa_column=Column("open_minutes", INT4MULTIRANGE, nullable=True)
+    )
+
+
+class ToiletTombstone(SQLModel, table=True):
+    """Deleted toilet_location rows, kept for the change feed (written by trigger)."""
+    __tablename__ = "toilet_location_tombstone"
+    __table_args__ = (
+        Index("idx_toilet_location_tombstone_change", "change_xid", "id"),
+    )
+    
+    id: UUID = Field(sa_column=Column("id", PostgresUUID(as_uuid=True), primary_key=True))
+    lat: Optional[float] = Field(default=None)
+    lng: Optional[float] = Field(default=None)
+    country_code: Optional[CountryCode] = Field(default=None)
+    deleted_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column("deleted_at", TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+    )
+    change_xid: int = Field(sa_column=Column("change_xid", BigInteger, nullable=False))
+
+
+# Clusters exist for map zooms 0..CLUSTER_MAX_ZOOM; cells at zoom z are
+# web-mercator tiles at level z + CLUSTER_GRID_OFFSET.
+CLUSTER_MAX_ZOOM = 14
+CLUSTER_GRID_OFFSET = 2
+
+
+class ToiletClusterCell(SQLModel, table=True):
+    """Precomputed per-zoom grid aggregate of toilet_location (folded from toilet_cluster_delta)."""
+    __tablename__ = "toilet_cluster"
+    __table_args__ = (
+        Index(
+            "idx_toilet_cluster_lookup", "zoom", "cell_x", "cell_y",
+            postgresql_include=["count", "sum_lat", "sum_lng", "representative_id"],
+        ),
+        Index("idx_toilet_cluster_representative", "representative_id"),
+    )
+    
+    zoom: int = Field(sa_column=Column("zoom", SmallInteger, primary_key=True))
+    cell_x: int = Field(sa_column=Column("cell_x", Integer, primary_key=True))
+    cell_y: int = Field(sa_column=Column("cell_y", Integer, primary_key=True))
+    count: int
+    sum_lat: float
+    sum_lng: float
+    representative_id: Optional[UUID] = Field(
+        default=None,
+        sa_column=Column("representative_id", PostgresUUID(as_uuid=True), nullable=True)
+    )
+
+
+class ToiletClusterDelta(SQLModel, table=True):
+    """Queued +1 / -1 change of a toilet position (written by trigger, see db.clusters)."""
+    __tablename__ = "toilet_cluster_delta"
+    
+    seq: int = Field(sa_column=Column("seq", BigInteger, primary_key=True, autoincrement=True))
+    id: UUID = Field(sa_column=Column("id", PostgresUUID(as_uuid=True), nullable=False))
+    lat: float
+    lng: float
+    sign: int = Field(sa_column=Column("sign", SmallInteger, nullable=False))
+
+
+class CountryBoundary(SQLModel, table=True):
+    """Country polygons used to infer the country of a map center."""
+    __tablename__ = "country_boundary"
+    __table_args__ = (
+        Index("idx_country_boundary_geom", "geom", postgresql_using="gist"),
+    )
+    
+    country_code: CountryCode = Field(primary_key=True)
+    name: Optional[str] = Field(default=None)
+    geom: Optional[str] = Field(
+        default=None,
+        sa_column=Column("geom", Geometry("MULTIPOLYGON", srid=4326, spatial_index=False), nullable=False)
+    )
+
+
+class BackfillCheckpoint(SQLModel, table=True):
+    """Progress of a chunked backfill (see db.backfill), so runs can resume."""
+    __tablename__ = "backfill_checkpoint"
+
+    name: str = Field(primary_key=True)
+    last_key: Optional[str] = Field(default=None, description="Last key processed, as text")
+    rows: int = Field(default=0, sa_column=Column("rows", BigInteger, nullable=False, server_default=text("0")))
+    chunks: int = Field(default=0, sa_column=Column("chunks", Integer, nullable=False, server_default=text("0")))
+    started_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column("started_at", TIMESTAMP(timezone=True), server_default=text("now()"))
+    )
+    updated_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column("updated_at", TIMESTAMP(timezone=True), server_default=text("now()"))
+    )
+    completed_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column("completed_at", TIMESTAMP(timezone=True), nullable=True)
+    )
 
 
 class Toilet(ToiletBase, table=True):
@@ -84,7 +227,8 @@ class Toilet(ToiletBase, table=True):
 
 class ToiletCreate(ToiletBase):
     """Model for creating new toilets."""
-    pass
+    osm_id: Optional[int] = Field(default=None, description="OpenStreetMap node id")
+    osm_version: Optional[int] = Field(default=None, description="OpenStreetMap node version")
 
 
 class ToiletUpdate(ToiletBase):
@@ -106,12 +250,54 @@ class ToiletSearchResult(ToiletRead):
     distance: Optional[float] = Field(default=None, description="Distance in meters")
 
 
+class ToiletRouteResult(ToiletRead):
+    """Toilet near a route, located along it."""
+    route_meters: float = Field(description="Position along the route in meters from its start")
+    detour_meters: float = Field(description="Distance from the route in meters")
+
+
+class ChangeOperation(str, Enum):
+    """Kind of change in the change feed."""
+    INSERT = "insert"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+class ToiletChange(ToiletRead):
+    """One change of the change feed; deletes carry only id, position and country."""
+    op: ChangeOperation = Field(description="insert, update or delete")
+    updated_at: Optional[datetime] = Field(default=None, description="Time of the insert/update")
+    deleted_at: Optional[datetime] = Field(default=None, description="Time of the delete")
+    change_token: str = Field(description="Resume token right after this change")
+
+
+class ToiletChanges(SQLModel):
+    """A page of the change feed."""
+    changes: List[ToiletChange] = Field(default_factory=list)
+    next_token: Optional[str] = Field(default=None, description="since_token for the next page")
+    has_more: bool = Field(default=False, description="Whether more changes are available now")
+
+
 class NearestToiletsParams(SQLModel):
     """Parameters for finding nearest toilets."""
     user_lat: float = Field(description="User latitude")
     user_lng: float = Field(description="User longitude")
     radius_meters: float = Field(default=20000, description="Search radius in meters")
     result_limit: int = Field(default=3, description="Maximum results to return")
+    open_at: Optional[datetime] = Field(default=None, description="Only toilets known to be open at this time")
+
+
+class ToiletsAlongRouteParams(SQLModel):
+    """Parameters for finding toilets along a route."""
+    route: Optional[List[Tuple[float, float]]] = Field(
+        default=None, description="Route as (lat, lng) points, at least two; or give polyline"
+    )
+    polyline: Optional[str] = Field(
+        default=None, description="Route as an encoded polyline (Google / OSRM format); or give route"
+    )
+    polyline_precision: int = Field(default=5, description="Polyline coordinate precision (5, or 6 for OSRM polyline6)")
+    corridor_meters: float = Field(default=500, description="Maximum distance from the route in meters")
+    result_limit: int = Field(default=50, description="Maximum results to return")
 
 
 class ToiletsInViewParams(SQLModel):
@@ -121,6 +307,47 @@ class ToiletsInViewParams(SQLModel):
     max_lat: float = Field(description="Maximum latitude")
     max_lng: float = Field(description="Maximum longitude")
     max_results: int = Field(default=4000, description="Maximum results to return")
+    open_at: Optional[datetime] = Field(default=None, description="Only toilets known to be open at this time")
+
+
+class ToiletCluster(SQLModel):
+    """Aggregated toilets for one grid cell at a zoom level."""
+    zoom: int
+    cell_x: int
+    cell_y: int
+    count: int = Field(description="Number of toilets in the cell")
+    lat: float = Field(description="Centroid latitude")
+    lng: float = Field(description="Centroid longitude")
+    representative_id: Optional[UUID] = Field(default=None, description="Lowest toilet id in the cell")
+
+
+class ToiletClustersParams(SQLModel):
+    """Parameters for fetching toilet clusters in view."""
+    min_lat: float = Field(description="Minimum latitude")
+    min_lng: float = Field(description="Minimum longitude")
+    max_lat: float = Field(description="Maximum latitude")
+    max_lng: float = Field(description="Maximum longitude")
+    zoom: int = Field(description="Map zoom level (clamped to 0..CLUSTER_MAX_ZOOM)")
+
+
+class ToiletDensityCell(SQLModel):
+    """Number of toilets in one quadkey cell."""
+    resolution: int
+    cell_x: int
+    cell_y: int
+    quadkey: str = Field(description="Bing-style quadkey of the cell")
+    count: int = Field(description="Number of toilets in the cell")
+    lat: float = Field(description="Cell center latitude")
+    lng: float = Field(description="Cell center longitude")
+
+
+class ToiletDensityParams(SQLModel):
+    """Parameters for toilet density per cell in a bounding box."""
+    min_lat: float = Field(description="Minimum latitude")
+    min_lng: float = Field(description="Minimum longitude")
+    max_lat: float = Field(description="Maximum latitude")
+    max_lng: float = Field(description="Maximum longitude")
+    resolution: int = Field(default=10, description="Quadkey level of the cells (clamped to 0..24)")
 
 
 class ToiletsDeterministicParams(SQLModel):
@@ -0,0 +1,144 @@
+"""Weekly opening intervals compiled from OSM ``opening_hours`` strings.
+
+``toilet_location.open_minutes`` holds the hours as an ``int4multirange`` of
+minutes of the week (Monday 00:00 = 0, ``[start, end)``), so "open at" is a
+containment test the GiST indexes can serve. The column is set on write by
+the SQL twin of ``parse_opening_hours`` (``toilet_open_minutes``, migration
+7e2d9b4c1a68).
+
+Supported syntax, the common subset of the OSM specification:
+
+* ``24/7``;
+* rules separated by ``;`` (or ``||``), a later rule replacing the hours of
+  the days it selects;
+* weekday selectors: ``Mo``, ``Mo-Fr``, ``Sa,Su``, ``Fr-Mo`` (wrapping);
+  rules selecting public or school holidays (``PH``, ``SH``) are ignored;
+* times: ``08:00-12:00,13:30-18:00``; ends up to ``48:00`` or before the
+  start run into the next day; ``off`` / ``closed``; days without times
+  are open all day.
+
+Anything else (months, dates, weeks, sunrise/sunset, open ends, comments)
+makes the whole value unknown: ``None``, never open in ``open_at`` searches.
+
+Times are local to OPENING_HOURS_TIMEZONE, which is the civil time of every
+supported country.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# Keep in sync with migration 7e2d9b4c1a68
+OPENING_HOURS_TIMEZONE = "Europe/Zurich"
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+WEEKDAYS = ("mo", "tu", "we", "th", "fr", "sa", "su")
+
+Intervals = Tuple[Tuple[int, int], ...]
+
+_DAYS = r"(?:mo|tu|we|th|fr|sa|su)"
+_DAY_SELECTOR = re.compile(rf"^({_DAYS}(?:-{_DAYS})?(?:,{_DAYS}(?:-{_DAYS})?)*)(?:\s+|$)(.*)$")
+_HOLIDAY_SELECTOR = re.compile(r"^(?:ph|sh)\b")
+_TIME_SPAN = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+
+_TIMEZONE = ZoneInfo(OPENING_HOURS_TIMEZONE)
+
+
+def _days(selector: str) -> List[int]:
+    days: List[int] = []
+    for item in selector.split(","):
+        first, _, last = item.partition("-")
+        start = WEEKDAYS.index(first)
+        end = WEEKDAYS.index(last) if last else start
+        days.extend((start + i) % 7 for i in range((end - start) % 7 + 1))
+    return days
+
+
+def _spans(times: str) -> Optional[List[Tuple[int, int]]]:
+    """Minute spans from the day's midnight; None if unsupported."""
+    spans = []
+    for item in times.split(","):
+        match = _TIME_SPAN.match(item.strip())
+        if match is None:
+            return None
+        start_h, start_m, end_h, end_m = (int(group) for group in match.groups())
+        if start_h > 24 or end_h > 48 or start_m > 59 or end_m > 59:
+            return None
+        start, end = start_h * 60 + start_m, end_h * 60 + end_m
+        if end <= start:
+            end += MINUTES_PER_DAY
+        spans.append((start, end))
+    return spans
+
+
+@lru_cache(maxsize=4096)
+def parse_opening_hours(value: Optional[str]) -> Optional[Intervals]:
+    """Sorted, merged [start, end) minute-of-week intervals; None if unknown."""
+    if value is None:
+        return None
+    text = " ".join(value.strip().lower().split())
+    text = re.sub(r"\s*([,-])\s*", r"\1", text)
+    if not text:
+        return None
+    if text == "24/7":
+        return ((0, MINUTES_PER_WEEK),)
+
+    by_day: Dict[int, List[Tuple[int, int]]] = {}
+    for rule in text.replace("||", ";").split(";"):
+        rule = rule.strip()
+        if not rule:
+            continue
+        if _HOLIDAY_SELECTOR.match(rule):
+            continue
+        match = _DAY_SELECTOR.match(rule)
+        if match:
+            days, times = _days(match.group(1)), match.group(2).strip()
+        else:
+            days, times = list(range(7)), rule
+        if times in ("off", "closed"):
+            spans: Optional[List[Tuple[int, int]]] = []
+        elif times in ("", "open", "24/7"):
+            # A weekday selector on its own means open all day
+            spans = [(0, MINUTES_PER_DAY)]
+        else:
+            spans = _spans(times)
+        if spans is None:
+            return None
+        for day in days:
+            by_day[day] = spans
+
+    minutes: List[Tuple[int, int]] = []
+    for day, spans in by_day.items():
+        for start, end in spans:
+            start, end = day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end
+            if end > MINUTES_PER_WEEK:
+                minutes.append((0, end - MINUTES_PER_WEEK))
+                end = MINUTES_PER_WEEK
+            minutes.append((start, end))
+
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(minutes):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+def minute_of_week(at: datetime) -> int:
+    """Local minute of the week (Monday 00:00 = 0); naive datetimes are taken as UTC."""
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=ZoneInfo("UTC"))
+    local = at.astimezone(_TIMEZONE)
+    return local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+
+def is_open(value: Optional[str], at: datetime) -> bool:
+    """Whether an opening_hours string is known to be open at a time."""
+    intervals = parse_opening_hours(value)
+    if not intervals:
+        return False
+    minute = minute_of_week(at)
+    return any(start <= minute < end for start, end in intervals)
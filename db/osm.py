@@ -0,0 +1,274 @@
+"""OpenStreetMap toilet nodes -> ToiletCreate records.
+
+The tag mapping mirrors ``mapOsmToDb`` in ``scripts/populateFromOSM.mjs`` so
+Python and Node imports produce identical rows. The readers are generators
+that parse the input incrementally, so memory stays flat regardless of the
+size of the extract:
+
+* Overpass JSON (``.json``): the ``elements`` array is decoded one element
+  at a time;
+* OSM XML (``.osm``/``.xml``, optionally ``.gz``/``.bz2``): ``iterparse`` with
+  parsed elements cleared as it goes;
+* OSM PBF (``.pbf``): pyosmium's ``FileProcessor`` (optional dependency).
+"""
+import bz2
+import gzip
+import json
+from pathlib import Path
+from xml.etree import ElementTree
+from typing import Iterator, Optional
+
+from .models import ToiletCreate
+
+
+def osm_node_to_toilet(
+    osm_id: int,
+    lat: Optional[float],
+    lng: Optional[float],
+    tags: dict,
+    version: Optional[int] = None,
+    country_code: Optional[str] = None,
+) -> Optional[ToiletCreate]:
+    """Map one OSM node and its tags to a ToiletCreate, or None if unusable."""
+    if lat is None or lng is None:
+        return None
+
+    # wheelchair -> accessible ('limited' or missing stays None)
+    accessible = {"yes": True, "no": False}.get(tags.get("wheelchair"))
+    # fee -> is_free
+    is_free = {"no": True, "yes": False}.get(tags.get("fee"))
+
+    street = tags.get("addr:street")
+    housenumber = tags.get("addr:housenumber")
+    postcode = tags.get("addr:postcode")
+    city = tags.get("addr:city")
+    address = " ".join(part for part in (street, housenumber, postcode, city) if part).strip() or None
+
+    notes_parts = []
+    if tags.get("description"):
+        notes_parts.append(f"Description: {tags['description']}")
+    if tags.get("note"):
+        notes_parts.append(f"Note: {tags['note']}")
+    if tags.get("charge"):
+        notes_parts.append(f"Charge: {tags['charge']}")
+    if tags.get("operator"):
+        notes_parts.append(f"Operator: {tags['operator']}")
+    if not address:
+        if street:
+            notes_parts.append(f"Street: {street}")
+        if housenumber:
+            notes_parts.append(f"HN: {housenumber}")
+        if postcode:
+            notes_parts.append(f"Postcode: {postcode}")
+        if city:
+            notes_parts.append(f"City: {city}")
+
+    position = tags.get("toilets:position")
+
+    return ToiletCreate(
+        name=tags.get("name") or "Public Toilet",
+        lat=float(lat),
+        lng=float(lng),
+        accessible=accessible,
+        open_hours=tags.get("opening_hours") or None,
+        address=address,
+        is_free=is_free,
+        type=f"Position: {position}" if position else "Unknown",
+        status="Disused" if tags.get("disused:amenity") == "toilets" else "in Betrieb",
+        notes="; ".join(notes_parts) or None,
+        city=city or None,
+        country_code=country_code,
+        osm_id=int(osm_id),
+        osm_version=int(version) if version is not None else None,
+    )
+
+
+_JSON_DELIMITERS = frozenset(",:]} \t\r\n")
+
+
+class _JsonArrayStream:
+    """Incremental reader over a JSON document, decoding one value at a time.
+
+    Only the current value and a small read buffer are held in memory.
+    """
+
+    def __init__(self, f, chunk_size: int = 1 << 16):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def next_char(self) -> str:
+        """Consume whitespace and return (and consume) the next character."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                char = self._buffer[self._pos]
+                self._pos += 1
+                return char
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def peek_char(self) -> str:
+        char = self.next_char()
+        self._pos -= 1
+        return char
+
+    def decode(self):
+        """Decode the next complete JSON value."""
+        self.peek_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number or literal is complete only when a delimiter (or EOF)
+            # follows it: "0.6" cut after "0." decodes as 0
+            if (
+                not isinstance(value, (str, list, dict))
+                and not (end < len(self._buffer) and self._buffer[end] in _JSON_DELIMITERS)
+                and self._fill()
+            ):
+                continue
+            self._pos = end
+            return value
+
+    def iter_object_key(self, key: str) -> Iterator:
+        """Yield the items of the array stored under a top-level object key."""
+        if self.next_char() != "{":
+            raise ValueError("Expected a JSON object")
+        while self.peek_char() != "}":
+            name = self.decode()
+            if self.next_char() != ":":
+                raise ValueError("Malformed JSON object")
+            if name == key and self.peek_char() == "[":
+                self.next_char()
+                while self.peek_char() != "]":
+                    yield self.decode()
+                    if self.peek_char() == ",":
+                        self.next_char()
+                self.next_char()
+            else:
+                self.decode()
+            if self.peek_char() == ",":
+                self.next_char()
+
+
+def _open_text(path: Path):
+    """Open a plain, .gz or .bz2 file as text."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.suffix == ".bz2":
+        return bz2.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def _open_binary(path: Path):
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".bz2":
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _is_toilet(tags: dict) -> bool:
+    return tags.get("amenity") == "toilets" or tags.get("disused:amenity") == "toilets"
+
+
+def read_overpass_json(path: Path, country_code: Optional[str] = None) -> Iterator[ToiletCreate]:
+    """Stream toilets from an Overpass JSON response saved to disk (nodes only)."""
+    with _open_text(path) as f:
+        for element in _JsonArrayStream(f).iter_object_key("elements"):
+            if element.get("type") != "node":
+                continue
+            toilet = osm_node_to_toilet(
+                element.get("id"),
+                element.get("lat"),
+                element.get("lon"),
+                element.get("tags") or {},
+                element.get("version"),
+                country_code,
+            )
+            if toilet is not None:
+                yield toilet
+
+
+def read_osm_xml(path: Path, country_code: Optional[str] = None) -> Iterator[ToiletCreate]:
+    """Stream toilet nodes from an OSM XML extract (.osm, .osm.gz, .osm.bz2)."""
+    with _open_binary(path) as f:
+        context = ElementTree.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, element in context:
+            if event != "end":
+                continue
+            if element.tag == "node":
+                tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                if _is_toilet(tags):
+                    lat, lon, version = element.get("lat"), element.get("lon"), element.get("version")
+                    toilet = osm_node_to_toilet(
+                        int(element.get("id")),
+                        float(lat) if lat is not None else None,
+                        float(lon) if lon is not None else None,
+                        tags,
+                        int(version) if version is not None else None,
+                        country_code,
+                    )
+                    if toilet is not None:
+                        yield toilet
+            if element.tag in ("node", "way", "relation"):
+                # Drop parsed elements so memory stays flat
+                root.clear()
+
+
+def read_osm_pbf(path: Path, country_code: Optional[str] = None) -> Iterator[ToiletCreate]:
+    """Stream toilet nodes from an OSM PBF extract (requires pyosmium)."""
+    try:
+        import osmium
+    except ImportError as exc:
+        raise ImportError(
+            "Reading .pbf extracts requires pyosmium: install toilet-radar[osm]"
+        ) from exc
+
+    for node in osmium.FileProcessor(str(path), osmium.osm.NODE):
+        tags = dict(node.tags)
+        if not _is_toilet(tags) or not node.location.valid():
+            continue
+        toilet = osm_node_to_toilet(
+            node.id, node.location.lat, node.location.lon, tags, node.version, country_code
+        )
+        if toilet is not None:
+            yield toilet
+
+
+def read_osm(path: Path, country_code: Optional[str] = None) -> Iterator[ToiletCreate]:
+    """Stream toilets from an Overpass JSON, OSM XML or OSM PBF file."""
+    path = Path(path)
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if suffixes and suffixes[-1] in (".gz", ".bz2"):
+        suffixes = suffixes[:-1]
+    kind = suffixes[-1] if suffixes else ""
+    if kind == ".json":
+        return read_overpass_json(path, country_code)
+    if kind in (".osm", ".xml"):
+        return read_osm_xml(path, country_code)
+    if kind == ".pbf":
+        return read_osm_pbf(path, country_code)
+    raise ValueError(f"Unsupported OSM file type: {path.name} (expected .json, .osm/.xml or .pbf)")
@@ -0,0 +1,160 @@
+"""Idempotent OpenStreetMap sync into toilet_location keyed on osm_id.
+
+The incoming nodes are COPYed into a temporary staging table, then applied
+with set-based statements:
+
+* ``INSERT ... ON CONFLICT (osm_id) DO UPDATE`` restricted to rows whose
+  ``osm_version`` changed, so unchanged nodes are not rewritten;
+* optionally, ``DELETE`` of OSM rows of the synced country that are no
+  longer present in the extract.
+
+Usage:
+    db-osm-sync overpass_ch.json --country CH --delete-missing
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .data_import import COPY_COLUMNS, DEFAULT_CHUNK_SIZE, copy_toilets
+from .models import CountryCode, ToiletCreate
+from .osm import read_osm
+
+STAGING_TABLE = "osm_toilet_staging"
+
+# Columns refreshed from OSM on update; geom follows lat/lng via the trigger
+SYNC_COLUMNS = tuple(column for column in COPY_COLUMNS if column not in ("osm_id", "geom"))
+
+_CREATE_STAGING_SQL = f"""
+    CREATE TEMP TABLE {STAGING_TABLE} (
+        LIKE toilet_location INCLUDING DEFAULTS
+    ) ON COMMIT DROP
+"""
+
+_UPSERT_SQL = f"""
+    WITH incoming AS (
+        SELECT DISTINCT ON (osm_id) *
+        FROM {STAGING_TABLE}
+        WHERE osm_id IS NOT NULL
+        ORDER BY osm_id, osm_version DESC NULLS LAST
+    ),
+    upserted AS (
+        INSERT INTO toilet_location ({', '.join(COPY_COLUMNS)})
+        SELECT {', '.join(COPY_COLUMNS)} FROM incoming
+        ON CONFLICT (osm_id) DO UPDATE SET
+            {', '.join(f'{column} = EXCLUDED.{column}' for column in SYNC_COLUMNS)}
+        WHERE EXCLUDED.osm_version IS NULL
+           OR toilet_location.osm_version IS DISTINCT FROM EXCLUDED.osm_version
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        (SELECT count(*) FROM incoming) AS staged,
+        count(*) FILTER (WHERE inserted) AS inserted,
+        count(*) FILTER (WHERE NOT inserted) AS updated
+    FROM upserted
+"""
+
+_DELETE_MISSING_SQL = f"""
+    DELETE FROM toilet_location t
+    WHERE t.osm_id IS NOT NULL
+      AND t.country_code = %s
+      AND NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} s WHERE s.osm_id = t.osm_id)
+"""
+
+
+@dataclass
+class SyncStats:
+    """Outcome of an OSM sync."""
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    seconds: float = 0.0
+
+
+def sync_toilets(
+    dbapi_connection,
+    toilets: Iterable[ToiletCreate],
+    country_code: Optional[str] = None,
+    delete_missing: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> SyncStats:
+    """Upsert OSM toilets by osm_id; the caller commits or rolls back."""
+    if delete_missing and not country_code:
+        raise ValueError("delete_missing requires a country_code to scope the deletion")
+
+    started = time.perf_counter()
+    stats = SyncStats()
+    with dbapi_connection.cursor() as cursor:
+        cursor.execute(_CREATE_STAGING_SQL)
+        copy_toilets(dbapi_connection, toilets, chunk_size, table=STAGING_TABLE)
+        cursor.execute(f"ANALYZE {STAGING_TABLE}")
+
+        cursor.execute(_UPSERT_SQL)
+        staged, stats.inserted, stats.updated = cursor.fetchone()
+        stats.unchanged = staged - stats.inserted - stats.updated
+
+        if delete_missing:
+            cursor.execute(_DELETE_MISSING_SQL, (country_code,))
+            stats.deleted = cursor.rowcount
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def sync_file(
+    path: Path,
+    country_code: Optional[str] = None,
+    delete_missing: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> SyncStats:
+    """Sync an Overpass JSON / OSM XML / OSM PBF file in one transaction."""
+    from .clusters import fold_cluster_deltas
+    from .engine import engine
+
+    connection = engine.raw_connection()
+    try:
+        stats = sync_toilets(
+            connection,
+            read_osm(path, country_code),
+            country_code,
+            delete_missing,
+            chunk_size,
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    # Fold the queued cluster deltas now rather than at the next db-clusters run
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        fold_cluster_deltas(connection)
+    return stats
+
+
+def main(argv=None):
+    """Entry point for the db-osm-sync script."""
+    parser = argparse.ArgumentParser(description="Upsert OSM toilets into toilet_location keyed on osm_id.")
+    parser.add_argument("path", type=Path, help="Overpass JSON (queried with 'out meta'), OSM XML or PBF extract")
+    parser.add_argument("--country", choices=[code.value for code in CountryCode],
+                        help="Country code assigned to the imported nodes")
+    parser.add_argument("--delete-missing", action="store_true",
+                        help="Delete OSM rows of --country that are absent from the file")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per COPY chunk (default {DEFAULT_CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    print(f"Syncing {args.path} into toilet_location...")
+    stats = sync_file(args.path, args.country, args.delete_missing, args.chunk_size)
+    print(
+        f"Inserted: {stats.inserted}, Updated: {stats.updated}, "
+        f"Unchanged: {stats.unchanged}, Deleted: {stats.deleted} ({stats.seconds:.2f}s)"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Result modes for the toilet search queries.
+
+The default ``model`` mode validates every row into ``ToiletRead`` /
+``ToiletSearchResult``. For large viewports the cheaper modes skip pydantic:
+
+* ``record``: immutable ``NamedTuple`` records built straight from the row
+  tuples;
+* ``columnar``: one NumPy structured array (requires numpy);
+* ``json``: pre-serialized JSON bytes for the API layer (uses orjson when
+  installed).
+"""
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Union
+from uuid import UUID
+
+from .models import ToiletRead, ToiletSearchResult
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class ResultMode(str, Enum):
+    """How search results are returned."""
+    MODEL = "model"
+    RECORD = "record"
+    COLUMNAR = "columnar"
+    JSON = "json"
+
+
+class ToiletRecord(NamedTuple):
+    """Lightweight find_toilets_in_view / deterministic row (same column order)."""
+    id: UUID
+    name: Optional[str]
+    lat: Optional[float]
+    lng: Optional[float]
+    accessible: Optional[bool]
+    open_hours: Optional[str]
+    address: Optional[str]
+    created_at: Optional[datetime]
+
+
+class ToiletSearchRecord(NamedTuple):
+    """Lightweight find_nearest_toilets row (same column order)."""
+    id: UUID
+    name: Optional[str]
+    lat: Optional[float]
+    lng: Optional[float]
+    address: Optional[str]
+    accessible: Optional[bool]
+    is_free: Optional[bool]
+    type: Optional[str]
+    status: Optional[str]
+    notes: Optional[str]
+    city: Optional[str]
+    open_hours: Optional[str]
+    distance: Optional[float]
+    created_at: Optional[datetime]
+
+
+Record = Union[ToiletRecord, ToiletSearchRecord]
+
+
+def _columnar_dtype(record_type):
+    import numpy as np
+
+    numeric = {
+        "lat": np.float64,
+        "lng": np.float64,
+        "distance": np.float64,
+        # Nullable booleans: -1 unknown, 0 false, 1 true
+        "accessible": np.int8,
+        "is_free": np.int8,
+    }
+    fields = []
+    for name in record_type._fields:
+        if name == "id":
+            fields.append((name, "U36"))
+        elif name in numeric:
+            fields.append((name, numeric[name]))
+        else:
+            fields.append((name, object))
+    return np.dtype(fields)
+
+
+def to_columnar(records: Sequence[Record], record_type):
+    """Pack records into a NumPy structured array."""
+    import numpy as np
+
+    array = np.empty(len(records), dtype=_columnar_dtype(record_type))
+    if not records:
+        return array
+    columns = list(zip(*records))
+    for name, values in zip(record_type._fields, columns):
+        kind = array.dtype[name]
+        if name == "id":
+            array[name] = [str(value) for value in values]
+        elif kind == np.int8:
+            array[name] = [-1 if value is None else int(value) for value in values]
+        elif kind == np.float64:
+            array[name] = [np.nan if value is None else value for value in values]
+        else:
+            array[name] = values
+    return array
+
+
+def _json_default(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_json(records: Sequence[Record]) -> bytes:
+    """Serialize records as a JSON array of objects."""
+    payload = [record._asdict() for record in records]
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+
+
+def records_to_mode(records: Sequence[Record], record_type, mode: ResultMode):
+    """Convert records to the requested mode."""
+    if mode == ResultMode.MODEL:
+        model = ToiletSearchResult if record_type is ToiletSearchRecord else ToiletRead
+        return [model(**record._asdict()) for record in records]
+    if mode == ResultMode.RECORD:
+        return list(records)
+    if mode == ResultMode.COLUMNAR:
+        return to_columnar(records, record_type)
+    if mode == ResultMode.JSON:
+        return to_json(records)
+    raise ValueError(f"Unknown result mode: {mode}")
+
+
+def rows_to_mode(rows: Iterable, record_type, mode: ResultMode):
+    """Map raw result rows (in record_type column order) to a lean mode."""
+    return records_to_mode([record_type._make(row) for row in rows], record_type, mode)
+
+
+def models_to_mode(models: List[ToiletRead], record_type, mode: ResultMode):
+    """Convert already-built models (e.g. from the spatial index) to a mode."""
+    if mode == ResultMode.MODEL:
+        return models
+    rows = [tuple(getattr(model, name) for name in record_type._fields) for model in models]
+    return rows_to_mode(rows, record_type, mode)
@@ -0,0 +1,177 @@
+"""Read-replica routing for sync sessions.
+
+``RoutingSession`` sends reads (SELECTs, including the ``find_*`` / ``get_*``
+SQL function calls) to a replica and everything else (ORM flushes, INSERT /
+UPDATE / DELETE, COPY) to the primary:
+
+* replicas are picked round-robin among healthy ones, once per session so a
+  request sees a single replica;
+* ``ReplicaSet`` health-checks replicas at most every ``check_interval``
+  seconds and skips any that are down or lag more than ``max_lag_seconds``;
+  with no usable replica, reads fall back to the primary. Checks run in
+  background threads, so a dead replica's connect timeout never stalls a
+  request; until its first check completes a replica gets no reads;
+* after a session writes, its later reads go to the primary
+  (read-your-writes), e.g. the refresh after ``create_toilet``'s commit.
+
+``ToiletService`` needs no changes: give it a session from
+``db.engine.RoutingSessionLocal``.
+"""
+import itertools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import TextClause
+from sqlmodel import Session
+
+# Seconds behind the primary; 0 when fully replayed (an idle primary writes
+# nothing, so the last replay timestamp alone would overstate the lag)
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_READ_START = re.compile(r"^\s*(select|with|show|explain)\b", re.IGNORECASE)
+_WRITE_WORD = re.compile(r"\b(insert|update|delete|merge|truncate|copy)\b|\bfor\s+share\b", re.IGNORECASE)
+
+
+@dataclass
+class ReplicaStatus:
+    """Last health check of a replica."""
+    healthy: bool = True
+    lag_seconds: Optional[float] = None
+    checked_at: float = 0.0
+    error: Optional[str] = None
+
+
+class ReplicaSet:
+    """Round-robin pool of replica engines with lag-aware health checks."""
+
+    def __init__(
+        self,
+        engines: Sequence[Engine],
+        max_lag_seconds: float = 30.0,
+        check_interval: float = 10.0,
+    ):
+        self.engines: List[Engine] = list(engines)
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.status = [
+            ReplicaStatus(healthy=False, checked_at=float("-inf"), error="not checked yet") for _ in self.engines
+        ]
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def check(self, index: int) -> ReplicaStatus:
+        """Measure one replica's lag now."""
+        status = ReplicaStatus(checked_at=time.monotonic())
+        try:
+            with self.engines[index].connect() as connection:
+                status.lag_seconds = float(connection.execute(REPLICA_LAG_SQL).scalar_one())
+            status.healthy = status.lag_seconds <= self.max_lag_seconds
+            if not status.healthy:
+                status.error = f"lagging {status.lag_seconds:.1f}s"
+        except DBAPIError as exc:
+            status.healthy = False
+            status.error = str(exc.orig or exc).strip()
+        self.status[index] = status
+        return status
+
+    def _refresh_due(self) -> List[threading.Thread]:
+        """Start background checks of the replicas that are due; returns their threads."""
+        now = time.monotonic()
+        with self._lock:
+            due = [i for i, status in enumerate(self.status) if now - status.checked_at >= self.check_interval]
+            # Claim the checks so concurrent callers do not repeat them
+            for i in due:
+                self.status[i].checked_at = now
+        threads = [
+            threading.Thread(target=self.check, args=(i,), name=f"replica-check-{i}", daemon=True) for i in due
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def mark_down(self, engine: Engine, error: str) -> None:
+        """Take a replica out of rotation until its next health check."""
+        for i, candidate in enumerate(self.engines):
+            if candidate is engine:
+                self.status[i] = ReplicaStatus(healthy=False, checked_at=time.monotonic(), error=error)
+
+    def choose(self) -> Optional[Engine]:
+        """Next healthy replica in round-robin order, or None to use the primary.
+
+        Serves the last known status; due health checks refresh it in the background.
+        """
+        if not self.engines:
+            return None
+        self._refresh_due()
+        start = next(self._next)
+        for offset in range(len(self.engines)):
+            i = (start + offset) % len(self.engines)
+            if self.status[i].healthy:
+                return self.engines[i]
+        return None
+
+
+def is_read(clause) -> bool:
+    """Whether a statement only reads (safe to run on a replica)."""
+    if isinstance(clause, Select):
+        return clause._for_update_arg is None
+    if isinstance(clause, TextClause):
+        return bool(_READ_START.match(clause.text)) and not _WRITE_WORD.search(clause.text)
+    return False
+
+
+class RoutingSession(Session):
+    """Session binding reads to a replica and writes to the primary."""
+
+    def __init__(self, primary: Engine, replicas: Optional[ReplicaSet] = None, **kwargs):
+        kwargs.pop("bind", None)  # sessionmaker passes bind=None
+        super().__init__(bind=primary, **kwargs)
+        self.primary = primary
+        self.replicas = replicas
+        self._replica: Optional[Engine] = None
+        self._pinned = 0
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._pinned or self._wrote or not self.replicas:
+            return self.primary
+        if self._flushing or not is_read(clause):
+            # Read-your-writes: stay on the primary for the rest of the session
+            self._wrote = True
+            return self.primary
+        if self._replica is None:
+            self._replica = self.replicas.choose()
+            if self._replica is None:
+                return self.primary
+        return self._replica
+
+    @contextmanager
+    def using_primary(self) -> Iterator["RoutingSession"]:
+        """Route every statement in the block to the primary."""
+        self._pinned += 1
+        try:
+            yield self
+        finally:
+            self._pinned -= 1
+
+    def close(self) -> None:
+        super().close()
+        self._replica = None
+        self._wrote = False
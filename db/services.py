@@ -1,14 +1,43 @@
 """Database services for toilet operations."""
-from typing import List, Optional
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 from uuid import UUID
 
-from sqlalchemy import func, text
+from sqlalchemy import TextClause, func, text
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from .cache import QueryCache, default_query_cache, quantize
+from .cells import QUADKEY_LEVEL, cell_bounds, cell_center, deinterleave, key_ranges, quadkey_digits
+from .countries import CELL_INSIDE_SQL, CountryResolver, default_country_resolver
+from .metrics import default_metrics
+from .opening_hours import minute_of_week
+from .results import (
+    ResultMode,
+    ToiletRecord,
+    ToiletSearchRecord,
+    models_to_mode,
+    records_to_mode,
+    rows_to_mode,
+)
 from .models import (
     NearestToiletsParams,
+    ToiletChange,
+    ToiletChanges,
+    ToiletRouteResult,
+    ToiletsAlongRouteParams,
+    ToiletCluster,
+    ToiletClustersParams,
     ToiletLocation,
     ToiletCreate,
+    ToiletDensityCell,
+    ToiletDensityParams,
     ToiletRead,
     ToiletSearchResult,
     ToiletUpdate,
@@ -16,12 +45,423 @@ from .models import (
     ToiletsDeterministicParams,
 )
 
+if TYPE_CHECKING:
+    from .spatial_index import RefreshingSpatialIndex, ToiletSpatialIndex
+
+
+FIND_NEAREST_TOILETS_SQL = text("""
+    SELECT id, name, lat, lng, address, accessible, is_free, type, status, 
+           notes, city, open_hours, distance, created_at
+    FROM find_nearest_toilets(:user_lat, :user_lng, :radius_meters, :result_limit, :open_at)
+""")
+
+FIND_NEAREST_TOILETS_BATCH_SQL = text("""
+    SELECT point_index, id, name, lat, lng, address, accessible, is_free, type, status, 
+           notes, city, open_hours, distance, created_at
+    FROM find_nearest_toilets_batch(:user_lats, :user_lngs, :radius_meters, :result_limit)
+""")
+
+FIND_TOILETS_ALONG_ROUTE_SQL = text("""
+    SELECT id, name, lat, lng, address, accessible, is_free, type, status,
+           notes, city, open_hours, route_meters, detour_meters, created_at
+    FROM find_toilets_along_route(:route_lats, :route_lngs, :corridor_meters, :result_limit)
+""")
+
+FIND_TOILETS_IN_VIEW_SQL = text("""
+    SELECT id, name, lat, lng, accessible, open_hours, address, created_at
+    FROM find_toilets_in_view(:min_lat, :min_lng, :max_lat, :max_lng, :max_results, :open_at)
+""")
+
+GET_TOILETS_IN_COUNTRY_SQL = text("""
+    SELECT id, name, lat, lng, accessible, open_hours, address, created_at
+    FROM get_toilets_in_country(
+        :country_code, :center_lat, :center_lng, :is_zoomed_in, :result_limit
+    )
+""")
+
+# v4: LANGUAGE sql functions the planner inlines (migration b58e2f0c93d7)
+FIND_NEAREST_TOILETS_V4_SQL = text("""
+    SELECT id, name, lat, lng, address, accessible, is_free, type, status, 
+           notes, city, open_hours, distance, created_at
+    FROM find_nearest_toilets_v4(:user_lat, :user_lng, :radius_meters, :result_limit, :open_at)
+""")
+
+FIND_TOILETS_IN_VIEW_V4_SQL = text("""
+    SELECT id, name, lat, lng, accessible, open_hours, address, created_at
+    FROM find_toilets_in_view_v4(:min_lat, :min_lng, :max_lat, :max_lng, :max_results, :open_at)
+""")
+
+GET_TOILETS_IN_COUNTRY_V4_SQL = text("""
+    SELECT id, name, lat, lng, accessible, open_hours, address, created_at
+    FROM get_toilets_in_country_v4(
+        :country_code, :center_lat, :center_lng, :is_zoomed_in, :result_limit
+    )
+""")
+
+
+def in_inferred_country_sql(function: str) -> TextClause:
+    """get_toilets_in_country (v3/v4 function name) with the country inferred in the same statement.
+    
+    The country is inferred at :country_lat/:country_lng; every row carries it
+    and whether the point's resolver cell lies inside it (see db.countries).
+    Without toilets in the country a single row with NULL toilet columns is
+    returned.
+    """
+    return text(f"""
+        WITH r AS MATERIALIZED (
+            SELECT infer_country_code(:country_lat, :country_lng) AS country_code
+        ), c AS MATERIALIZED (
+            SELECT r.country_code, {CELL_INSIDE_SQL} AS cell_inside FROM r
+        )
+        SELECT t.id, t.name, t.lat, t.lng, t.accessible, t.open_hours, t.address, t.created_at,
+               c.country_code AS inferred_country_code, c.cell_inside
+        FROM c
+        LEFT JOIN LATERAL {function}(
+            c.country_code, :center_lat, :center_lng, :is_zoomed_in, :result_limit
+        ) t ON true
+    """)
+
+
+GET_TOILETS_IN_INFERRED_COUNTRY_SQL = in_inferred_country_sql("get_toilets_in_country")
+GET_TOILETS_IN_INFERRED_COUNTRY_V4_SQL = in_inferred_country_sql("get_toilets_in_country_v4")
+
+
+class SearchVersion(str, Enum):
+    """Which set of search SQL functions a service calls."""
+    V3 = "v3"  # plpgsql functions
+    V4 = "v4"  # inlinable sql functions, logging behind toilet_radar.log_searches
+
+
+class SearchStatements(NamedTuple):
+    """Statements for one search function version."""
+    nearest: TextClause
+    in_view: TextClause
+    in_country: TextClause
+    in_inferred_country: TextClause
+
+
+SEARCH_STATEMENTS = {
+    SearchVersion.V3: SearchStatements(
+        FIND_NEAREST_TOILETS_SQL, FIND_TOILETS_IN_VIEW_SQL, GET_TOILETS_IN_COUNTRY_SQL,
+        GET_TOILETS_IN_INFERRED_COUNTRY_SQL,
+    ),
+    SearchVersion.V4: SearchStatements(
+        FIND_NEAREST_TOILETS_V4_SQL, FIND_TOILETS_IN_VIEW_V4_SQL, GET_TOILETS_IN_COUNTRY_V4_SQL,
+        GET_TOILETS_IN_INFERRED_COUNTRY_V4_SQL,
+    ),
+}
+
+
+GET_TOILET_CLUSTERS_SQL = text("""
+    SELECT zoom, cell_x, cell_y, count, lat, lng, representative_id
+    FROM get_toilet_clusters(:min_lat, :min_lng, :max_lat, :max_lng, :zoom)
+""")
+
+GET_TOILET_DENSITY_SQL = text("""
+    SELECT cell, count
+    FROM get_toilet_density(CAST(:starts AS bigint[]), CAST(:ends AS bigint[]), :resolution)
+""")
+
+GET_CHANGES_SQL = text("""
+    SELECT op, id, name, lat, lng, accessible, open_hours, address, rating, is_free, type,
+           status, notes, city, country_code, created_at, updated_at, deleted_at, change_token
+    FROM get_changes(:since_token, :result_limit)
+""")
+
+
+def nearest_toilets_bind(params: NearestToiletsParams) -> dict:
+    """Bind parameters for find_nearest_toilets."""
+    return {
+        "user_lat": params.user_lat,
+        "user_lng": params.user_lng,
+        "radius_meters": params.radius_meters,
+        "result_limit": params.result_limit,
+        "open_at": params.open_at,
+    }
+
+
+def nearest_toilets_batch_bind(
+    points: Sequence[Tuple[float, float]], radius_meters: float, result_limit: int
+) -> dict:
+    """Bind parameters for find_nearest_toilets_batch; points are (lat, lng)."""
+    return {
+        "user_lats": [float(lat) for lat, _ in points],
+        "user_lngs": [float(lng) for _, lng in points],
+        "radius_meters": radius_meters,
+        "result_limit": result_limit,
+    }
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    """(lat, lng) points of an encoded polyline (Google / OSRM format)."""
+    factor = 10 ** precision
+    points: List[Tuple[float, float]] = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= len(encoded):
+                    raise ValueError(f"Truncated polyline at character {index}")
+                byte = ord(encoded[index]) - 63
+                if not 0 <= byte < 64:
+                    raise ValueError(f"Invalid polyline character {encoded[index]!r} at {index}")
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+def route_points(params: ToiletsAlongRouteParams) -> List[Tuple[float, float]]:
+    """Route of the params as (lat, lng) points, decoding an encoded polyline."""
+    if (params.route is None) == (params.polyline is None):
+        raise ValueError("Give either route points or an encoded polyline")
+    if params.polyline is not None:
+        return decode_polyline(params.polyline, params.polyline_precision)
+    return list(params.route)
+
+
+def toilets_along_route_bind(params: ToiletsAlongRouteParams) -> dict:
+    """Bind parameters for find_toilets_along_route."""
+    route = route_points(params)
+    if len(route) < 2:
+        raise ValueError("A route needs at least two points")
+    return {
+        "route_lats": [float(lat) for lat, _ in route],
+        "route_lngs": [float(lng) for _, lng in route],
+        "corridor_meters": params.corridor_meters,
+        "result_limit": params.result_limit,
+    }
+
+
+def group_batch_results(rows, n_points: int) -> List[List[ToiletSearchResult]]:
+    """Group find_nearest_toilets_batch rows into one list per input point."""
+    grouped: List[List[ToiletSearchResult]] = [[] for _ in range(n_points)]
+    with default_metrics.time_mapping("search_batch", ResultMode.MODEL.value):
+        for row in rows:
+            grouped[row.point_index].append(row_to_search_result(row))
+    return grouped
+
+
+def toilets_in_view_bind(params: ToiletsInViewParams) -> dict:
+    """Bind parameters for find_toilets_in_view."""
+    return {
+        "min_lat": params.min_lat,
+        "min_lng": params.min_lng,
+        "max_lat": params.max_lat,
+        "max_lng": params.max_lng,
+        "max_results": params.max_results,
+        "open_at": params.open_at,
+    }
+
+
+def check_map_center(params: ToiletsDeterministicParams) -> None:
+    """Reject map centers outside the valid lat/lng range."""
+    if not (-90 <= params.center_lat <= 90 and -180 <= params.center_lng <= 180):
+        raise ValueError(
+            f"Invalid map center coordinates provided: {params.center_lat}, {params.center_lng}"
+        )
+
+
+def toilets_in_country_bind(params: ToiletsDeterministicParams, country_code: str) -> dict:
+    """Bind parameters for get_toilets_in_country."""
+    check_map_center(params)
+    return {
+        "country_code": country_code,
+        "center_lat": params.center_lat,
+        "center_lng": params.center_lng,
+        "is_zoomed_in": params.is_zoomed_in,
+        "result_limit": params.result_limit,
+    }
+
+
+def toilets_in_inferred_country_bind(
+    params: ToiletsDeterministicParams, country_lat: float, country_lng: float, resolver: CountryResolver
+) -> dict:
+    """Bind parameters for SearchStatements.in_inferred_country."""
+    check_map_center(params)
+    return {
+        "country_lat": country_lat,
+        "country_lng": country_lng,
+        **resolver.cell_bind(country_lat, country_lng),
+        "center_lat": params.center_lat,
+        "center_lng": params.center_lng,
+        "is_zoomed_in": params.is_zoomed_in,
+        "result_limit": params.result_limit,
+    }
+
+
+def inferred_country_records(rows, resolver: CountryResolver, lat: float, lng: float) -> Tuple[str, List[ToiletRecord]]:
+    """Country and toilets of in_inferred_country rows; remembers the country for (lat, lng)."""
+    first = rows[0]
+    resolver.remember(lat, lng, first.inferred_country_code, first.cell_inside)
+    records = [ToiletRecord._make(row[:len(ToiletRecord._fields)]) for row in rows if row.id is not None]
+    return first.inferred_country_code, records
+
+
+def toilet_clusters_bind(params: ToiletClustersParams) -> dict:
+    """Bind parameters for get_toilet_clusters."""
+    return {
+        "min_lat": params.min_lat,
+        "min_lng": params.min_lng,
+        "max_lat": params.max_lat,
+        "max_lng": params.max_lng,
+        "zoom": params.zoom,
+    }
+
+
+def density_cell_bounds(params: ToiletDensityParams) -> Tuple[int, int, int, int, int]:
+    """Clamped resolution and the cell range (x0, y0, x1, y1) of a density query."""
+    resolution = min(max(params.resolution, 0), QUADKEY_LEVEL)
+    return (resolution,) + cell_bounds(params.min_lat, params.min_lng, params.max_lat, params.max_lng, resolution)
+
+
+def toilet_density_bind(params: ToiletDensityParams) -> dict:
+    """Bind parameters for get_toilet_density (quadkey ranges covering the bbox)."""
+    resolution, *bounds = density_cell_bounds(params)
+    ranges = key_ranges(tuple(bounds), resolution)
+    return {
+        "starts": [start for start, _ in ranges],
+        "ends": [end for _, end in ranges],
+        "resolution": resolution,
+    }
+
+
+def map_density_rows(rows, params: ToiletDensityParams) -> List[ToiletDensityCell]:
+    """Cells of get_toilet_density rows inside the bbox, in quadkey order."""
+    resolution, x0, y0, x1, y1 = density_cell_bounds(params)
+    cells = []
+    for row in sorted(rows, key=lambda row: row.cell):
+        x, y = deinterleave(row.cell)
+        # Coarse border ranges may count cells just outside the bbox
+        if x0 <= x <= x1 and y0 <= y <= y1:
+            lat, lng = cell_center(x, y, resolution)
+            cells.append(ToiletDensityCell(
+                resolution=resolution, cell_x=x, cell_y=y, quadkey=quadkey_digits(row.cell, resolution),
+                count=row.count, lat=lat, lng=lng,
+            ))
+    return cells
+
+
+def map_change_rows(rows, since_token: Optional[str], limit: int) -> ToiletChanges:
+    """Page of get_changes rows; the next token stays put when nothing changed."""
+    changes = [ToiletChange.model_validate(row, from_attributes=True) for row in rows]
+    return ToiletChanges(
+        changes=changes,
+        next_token=changes[-1].change_token if changes else since_token,
+        has_more=len(changes) >= limit,
+    )
+
+
+def map_search_rows(rows, mode: ResultMode = ResultMode.MODEL):
+    """Map find_nearest_toilets rows to the requested result mode."""
+    with default_metrics.time_mapping("search", ResultMode(mode).value):
+        if mode == ResultMode.MODEL:
+            return [row_to_search_result(row) for row in rows]
+        return rows_to_mode(rows, ToiletSearchRecord, mode)
+
+
+def map_toilet_rows(rows, mode: ResultMode = ResultMode.MODEL):
+    """Map in-view / deterministic rows to the requested result mode."""
+    with default_metrics.time_mapping("toilet", ResultMode(mode).value):
+        if mode == ResultMode.MODEL:
+            return [row_to_toilet_read(row) for row in rows]
+        return rows_to_mode(rows, ToiletRecord, mode)
+
+
+def toilet_read_columns():
+    """ToiletRead columns of toilet_location, without geom."""
+    return [getattr(ToiletLocation, name) for name in ToiletRead.model_fields]
+
+
+def keyset_page(
+    batch_size: int,
+    after_id: Optional[UUID] = None,
+    country_code: Optional[str] = None,
+    since: Optional[datetime] = None,
+):
+    """Next page of toilets ordered by id, starting after after_id.
+    
+    Selects plain columns rather than ORM entities so rows never pile up in
+    the session identity map.
+    """
+    statement = select(*toilet_read_columns()).order_by(ToiletLocation.id).limit(batch_size)
+    if after_id is not None:
+        statement = statement.where(ToiletLocation.id > after_id)
+    if country_code is not None:
+        statement = statement.where(ToiletLocation.country_code == country_code)
+    if since is not None:
+        statement = statement.where(ToiletLocation.created_at >= since)
+    return statement
+
+
+def row_to_search_result(row) -> ToiletSearchResult:
+    """Map a find_nearest_toilets row to a search result."""
+    toilet_data = {
+        "id": row.id,
+        "name": row.name,
+        "lat": row.lat,
+        "lng": row.lng,
+        "address": row.address,
+        "accessible": row.accessible,
+        "is_free": row.is_free,
+        "type": row.type,
+        "status": row.status,
+        "notes": row.notes,
+        "city": row.city,
+        "open_hours": row.open_hours,
+        "created_at": row.created_at,
+        "distance": row.distance,
+    }
+    return ToiletSearchResult(**toilet_data)
+
+
+def row_to_toilet_read(row) -> ToiletRead:
+    """Map a find_toilets_in_view / get_toilets_deterministic_v3 row to a toilet."""
+    toilet_data = {
+        "id": row.id,
+        "name": row.name,
+        "lat": row.lat,
+        "lng": row.lng,
+        "accessible": row.accessible,
+        "open_hours": row.open_hours,
+        "address": row.address,
+        "created_at": row.created_at,
+    }
+    return ToiletRead(**toilet_data)
+
 
 class ToiletService:
-    """Service class for toilet operations."""
+    """Service class for toilet operations.
+    
+    An optional in-memory spatial index (see ``db.spatial_index``) serves the
+    search methods for the region it covers; other queries go to PostGIS.
+    The map-center country for ``get_toilets_deterministic`` comes from a
+    shared ``CountryResolver`` cache (see ``db.countries``); on a miss the
+    search statement infers it in the same round trip.
+    ``search_version`` selects the v3 (plpgsql) or v4 (inlinable sql) search
+    functions.
+    """
     
-    def __init__(self, session: Session):
+    def __init__(
+        self,
+        session: Session,
+        spatial_index: Optional[Union["ToiletSpatialIndex", "RefreshingSpatialIndex"]] = None,
+        country_resolver: Optional[CountryResolver] = None,
+        search_version: SearchVersion = SearchVersion.V3,
+    ):
         self.session = session
+        self.spatial_index = spatial_index
+        self.country_resolver = country_resolver or default_country_resolver
+        self.search_version = SearchVersion(search_version)
+        self.statements = SEARCH_STATEMENTS[self.search_version]
     
     def create_toilet(self, toilet_data: ToiletCreate) -> ToiletRead:
         """Create a new toilet."""
@@ -38,6 +478,7 @@ class ToiletService:
         self.session.add(toilet)
         self.session.commit()
         self.session.refresh(toilet)
+        self._invalidate([(toilet.lat, toilet.lng)])
         return ToiletRead.model_validate(toilet)
     
     def get_toilet(self, toilet_id: UUID) -> Optional[ToiletRead]:
@@ -50,6 +491,7 @@ class ToiletService:
         toilet = self.session.get(ToiletLocation, toilet_id)
         if not toilet:
             return None
+        old_position = (toilet.lat, toilet.lng)
         
         update_data = toilet_data.model_dump(exclude_unset=True)
         for field, value in update_data.items():
@@ -65,6 +507,7 @@ class ToiletService:
         
         self.session.commit()
         self.session.refresh(toilet)
+        self._invalidate([old_position, (toilet.lat, toilet.lng)])
         return ToiletRead.model_validate(toilet)
     
     def delete_toilet(self, toilet_id: UUID) -> bool:
@@ -73,122 +516,145 @@ class ToiletService:
         if not toilet:
             return False
         
+        old_position = (toilet.lat, toilet.lng)
         self.session.delete(toilet)
         self.session.commit()
+        self._invalidate([old_position])
         return True
     
-    def find_nearest_toilets(self, params: NearestToiletsParams) -> List[ToiletSearchResult]:
-        """Find nearest toilets using the existing SQL function."""
-        result = self.session.execute(
-            text("""
-                SELECT id, name, lat, lng, address, accessible, is_free, type, status, 
-                       notes, city, open_hours, distance, created_at
-                FROM find_nearest_toilets(:user_lat, :user_lng, :radius_meters, :result_limit)
-            """),
-            {
-                "user_lat": params.user_lat,
-                "user_lng": params.user_lng,
-                "radius_meters": params.radius_meters,
-                "result_limit": params.result_limit,
-            }
-        )
+    def find_nearest_toilets(
+        self, params: NearestToiletsParams, mode: ResultMode = ResultMode.MODEL
+    ) -> List[ToiletSearchResult]:
+        """Find nearest toilets using the existing SQL function.
         
-        toilets = []
-        for row in result:
-            toilet_data = {
-                "id": row.id,
-                "name": row.name,
-                "lat": row.lat,
-                "lng": row.lng,
-                "address": row.address,
-                "accessible": row.accessible,
-                "is_free": row.is_free,
-                "type": row.type,
-                "status": row.status,
-                "notes": row.notes,
-                "city": row.city,
-                "open_hours": row.open_hours,
-                "created_at": row.created_at,
-                "distance": row.distance,
-            }
-            toilets.append(ToiletSearchResult(**toilet_data))
-        
-        return toilets
-    
-    def find_toilets_in_view(self, params: ToiletsInViewParams) -> List[ToiletRead]:
-        """Find toilets in view using the existing SQL function."""
+        ``mode`` selects lean records, a NumPy array or JSON bytes instead of
+        models (see ``db.results``).
+        """
+        if self.spatial_index is not None and self.spatial_index.covers_nearest(params):
+            return models_to_mode(self.spatial_index.find_nearest_toilets(params), ToiletSearchRecord, mode)
+        result = self.session.execute(self.statements.nearest, nearest_toilets_bind(params))
+        return map_search_rows(result, mode)
+    
+    def find_nearest_toilets_batch(
+        self,
+        points: Sequence[Tuple[float, float]],
+        radius_meters: float = 20000,
+        result_limit: int = 3,
+    ) -> List[List[ToiletSearchResult]]:
+        """Find nearest toilets for many (lat, lng) points in one statement.
+        
+        Returns one result list per input point, in input order.
+        """
+        if not points:
+            return []
         result = self.session.execute(
-            text("""
-                SELECT id, name, lat, lng, accessible, open_hours, address, created_at
-                FROM find_toilets_in_view(:min_lat, :min_lng, :max_lat, :max_lng, :max_results)
-            """),
-            {
-                "min_lat": params.min_lat,
-                "min_lng": params.min_lng,
-                "max_lat": params.max_lat,
-                "max_lng": params.max_lng,
-                "max_results": params.max_results,
-            }
+            FIND_NEAREST_TOILETS_BATCH_SQL,
+            nearest_toilets_batch_bind(points, radius_meters, result_limit),
         )
-        
-        toilets = []
-        for row in result:
-            toilet_data = {
-                "id": row.id,
-                "name": row.name,
-                "lat": row.lat,
-                "lng": row.lng,
-                "accessible": row.accessible,
-                "open_hours": row.open_hours,
-                "address": row.address,
-                "created_at": row.created_at,
-            }
-            toilets.append(ToiletRead(**toilet_data))
-        
-        return toilets
-    
-    def get_toilets_deterministic(self, params: ToiletsDeterministicParams) -> List[ToiletRead]:
+        return group_batch_results(result, len(points))
+    
+    def find_toilets_in_view(
+        self, params: ToiletsInViewParams, mode: ResultMode = ResultMode.MODEL
+    ) -> List[ToiletRead]:
+        """Find toilets in view using the existing SQL function."""
+        if self.spatial_index is not None and self.spatial_index.covers_in_view(params):
+            return models_to_mode(self.spatial_index.find_toilets_in_view(params), ToiletRecord, mode)
+        result = self.session.execute(self.statements.in_view, toilets_in_view_bind(params))
+        return map_toilet_rows(result, mode)
+    
+    def find_toilets_along_route(self, params: ToiletsAlongRouteParams) -> List[ToiletRouteResult]:
+        """Toilets within corridor_meters of a route, in the order they are reached."""
+        result = self.session.execute(FIND_TOILETS_ALONG_ROUTE_SQL, toilets_along_route_bind(params))
+        return [ToiletRouteResult.model_validate(row, from_attributes=True) for row in result]
+    
+    def infer_country_code(self, lat: float, lng: float) -> str:
+        """Country containing a point (cached per quantized cell inside one country)."""
+        return self.country_resolver.resolve(self.session, lat, lng)
+    
+    def get_toilets_deterministic(
+        self, params: ToiletsDeterministicParams, mode: ResultMode = ResultMode.MODEL
+    ) -> List[ToiletRead]:
         """Get toilets using deterministic method."""
+        check_map_center(params)
+        country_code = self.country_resolver.cached(params.center_lat, params.center_lng)
+        if country_code is None:
+            _, records = self._deterministic_records(params, params.center_lat, params.center_lng)
+            return map_toilet_rows(records, mode)
+        return self._toilets_in_country(params, country_code, mode)
+    
+    def _deterministic_records(
+        self, params: ToiletsDeterministicParams, country_lat: float, country_lng: float
+    ) -> Tuple[str, List[ToiletRecord]]:
+        """Country at (country_lat, country_lng), not cached, and the toilets of params in it."""
+        if self.spatial_index is not None and self.spatial_index.covers_deterministic(params):
+            country_code = self.country_resolver.fetch(self.session, country_lat, country_lng)
+            return country_code, self._toilets_in_country(params, country_code, ResultMode.RECORD)
+        # One round trip: the country is inferred by the search statement
+        rows = self.session.execute(
+            self.statements.in_inferred_country,
+            toilets_in_inferred_country_bind(params, country_lat, country_lng, self.country_resolver),
+        ).all()
+        return inferred_country_records(rows, self.country_resolver, country_lat, country_lng)
+    
+    def _toilets_in_country(
+        self, params: ToiletsDeterministicParams, country_code: str, mode: ResultMode
+    ) -> List[ToiletRead]:
+        if self.spatial_index is not None and self.spatial_index.covers_deterministic(params):
+            toilets = self.spatial_index.get_toilets_deterministic(params, country_code)
+            return models_to_mode(toilets, ToiletRecord, mode)
         result = self.session.execute(
-            text("""
-                SELECT id, name, lat, lng, accessible, open_hours, address, created_at
-                FROM get_toilets_deterministic_v3(
-                    :center_lat, :center_lng, :user_lat, :user_lng, 
-                    :is_zoomed_in, :result_limit
-                )
-            """),
-            {
-                "center_lat": params.center_lat,
-                "center_lng": params.center_lng,
-                "user_lat": params.user_lat,
-                "user_lng": params.user_lng,
-                "is_zoomed_in": params.is_zoomed_in,
-                "result_limit": params.result_limit,
-            }
+            self.statements.in_country, toilets_in_country_bind(params, country_code)
         )
+        return map_toilet_rows(result, mode)
+    
+    def get_toilet_clusters(self, params: ToiletClustersParams) -> List[ToiletCluster]:
+        """Get precomputed toilet clusters in view for a zoomed-out map (as of the last db.clusters fold)."""
+        result = self.session.execute(GET_TOILET_CLUSTERS_SQL, toilet_clusters_bind(params))
+        return [ToiletCluster.model_validate(row, from_attributes=True) for row in result]
+    
+    def get_density(self, params: ToiletDensityParams) -> List[ToiletDensityCell]:
+        """Toilet counts per quadkey cell in a bounding box (index-only aggregate)."""
+        result = self.session.execute(GET_TOILET_DENSITY_SQL, toilet_density_bind(params))
+        return map_density_rows(result, params)
+    
+    def get_changes(self, since_token: Optional[str] = None, limit: int = 1000) -> ToiletChanges:
+        """Inserts, updates and deletes after since_token (None: from the start).
         
-        toilets = []
-        for row in result:
-            toilet_data = {
-                "id": row.id,
-                "name": row.name,
-                "lat": row.lat,
-                "lng": row.lng,
-                "accessible": row.accessible,
-                "open_hours": row.open_hours,
-                "address": row.address,
-                "created_at": row.created_at,
-            }
-            toilets.append(ToiletRead(**toilet_data))
-        
-        return toilets
+        Pass ``next_token`` back to continue; only changes of finished
+        transactions are returned, so a token never skips a late commit.
+        """
+        result = self.session.execute(GET_CHANGES_SQL, {"since_token": since_token, "result_limit": limit})
+        return map_change_rows(result, since_token, limit)
     
     def get_all_toilets(self, limit: int = 1000, offset: int = 0) -> List[ToiletRead]:
-        """Get all toilets with pagination."""
+        """Get all toilets with pagination (use iter_toilets for full scans)."""
         statement = select(ToiletLocation).offset(offset).limit(limit)
         toilets = self.session.exec(statement).all()
         return [ToiletRead.model_validate(toilet) for toilet in toilets]
     
+    def iter_toilets(
+        self,
+        batch_size: int = 5000,
+        country_code: Optional[str] = None,
+        since: Optional[datetime] = None,
+    ) -> Iterator[ToiletRead]:
+        """Stream every toilet in id order in constant memory.
+        
+        Uses keyset pagination on id (each page is an index range scan,
+        unlike OFFSET) and a server-side cursor within each page.
+        """
+        after_id = None
+        while True:
+            statement = keyset_page(batch_size, after_id, country_code, since)
+            result = self.session.execute(statement.execution_options(yield_per=min(batch_size, 1000)))
+            count = 0
+            for row in result:
+                count += 1
+                after_id = row.id
+                yield ToiletRead.model_validate(row, from_attributes=True)
+            if count < batch_size:
+                return
+    
     def get_toilets_by_country(self, country_code: str, limit: int = 1000) -> List[ToiletRead]:
         """Get toilets by country code."""
         statement = select(ToiletLocation).where(ToiletLocation.country_code == country_code).limit(limit)
@@ -202,17 +668,477 @@ class ToiletService:
             toilet = ToiletLocation.model_validate(toilet_data)
             toilets.append(toilet)
         
+        # geom is set from lat/lng by the insert trigger; use db.data_import
+        # (COPY) for large imports
         self.session.add_all(toilets)
         self.session.commit()
+        self._invalidate([(toilet.lat, toilet.lng) for toilet in toilets])
+        
+        return [ToiletRead.model_validate(toilet) for toilet in toilets] 
+    
+    def _invalidate(self, positions: Iterable[Tuple[Optional[float], Optional[float]]]) -> None:
+        """Drop the shared cached answers and tiles around written positions."""
+        positions = list(positions)
+        if self.spatial_index is not None:
+            self.spatial_index.mark_written(positions)
+        invalidate_cached_points(positions)
+
+
+
+# Cached in place of a truncated over-fetch: the snapped bbox holds too many
+# toilets to answer its views from one sample
+TOO_DENSE = "too dense"
+
+
+class CachedToiletService(ToiletService):
+    """ToiletService with a quantized result cache for map queries.
+    
+    Map centers differ by a few meters while panning, so queries are keyed
+    on a quantized center/bbox, a zoom bucket and the limit. Deterministic
+    queries run against the quantized center so every caller sharing a key
+    gets the same answer; viewport queries cache the snapped bbox and are
+    filtered back to the requested view (views of bboxes too dense for
+    that are cached per exact view). Nearest-toilet searches are not
+    cached: their distances and order are relative to the user's exact
+    position. Writes made through this service invalidate the cached
+    answers (and tiles) around the written points; the TTL bounds staleness
+    for writes made elsewhere.
+    """
+    
+    def __init__(
+        self,
+        session: Session,
+        cache: Optional[QueryCache] = None,
+        tile_cache: Optional["TileCache"] = None,
+        center_quantum: float = 0.0005,
+        view_overfetch: int = 2,
+        **kwargs,
+    ):
+        super().__init__(session, **kwargs)
+        self.cache = cache if cache is not None else default_query_cache
+        self.tile_cache = tile_cache if tile_cache is not None else default_tile_cache
+        self.center_quantum = center_quantum
+        self.view_overfetch = view_overfetch
+    
+    def find_toilets_in_view(
+        self, params: ToiletsInViewParams, mode: ResultMode = ResultMode.MODEL
+    ) -> List[ToiletRead]:
+        """Find toilets in view, cached per bbox snapped outwards to a zoom-sized grid."""
+        span = max(params.max_lat - params.min_lat, params.max_lng - params.min_lng, 1e-6)
+        # Zoom bucket: grid step is a power of two, ~1/8 of the viewport span
+        step = 2.0 ** math.floor(math.log2(span / 8))
+        snapped = {
+            "min_lat": math.floor(params.min_lat / step) * step,
+            "min_lng": math.floor(params.min_lng / step) * step,
+            "max_lat": math.ceil(params.max_lat / step) * step,
+            "max_lng": math.ceil(params.max_lng / step) * step,
+        }
+        # Open-at results depend only on the local minute of the week
+        open_minute = minute_of_week(params.open_at) if params.open_at else None
+        key = ("view", step, *snapped.values(), params.max_results, open_minute)
+        records = self.cache.get(key)
+        if records is None:
+            # The snapped bbox is larger than the view: over-fetch, and keep
+            # the answer only if it holds every toilet of the snapped bbox
+            fetch_limit = params.max_results * self.view_overfetch
+            records = super().find_toilets_in_view(
+                params.model_copy(update={**snapped, "max_results": fetch_limit}), ResultMode.RECORD
+            )
+            if len(records) >= fetch_limit:
+                records = TOO_DENSE
+            bbox = (snapped["min_lat"], snapped["min_lng"], snapped["max_lat"], snapped["max_lng"])
+            self.cache.put(key, records, bbox)
+        if records is TOO_DENSE:
+            # A truncated sample of the snapped bbox may miss toilets in view:
+            # dense views are cached exactly, per requested bbox
+            return self._find_exact_view(params, open_minute, mode)
+        in_view = [
+            record for record in records
+            if params.min_lat <= record.lat <= params.max_lat and params.min_lng <= record.lng <= params.max_lng
+        ]
+        return records_to_mode(in_view[:max(params.max_results, 0)], ToiletRecord, mode)
+    
+    def _find_exact_view(self, params: ToiletsInViewParams, open_minute: Optional[int], mode: ResultMode):
+        bbox = (params.min_lat, params.min_lng, params.max_lat, params.max_lng)
+        key = ("view_exact", *bbox, params.max_results, open_minute)
+        records = self.cache.get(key)
+        if records is None:
+            records = super().find_toilets_in_view(params, ResultMode.RECORD)
+            self.cache.put(key, records, bbox)
+        return records_to_mode(records, ToiletRecord, mode)
+    
+    def get_toilets_deterministic(
+        self, params: ToiletsDeterministicParams, mode: ResultMode = ResultMode.MODEL
+    ) -> List[ToiletRead]:
+        """Get toilets deterministically, cached per quantized map center and zoom bucket."""
+        check_map_center(params)
+        lat = quantize(params.center_lat, self.center_quantum)
+        lng = quantize(params.center_lng, self.center_quantum)
+        quantized = params.model_copy(update={"center_lat": lat, "center_lng": lng})
+        # The country comes from the real center: a quantized one may cross a border
+        country_code = self.country_resolver.cached(params.center_lat, params.center_lng)
+        records = None
+        if country_code is not None:
+            records = self.cache.get(
+                ("deterministic", lat, lng, country_code, params.is_zoomed_in, params.result_limit)
+            )
+        if records is None:
+            if country_code is None:
+                country_code, records = self._deterministic_records(quantized, params.center_lat, params.center_lng)
+            else:
+                records = self._toilets_in_country(quantized, country_code, ResultMode.RECORD)
+            key = ("deterministic", lat, lng, country_code, params.is_zoomed_in, params.result_limit)
+            bbox = None
+            if params.is_zoomed_in and records and len(records) >= params.result_limit:
+                # A write can only change a full KNN answer inside its radius
+                reach = max(math.hypot(r.lat - lat, r.lng - lng) for r in records)
+                bbox = (lat - reach, lng - reach, lat + reach, lng + reach)
+            self.cache.put(key, records, bbox)
+        return records_to_mode(records, ToiletRecord, mode)
+    
+    def _invalidate(self, positions: Iterable[Tuple[Optional[float], Optional[float]]]) -> None:
+        positions = list(positions)
+        if self.spatial_index is not None:
+            self.spatial_index.mark_written(positions)
+        invalidate_cached_points(positions, self.cache, self.tile_cache)
+
+
+class AsyncToiletService:
+    """Async service class for toilet operations (asyncpg)."""
+    
+    def __init__(
+        self,
+        session: AsyncSession,
+        country_resolver: Optional[CountryResolver] = None,
+        search_version: SearchVersion = SearchVersion.V3,
+    ):
+        self.session = session
+        self.country_resolver = country_resolver or default_country_resolver
+        self.search_version = SearchVersion(search_version)
+        self.statements = SEARCH_STATEMENTS[self.search_version]
+    
+    async def create_toilet(self, toilet_data: ToiletCreate) -> ToiletRead:
+        """Create a new toilet."""
+        # geom is set from lat/lng by the trigger_update_toilet_location_geom trigger
+        toilet = ToiletLocation.model_validate(toilet_data)
+        self.session.add(toilet)
+        await self.session.commit()
+        await self.session.refresh(toilet)
+        invalidate_cached_points([(toilet.lat, toilet.lng)])
+        return ToiletRead.model_validate(toilet)
+    
+    async def get_toilet(self, toilet_id: UUID) -> Optional[ToiletRead]:
+        """Get a toilet by ID."""
+        toilet = await self.session.get(ToiletLocation, toilet_id)
+        return ToiletRead.model_validate(toilet) if toilet else None
+    
+    async def update_toilet(self, toilet_id: UUID, toilet_data: ToiletUpdate) -> Optional[ToiletRead]:
+        """Update a toilet."""
+        toilet = await self.session.get(ToiletLocation, toilet_id)
+        if not toilet:
+            return None
+        old_position = (toilet.lat, toilet.lng)
         
-        # Update geometry for all toilets that have lat/lng
-        self.session.execute(
-            text("""
-                UPDATE toilet_location 
-                SET geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326) 
-                WHERE lng IS NOT NULL AND lat IS NOT NULL AND geom IS NULL
-            """)
+        update_data = toilet_data.model_dump(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(toilet, field, value)
+        
+        await self.session.commit()
+        await self.session.refresh(toilet)
+        invalidate_cached_points([old_position, (toilet.lat, toilet.lng)])
+        return ToiletRead.model_validate(toilet)
+    
+    async def delete_toilet(self, toilet_id: UUID) -> bool:
+        """Delete a toilet."""
+        toilet = await self.session.get(ToiletLocation, toilet_id)
+        if not toilet:
+            return False
+        
+        old_position = (toilet.lat, toilet.lng)
+        await self.session.delete(toilet)
+        await self.session.commit()
+        invalidate_cached_points([old_position])
+        return True
+    
+    async def find_nearest_toilets(
+        self, params: NearestToiletsParams, mode: ResultMode = ResultMode.MODEL
+    ) -> List[ToiletSearchResult]:
+        """Find nearest toilets using the existing SQL function."""
+        result = await self.session.execute(self.statements.nearest, nearest_toilets_bind(params))
+        return map_search_rows(result, mode)
+    
+    async def find_nearest_toilets_batch(
+        self,
+        points: Sequence[Tuple[float, float]],
+        radius_meters: float = 20000,
+        result_limit: int = 3,
+    ) -> List[List[ToiletSearchResult]]:
+        """Find nearest toilets for many (lat, lng) points in one statement."""
+        if not points:
+            return []
+        result = await self.session.execute(
+            FIND_NEAREST_TOILETS_BATCH_SQL,
+            nearest_toilets_batch_bind(points, radius_meters, result_limit),
         )
-        self.session.commit()
+        return group_batch_results(result, len(points))
+    
+    async def find_toilets_in_view(
+        self, params: ToiletsInViewParams, mode: ResultMode = ResultMode.MODEL
+    ) -> List[ToiletRead]:
+        """Find toilets in view using the existing SQL function."""
+        result = await self.session.execute(self.statements.in_view, toilets_in_view_bind(params))
+        return map_toilet_rows(result, mode)
+    
+    async def find_toilets_along_route(self, params: ToiletsAlongRouteParams) -> List[ToiletRouteResult]:
+        """Toilets within corridor_meters of a route, in the order they are reached."""
+        result = await self.session.execute(FIND_TOILETS_ALONG_ROUTE_SQL, toilets_along_route_bind(params))
+        return [ToiletRouteResult.model_validate(row, from_attributes=True) for row in result]
+    
+    async def infer_country_code(self, lat: float, lng: float) -> str:
+        """Country containing a point (cached per quantized cell inside one country)."""
+        return await self.country_resolver.resolve_async(self.session, lat, lng)
+    
+    async def get_toilets_deterministic(
+        self, params: ToiletsDeterministicParams, mode: ResultMode = ResultMode.MODEL
+    ) -> List[ToiletRead]:
+        """Get toilets using deterministic method."""
+        check_map_center(params)
+        country_code = self.country_resolver.cached(params.center_lat, params.center_lng)
+        if country_code is None:
+            # One round trip: the country is inferred by the search statement
+            result = await self.session.execute(
+                self.statements.in_inferred_country,
+                toilets_in_inferred_country_bind(params, params.center_lat, params.center_lng, self.country_resolver),
+            )
+            _, records = inferred_country_records(
+                result.all(), self.country_resolver, params.center_lat, params.center_lng
+            )
+            return map_toilet_rows(records, mode)
+        result = await self.session.execute(
+            self.statements.in_country, toilets_in_country_bind(params, country_code)
+        )
+        return map_toilet_rows(result, mode)
+    
+    async def get_toilet_clusters(self, params: ToiletClustersParams) -> List[ToiletCluster]:
+        """Get precomputed toilet clusters in view for a zoomed-out map (as of the last db.clusters fold)."""
+        result = await self.session.execute(GET_TOILET_CLUSTERS_SQL, toilet_clusters_bind(params))
+        return [ToiletCluster.model_validate(row, from_attributes=True) for row in result]
+    
+    async def get_density(self, params: ToiletDensityParams) -> List[ToiletDensityCell]:
+        """Toilet counts per quadkey cell in a bounding box (index-only aggregate)."""
+        result = await self.session.execute(GET_TOILET_DENSITY_SQL, toilet_density_bind(params))
+        return map_density_rows(result, params)
+    
+    async def get_changes(self, since_token: Optional[str] = None, limit: int = 1000) -> ToiletChanges:
+        """Inserts, updates and deletes after since_token (None: from the start)."""
+        result = await self.session.execute(GET_CHANGES_SQL, {"since_token": since_token, "result_limit": limit})
+        return map_change_rows(result, since_token, limit)
+    
+    async def get_all_toilets(self, limit: int = 1000, offset: int = 0) -> List[ToiletRead]:
+        """Get all toilets with pagination (use iter_toilets for full scans)."""
+        statement = select(ToiletLocation).offset(offset).limit(limit)
+        toilets = (await self.session.exec(statement)).all()
+        return [ToiletRead.model_validate(toilet) for toilet in toilets]
+    
+    async def iter_toilets(
+        self,
+        batch_size: int = 5000,
+        country_code: Optional[str] = None,
+        since: Optional[datetime] = None,
+    ) -> AsyncIterator[ToiletRead]:
+        """Stream every toilet in id order in constant memory (keyset pagination)."""
+        after_id = None
+        while True:
+            statement = keyset_page(batch_size, after_id, country_code, since)
+            result = await self.session.stream(statement.execution_options(yield_per=min(batch_size, 1000)))
+            count = 0
+            async for row in result:
+                count += 1
+                after_id = row.id
+                yield ToiletRead.model_validate(row, from_attributes=True)
+            if count < batch_size:
+                return
+    
+    async def get_toilets_by_country(self, country_code: str, limit: int = 1000) -> List[ToiletRead]:
+        """Get toilets by country code."""
+        statement = select(ToiletLocation).where(ToiletLocation.country_code == country_code).limit(limit)
+        toilets = (await self.session.exec(statement)).all()
+        return [ToiletRead.model_validate(toilet) for toilet in toilets]
+    
+    async def bulk_create_toilets(self, toilets_data: List[ToiletCreate]) -> List[ToiletRead]:
+        """Bulk create toilets for data import."""
+        # geom is set from lat/lng by the insert trigger
+        toilets = [ToiletLocation.model_validate(toilet_data) for toilet_data in toilets_data]
+        self.session.add_all(toilets)
+        await self.session.commit()
+        invalidate_cached_points([(toilet.lat, toilet.lng) for toilet in toilets])
+        return [ToiletRead.model_validate(toilet) for toilet in toilets]
+
+
+GET_TOILET_TILE_SQL = text("SELECT get_toilet_tile(:z, :x, :y, :max_features) AS tile")
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+
+class ToiletTile(NamedTuple):
+    """An encoded Mapbox Vector Tile and its ETag."""
+    z: int
+    x: int
+    y: int
+    data: bytes
+    etag: str
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header value matches this tile (-> 304)."""
+        if not if_none_match:
+            return False
+        candidates = [value.strip() for value in if_none_match.split(",")]
+        return "*" in candidates or self.etag in candidates or f"W/{self.etag}" in candidates
+
+
+def tile_etag(data: bytes) -> str:
+    """Strong ETag for tile bytes."""
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def tiles_containing(lat: float, lng: float, z: int) -> List[Tuple[int, int]]:
+    """Web-mercator tiles at zoom z whose buffered extent contains a point."""
+    n = 1 << z
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    fx = (lng + 180.0) / 360.0 * n
+    fy = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    margin = TILE_BUFFER / TILE_EXTENT
+    xs = {min(max(int(fx + d), 0), n - 1) for d in (-margin, 0.0, margin)}
+    ys = {min(max(int(fy + d), 0), n - 1) for d in (-margin, 0.0, margin)}
+    return [(x, y) for x in xs for y in ys]
+
+
+class TileCache:
+    """Thread-safe LRU + TTL cache of encoded tiles bounded by total bytes.
+    
+    Shared across requests (services are created per session), so the
+    module-level ``default_tile_cache`` is used unless one is passed in.
+    Writes through the services invalidate it (see invalidate_cached_points);
+    the TTL bounds staleness for writes made by other processes.
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires_at, tile)
+        self._tiles: "OrderedDict[Tuple[int, int, int], Tuple[float, ToiletTile]]" = OrderedDict()
+        self._zooms: Dict[int, int] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple[int, int, int]) -> Optional[ToiletTile]:
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, tile: ToiletTile) -> None:
+        size = len(tile.data)
+        if size > self.max_bytes:
+            return
+        key = (tile.z, tile.x, tile.y)
+        with self._lock:
+            if key in self._tiles:
+                self._remove(key)
+            self._tiles[key] = (time.monotonic() + self.ttl_seconds, tile)
+            self._zooms[tile.z] = self._zooms.get(tile.z, 0) + 1
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._tiles)))
+    
+    def _remove(self, key: Tuple[int, int, int]) -> None:
+        _, tile = self._tiles.pop(key)
+        self.current_bytes -= len(tile.data)
+        self._zooms[tile.z] -= 1
+        if not self._zooms[tile.z]:
+            del self._zooms[tile.z]
+    
+    def invalidate_point(self, lat: float, lng: float) -> int:
+        """Drop every cached tile that contains the point; returns the count."""
+        removed = 0
+        with self._lock:
+            for z in list(self._zooms):
+                for x, y in tiles_containing(lat, lng, z):
+                    if (z, x, y) in self._tiles:
+                        self._remove((z, x, y))
+                        removed += 1
+        return removed
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+            self._zooms.clear()
+            self.current_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+
+default_tile_cache = TileCache()
+
+
+def invalidate_cached_points(
+    positions: Optional[Iterable[Tuple[Optional[float], Optional[float]]]] = None,
+    cache: Optional[QueryCache] = None,
+    tile_cache: Optional[TileCache] = None,
+) -> None:
+    """Drop cached answers and tiles a write at these (lat, lng) positions may affect.
+    
+    ``None`` clears both caches; the shared default caches are used unless
+    others are passed in. Only this process's caches are touched: writes
+    made by other processes (db-import, db-osm-sync, db-dedup, db-backfill)
+    show up once the cached entries expire.
+    """
+    cache = cache if cache is not None else default_query_cache
+    tile_cache = tile_cache if tile_cache is not None else default_tile_cache
+    unique = None if positions is None else set(positions)
+    if unique is None or len(unique) > cache.max_cells_per_entry:
+        # Cheaper to start over than to walk every cell of a large import
+        cache.clear()
+        tile_cache.clear()
+        return
+    for lat, lng in unique:
+        cache.invalidate_point(lat, lng)
+        if lat is not None and lng is not None:
+            tile_cache.invalidate_point(lat, lng)
+
+
+class ToiletTileService:
+    """Serves toilet_location as Mapbox Vector Tiles (layer "toilets")."""
+    
+    def __init__(self, session: Session, cache: Optional[TileCache] = None, max_features: int = 4096):
+        self.session = session
+        self.cache = cache if cache is not None else default_tile_cache
+        self.max_features = max_features
+    
+    def get_tile(self, z: int, x: int, y: int) -> ToiletTile:
+        """Get an encoded tile, from the cache when possible."""
+        key = (z, x, y)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
         
-        return [ToiletRead.model_validate(toilet) for toilet in toilets] 
\ No newline at end of file
+        data = self.session.execute(
+            GET_TOILET_TILE_SQL,
+            {"z": z, "x": x, "y": y, "max_features": self.max_features},
+        ).scalar_one()
+        data = bytes(data or b"")
+        tile = ToiletTile(z, x, y, data, tile_etag(data))
+        self.cache.put(tile)
+        return tile
@@ -0,0 +1,415 @@
+"""Columnar per-country snapshot files of toilet_location.
+
+A snapshot holds one country's toilets in a single file laid out for
+memory mapping: a small JSON header followed by 64-byte aligned column
+blocks that the reader wraps with ``np.frombuffer`` without copying.
+
+* coordinates: float32 (default, ~0.5 m at European latitudes) or float64;
+* rows sorted by ``quadkey`` (db.cells), so a bbox is a few contiguous key
+  ranges found by binary search, and KNN grows a bbox around the point;
+* strings: dictionary-encoded, the smallest unsigned code type that fits,
+  code 0 is NULL;
+* booleans: bitpacked value and validity bitmaps;
+* integers and timestamps (microseconds since the epoch): NULL is the
+  minimum value of the column type.
+
+Needs the ``index`` extra (NumPy).
+
+Usage:
+    db-snapshot export --output snapshots/            # one file per country
+    db-snapshot export --country CH --coords float64 --output snapshots/
+    db-snapshot query snapshots/toilets_CH.trsnap --near 46.948 7.447 --k 5
+    db-snapshot query snapshots/toilets_CH.trsnap --bbox 46.9 7.4 47.0 7.5
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from .cache import radius_bbox
+from .cells import cell_bounds, key_ranges, quadkey
+from .models import CountryCode, ToiletSearchResult
+from .spatial_index import haversine_meters
+
+MAGIC = b"TRSNAP01"
+ALIGN = 64
+SUFFIX = ".trsnap"
+
+# Resolution of the key ranges covering a bbox (tiles of ~600 m at level 16)
+BBOX_LEVEL = 16
+# KNN starts with this radius and widens it 4x until k toilets are inside
+KNN_START_METERS = 1000.0
+KNN_MAX_METERS = 20_037_509.0
+
+STRING_COLUMNS = ("name", "address", "open_hours", "type", "status", "notes", "city")
+BOOL_COLUMNS = ("accessible", "is_free")
+INT_COLUMNS = {"rating": "<i4", "osm_id": "<i8", "osm_version": "<i4", "created_at": "<i8"}
+
+_EXPORT_SQL = f"""
+    SELECT id::text, lat, lng, quadkey,
+           {', '.join(STRING_COLUMNS)}, {', '.join(BOOL_COLUMNS)},
+           rating, osm_id, osm_version, created_at
+    FROM toilet_location
+    WHERE country_code = %s AND lat IS NOT NULL AND lng IS NOT NULL
+    ORDER BY quadkey, id
+"""
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class SnapshotStats:
+    """Result of writing a snapshot."""
+    path: Path
+    rows: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+def snapshot_path(directory: Path, country_code: str) -> Path:
+    return Path(directory) / f"toilets_{country_code}{SUFFIX}"
+
+
+def _null_value(dtype: str) -> int:
+    return int(np.iinfo(np.dtype(dtype)).min)
+
+
+def _to_micros(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _code_dtype(size: int) -> str:
+    for dtype in ("<u1", "<u2", "<u4"):
+        if size <= np.iinfo(np.dtype(dtype)).max:
+            return dtype
+    raise ValueError(f"Too many distinct strings: {size}")
+
+
+class _Blocks:
+    """Aligned column blocks of the data section."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.size = 0
+
+    def add(self, array: np.ndarray) -> dict:
+        padding = -self.size % ALIGN
+        if padding:
+            self.parts.append(b"\0" * padding)
+            self.size += padding
+        array = np.ascontiguousarray(array)
+        block = {"dtype": array.dtype.str, "offset": self.size, "count": int(array.size)}
+        self.parts.append(array.tobytes())
+        self.size += array.nbytes
+        return block
+
+
+def _dictionary(blocks: _Blocks, values: Sequence[Optional[str]]) -> dict:
+    """Dictionary-encode strings; code 0 is NULL, entries start at 1."""
+    entries = sorted({value for value in values if value is not None})
+    codes_by_value = {value: code for code, value in enumerate(entries, start=1)}
+    encoded = [value.encode("utf-8") for value in entries]
+    offsets = np.zeros(len(encoded) + 2, dtype="<u8")
+    np.cumsum([len(data) for data in encoded], out=offsets[2:])
+    codes = np.fromiter(
+        (0 if value is None else codes_by_value[value] for value in values),
+        dtype=_code_dtype(len(entries)), count=len(values),
+    )
+    return {
+        "kind": "dict",
+        "codes": blocks.add(codes),
+        "offsets": blocks.add(offsets),
+        "data": blocks.add(np.frombuffer(b"".join(encoded), dtype="u1")),
+    }
+
+
+def _bitmap(blocks: _Blocks, values: Sequence[Optional[bool]]) -> dict:
+    valid = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+    truth = np.fromiter((bool(value) for value in values), dtype=bool, count=len(values))
+    return {
+        "kind": "bool",
+        "valid": blocks.add(np.packbits(valid, bitorder="little")),
+        "values": blocks.add(np.packbits(truth, bitorder="little")),
+    }
+
+
+def write_snapshot(rows: Sequence, path: Path, country_code: str, coords: str = "float32") -> SnapshotStats:
+    """Write rows (as selected by _EXPORT_SQL, in quadkey order) to a snapshot file."""
+    started = time.perf_counter()
+    path = Path(path)
+    n = len(rows)
+    columns = list(zip(*rows)) if rows else [()] * (4 + len(STRING_COLUMNS) + len(BOOL_COLUMNS) + len(INT_COLUMNS))
+    ids, lats, lngs, keys = columns[:4]
+    position = 4
+
+    blocks = _Blocks()
+    coord_dtype = np.dtype(coords).newbyteorder("<")
+    lat_array = np.array(lats, dtype=coord_dtype)
+    lng_array = np.array(lngs, dtype=coord_dtype)
+    key_array = np.fromiter(
+        (key if key is not None else quadkey(lat, lng) for key, lat, lng in zip(keys, lats, lngs)),
+        dtype="<u8", count=n,
+    )
+    # Rows without a stored key were keyed here; keep the file sorted either way
+    order = np.argsort(key_array, kind="stable")
+    if not np.array_equal(order, np.arange(n)):
+        columns = [[column[i] for i in order] for column in columns]
+        ids = columns[0]
+        lat_array, lng_array, key_array = lat_array[order], lng_array[order], key_array[order]
+
+    header_columns: Dict[str, dict] = {
+        "id": {"kind": "uuid", **blocks.add(np.frombuffer(b"".join(UUID(i).bytes for i in ids), dtype="u1"))},
+        "lat": {"kind": "array", **blocks.add(lat_array)},
+        "lng": {"kind": "array", **blocks.add(lng_array)},
+        "quadkey": {"kind": "array", **blocks.add(key_array)},
+    }
+    for name in STRING_COLUMNS:
+        header_columns[name] = _dictionary(blocks, columns[position])
+        position += 1
+    for name in BOOL_COLUMNS:
+        header_columns[name] = _bitmap(blocks, columns[position])
+        position += 1
+    for name, dtype in INT_COLUMNS.items():
+        null = _null_value(dtype)
+        values = columns[position] if name != "created_at" else [_to_micros(v) for v in columns[position]]
+        array = np.fromiter((null if v is None else v for v in values), dtype=dtype, count=n)
+        header_columns[name] = {"kind": "array", "null": null, **blocks.add(array)}
+        position += 1
+
+    header = json.dumps({
+        "version": 1,
+        "country_code": country_code,
+        "rows": n,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "sort": "quadkey",
+        "bbox": [
+            float(lat_array.min()), float(lng_array.min()), float(lat_array.max()), float(lng_array.max())
+        ] if n else None,
+        "columns": header_columns,
+    }).encode("utf-8")
+
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    with open(partial, "wb") as f:
+        f.write(prefix + b"\0" * (-len(prefix) % ALIGN))
+        for part in blocks.parts:
+            f.write(part)
+    os.replace(partial, path)
+    return SnapshotStats(path=path, rows=n, bytes=path.stat().st_size, seconds=time.perf_counter() - started)
+
+
+def export_country(dbapi_connection, country_code: str, path: Path, coords: str = "float32") -> SnapshotStats:
+    """Snapshot one country's toilets from the database."""
+    with dbapi_connection.cursor(name=f"snapshot_{country_code}") as cursor:
+        cursor.itersize = 50_000
+        cursor.execute(_EXPORT_SQL, (country_code,))
+        rows = cursor.fetchall()
+    return write_snapshot(rows, path, country_code, coords)
+
+
+class ToiletSnapshot:
+    """Memory-mapped, read-only view of a snapshot file.
+
+    Column arrays are zero-copy views of the mapping; strings and booleans
+    are decoded only for the rows a query returns.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a toilet snapshot")
+        (header_size,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[start:start + header_size])
+        self._data_offset = start + header_size + (-(start + header_size) % ALIGN)
+
+        self.country_code: str = self.header["country_code"]
+        self.columns: Dict[str, dict] = self.header["columns"]
+        self.ids = self._block(self.columns["id"]).reshape(-1, 16)
+        self.lats = self._block(self.columns["lat"])
+        self.lngs = self._block(self.columns["lng"])
+        self.quadkeys = self._block(self.columns["quadkey"])
+
+    def __len__(self) -> int:
+        return self.header["rows"]
+
+    def __enter__(self) -> "ToiletSnapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the file; arrays taken from this snapshot must be released first."""
+        self.ids = self.lats = self.lngs = self.quadkeys = None
+        self._mmap.close()
+
+    def _block(self, block: dict) -> np.ndarray:
+        return np.frombuffer(self._mmap, dtype=block["dtype"], count=block["count"],
+                             offset=self._data_offset + block["offset"])
+
+    # -------------------------------------------------------------- columns
+
+    def strings(self, column: str, positions: np.ndarray) -> List[Optional[str]]:
+        spec = self.columns[column]
+        codes = self._block(spec["codes"])[positions]
+        offsets = self._block(spec["offsets"])
+        data = self._block(spec["data"])
+        return [
+            None if code == 0 else data[offsets[code]:offsets[code + 1]].tobytes().decode("utf-8")
+            for code in codes.tolist()
+        ]
+
+    def booleans(self, column: str, positions: np.ndarray) -> List[Optional[bool]]:
+        spec = self.columns[column]
+        positions = np.asarray(positions, dtype=np.int64)
+        shift = (positions & 7).astype(np.uint8)
+        valid = (self._block(spec["valid"])[positions >> 3] >> shift) & 1
+        values = (self._block(spec["values"])[positions >> 3] >> shift) & 1
+        return [bool(v) if ok else None for ok, v in zip(valid.tolist(), values.tolist())]
+
+    def integers(self, column: str, positions: np.ndarray) -> List[Optional[int]]:
+        spec = self.columns[column]
+        return [None if v == spec["null"] else v for v in self._block(spec)[positions].tolist()]
+
+    def timestamps(self, column: str, positions: np.ndarray) -> List[Optional[datetime]]:
+        return [
+            None if v is None else datetime.fromtimestamp(v / 1_000_000, tz=timezone.utc)
+            for v in self.integers(column, positions)
+        ]
+
+    # -------------------------------------------------------------- queries
+
+    def in_bbox(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> np.ndarray:
+        """Positions of the toilets inside a bbox, in quadkey order."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        ranges = key_ranges(cell_bounds(min_lat, min_lng, max_lat, max_lng, BBOX_LEVEL), BBOX_LEVEL)
+        starts = np.searchsorted(self.quadkeys, np.array([s for s, _ in ranges], dtype=np.uint64))
+        ends = np.searchsorted(self.quadkeys, np.array([e for _, e in ranges], dtype=np.uint64))
+        spans = [np.arange(s, e) for s, e in zip(starts.tolist(), ends.tolist()) if e > s]
+        if not spans:
+            return np.empty(0, dtype=np.int64)
+        positions = np.concatenate(spans)
+        lats, lngs = self.lats[positions], self.lngs[positions]
+        mask = (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+        return positions[mask]
+
+    def nearest(
+        self, lat: float, lng: float, k: int, radius_meters: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions and distances (meters) of the k nearest toilets, closest first."""
+        limit = KNN_MAX_METERS if radius_meters is None else radius_meters
+        radius = min(KNN_START_METERS, limit)
+        while True:
+            positions = self.in_bbox(*radius_bbox(lat, lng, radius))
+            distances = haversine_meters(
+                lat, lng, self.lats[positions].astype(np.float64), self.lngs[positions].astype(np.float64)
+            )
+            inside = distances <= radius
+            if np.count_nonzero(inside) >= k or radius >= limit:
+                positions, distances = positions[inside], distances[inside]
+                order = np.lexsort((positions, distances))[:max(k, 0)]
+                return positions[order], distances[order]
+            radius = min(radius * 4.0, limit)
+
+    # -------------------------------------------------------------- mapping
+
+    def toilets(self, positions: np.ndarray, distances: Optional[np.ndarray] = None) -> List[ToiletSearchResult]:
+        """Decode rows into search results."""
+        positions = np.asarray(positions, dtype=np.int64)
+        strings = {column: self.strings(column, positions) for column in STRING_COLUMNS}
+        booleans = {column: self.booleans(column, positions) for column in BOOL_COLUMNS}
+        ratings = self.integers("rating", positions)
+        created = self.timestamps("created_at", positions)
+        return [
+            ToiletSearchResult(
+                id=UUID(bytes=self.ids[p].tobytes()),
+                lat=float(self.lats[p]),
+                lng=float(self.lngs[p]),
+                rating=ratings[i],
+                country_code=self.country_code,
+                created_at=created[i],
+                distance=None if distances is None else float(distances[i]),
+                **{column: values[i] for column, values in strings.items()},
+                **{column: values[i] for column, values in booleans.items()},
+            )
+            for i, p in enumerate(positions.tolist())
+        ]
+
+
+def main(argv=None):
+    """Entry point for the db-snapshot script."""
+    parser = argparse.ArgumentParser(description="Export and query columnar toilet snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write one snapshot file per country")
+    export.add_argument("--country", choices=[code.value for code in CountryCode],
+                        help="Only this country (default: all)")
+    export.add_argument("--output", type=Path, default=Path("snapshots"), help="Output directory")
+    export.add_argument("--coords", choices=("float32", "float64"), default="float32",
+                        help="Coordinate precision (default float32)")
+
+    query = commands.add_parser("query", help="Query a snapshot file")
+    query.add_argument("path", type=Path)
+    where = query.add_mutually_exclusive_group(required=True)
+    where.add_argument("--bbox", type=float, nargs=4, metavar=("MIN_LAT", "MIN_LNG", "MAX_LAT", "MAX_LNG"))
+    where.add_argument("--near", type=float, nargs=2, metavar=("LAT", "LNG"))
+    query.add_argument("--k", type=int, default=10, help="Results for --near (default 10)")
+    query.add_argument("--radius", type=float, help="Maximum distance in meters for --near")
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        with ToiletSnapshot(args.path) as snapshot:
+            started = time.perf_counter()
+            if args.near:
+                positions, distances = snapshot.nearest(*args.near, args.k, args.radius)
+            else:
+                positions, distances = snapshot.in_bbox(*args.bbox), None
+            elapsed = time.perf_counter() - started
+            for toilet in snapshot.toilets(positions, distances):
+                distance = f" {toilet.distance:.0f} m" if toilet.distance is not None else ""
+                print(f"{toilet.id} {toilet.lat:.6f},{toilet.lng:.6f}{distance} {toilet.name or ''}")
+            del positions, distances
+        print(f"{len(snapshot)} toilets in snapshot, query took {elapsed * 1000:.2f} ms")
+        return None
+
+    from .engine import engine
+
+    countries = [args.country] if args.country else [code.value for code in CountryCode]
+    connection = engine.raw_connection()
+    try:
+        results = []
+        for country_code in countries:
+            stats = export_country(connection, country_code, snapshot_path(args.output, country_code), args.coords)
+            connection.commit()
+            results.append(stats)
+            print(f"{country_code}: {stats.rows} toilets, {stats.bytes / 1e6:.1f} MB in {stats.seconds:.2f}s -> {stats.path}")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""In-process spatial index mirroring the toilet search SQL functions.
+
+The index keeps ``toilet_location`` in columnar NumPy arrays bucketed into a
+uniform lat/lng grid and answers the same queries as ``find_nearest_toilets``,
+``find_toilets_in_view`` and ``get_toilets_deterministic_v3`` without a
+database round trip:
+
+* nearest: filtered and ordered by great-circle distance (like the
+  geography search of migration 9f3d2b7a6c14), distance reported in meters;
+* in view: bbox overlap, ``LIMIT`` applied in load order;
+* deterministic: KNN within the map-center country (zoomed in) or
+  ``ORDER BY id`` (zoomed out); the country is passed in from the boundary
+  lookup, or inferred from the 5 nearest toilets like the SQL fallback.
+
+Distances use the haversine formula on a sphere, so they can differ from
+PostGIS' spheroidal geography distances by up to ~0.5%; toilets sitting right
+on the radius boundary may be included or excluded differently.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import Session
+
+from .cache import radius_bbox
+from .models import (
+    CountryCode,
+    NearestToiletsParams,
+    ToiletRead,
+    ToiletSearchResult,
+    ToiletsDeterministicParams,
+    ToiletsInViewParams,
+)
+from .opening_hours import is_open
+
+EARTH_RADIUS_METERS = 6371008.8
+COUNTRY_INFERENCE_K = 5
+DEFAULT_COUNTRY = CountryCode.CH.value
+
+# Same enum order as the countrycode type, used by mode() to break ties
+_COUNTRY_ORDER = {code.value: position for position, code in enumerate(CountryCode)}
+
+_LOAD_SQL = """
+    SELECT id, name, lat, lng, address, accessible, is_free, type, status,
+           notes, city, open_hours, country_code::text AS country_code, created_at
+    FROM toilet_location
+    WHERE lat IS NOT NULL AND lng IS NOT NULL
+"""
+
+_ATTRIBUTE_COLUMNS = (
+    "id", "name", "address", "accessible", "is_free", "type", "status",
+    "notes", "city", "open_hours", "created_at",
+)
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+
+def haversine_meters(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Vectorized great-circle distance from one point to many points."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs - lng)
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class ToiletSpatialIndex:
+    """Grid-bucketed columnar index over toilet locations."""
+
+    def __init__(
+        self,
+        rows: Sequence,
+        cell_degrees: float = 0.05,
+        bbox: Optional[BBox] = None,
+    ):
+        self.cell_degrees = cell_degrees
+        self.bbox = bbox
+        self.loaded_at = time.monotonic()
+        # Grid cells written since the load (see mark_written)
+        self.written_cells: Set[Tuple[int, int]] = set()
+        self._n_cols = int(np.ceil(360.0 / cell_degrees)) + 1
+
+        lats = np.fromiter((row.lat for row in rows), dtype=np.float64, count=len(rows))
+        lngs = np.fromiter((row.lng for row in rows), dtype=np.float64, count=len(rows))
+        keys = self._cell_rows(lats) * self._n_cols + self._cell_cols(lngs)
+
+        # Sort once by cell so every grid row of a query is one contiguous slice
+        order = np.argsort(keys, kind="stable")
+        self._load_position = order.astype(np.int64)
+        self.keys = keys[order]
+        self.lats = lats[order]
+        self.lngs = lngs[order]
+        self.country_codes = np.array([rows[i].country_code or "" for i in order], dtype=object)
+        self.columns = {
+            column: np.array([getattr(rows[i], column) for i in order], dtype=object)
+            for column in _ATTRIBUTE_COLUMNS
+        }
+        self._by_country = {
+            code: np.flatnonzero(self.country_codes == code)
+            for code in set(self.country_codes.tolist()) if code
+        }
+        # Positions in PostgreSQL uuid order (byte order == integer order)
+        self._id_order = np.array(
+            sorted(range(len(order)), key=lambda i: self.columns["id"][i].int),
+            dtype=np.int64,
+        )
+
+    @classmethod
+    def load(
+        cls,
+        session: Session,
+        bbox: Optional[BBox] = None,
+        cell_degrees: float = 0.05,
+    ) -> "ToiletSpatialIndex":
+        """Load toilets (optionally only a hot region) from the database."""
+        sql = _LOAD_SQL
+        bind = {}
+        if bbox is not None:
+            sql += " AND lat BETWEEN :min_lat AND :max_lat AND lng BETWEEN :min_lng AND :max_lng"
+            bind = dict(zip(("min_lat", "min_lng", "max_lat", "max_lng"), bbox))
+        rows = session.execute(text(sql), bind).all()
+        return cls(rows, cell_degrees=cell_degrees, bbox=bbox)
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    # ------------------------------------------------------------------ grid
+
+    def _cell_rows(self, lats):
+        return np.floor((np.asarray(lats) + 90.0) / self.cell_degrees).astype(np.int64)
+
+    def _cell_cols(self, lngs):
+        return np.floor((np.asarray(lngs) + 180.0) / self.cell_degrees).astype(np.int64)
+
+    def _candidates(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> np.ndarray:
+        """Positions of points in all grid cells overlapping the bbox."""
+        row0, row1 = self._cell_rows([min_lat, max_lat])
+        col0, col1 = self._cell_cols([max(min_lng, -180.0), min(max_lng, 180.0)])
+        grid_rows = np.arange(row0, row1 + 1, dtype=np.int64)
+        starts = np.searchsorted(self.keys, grid_rows * self._n_cols + col0, side="left")
+        ends = np.searchsorted(self.keys, grid_rows * self._n_cols + col1, side="right")
+        if len(starts) == 1:
+            return np.arange(starts[0], ends[0])
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts, ends) if e > s] or [np.empty(0, np.int64)])
+
+    def _within(self, positions: np.ndarray, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> np.ndarray:
+        lats = self.lats[positions]
+        lngs = self.lngs[positions]
+        mask = (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+        return positions[mask]
+
+    def _open(self, positions: np.ndarray, open_at: Optional[datetime]) -> np.ndarray:
+        """Positions known to be open at open_at (all of them if it is None)."""
+        if open_at is None:
+            return positions
+        open_hours = self.columns["open_hours"]
+        mask = np.fromiter((is_open(open_hours[p], open_at) for p in positions), dtype=bool, count=len(positions))
+        return positions[mask]
+
+    def _planar_knn(self, lat: float, lng: float, k: int, pool: Optional[np.ndarray] = None) -> np.ndarray:
+        """Positions of the k points closest by ``geom <-> point`` (degrees).
+
+        Grows a square search window until it holds k points inside the
+        inscribed circle, which makes the result exact.
+        """
+        pool_mask = None
+        if pool is not None:
+            pool_mask = np.zeros(len(self), dtype=bool)
+            pool_mask[pool] = True
+            total = len(pool)
+        else:
+            total = len(self)
+        k = min(k, total)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        half = self.cell_degrees
+        while half < 360.0:
+            positions = self._within(
+                self._candidates(lat - half, lng - half, lat + half, lng + half),
+                lat - half, lng - half, lat + half, lng + half,
+            )
+            if pool_mask is not None:
+                positions = positions[pool_mask[positions]]
+            planar = np.hypot(self.lats[positions] - lat, self.lngs[positions] - lng)
+            if np.count_nonzero(planar <= half) >= k:
+                return self._take_smallest(positions, planar, k)
+            half *= 2.0
+
+        positions = pool if pool is not None else np.arange(len(self))
+        planar = np.hypot(self.lats[positions] - lat, self.lngs[positions] - lng)
+        return self._take_smallest(positions, planar, k)
+
+    @staticmethod
+    def _take_smallest(positions: np.ndarray, values: np.ndarray, k: int) -> np.ndarray:
+        if len(positions) > k:
+            part = np.argpartition(values, k - 1)[:k]
+            positions, values = positions[part], values[part]
+        return positions[np.argsort(values, kind="stable")]
+
+    # -------------------------------------------------------------- coverage
+
+    def mark_written(self, positions: Iterable[Tuple[Optional[float], Optional[float]]]) -> None:
+        """Stop answering for the grid cells of written positions (old and new).
+        
+        The snapshot does not see writes made after its load; queries touching
+        those cells go to the database instead.
+        """
+        cells = {
+            (int(self._cell_rows([lat])[0]), int(self._cell_cols([lng])[0]))
+            for lat, lng in positions
+            if lat is not None and lng is not None
+        }
+        self.written_cells = self.written_cells | cells
+
+    def covers_bbox(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> bool:
+        """Whether a bbox lies inside the loaded region and touches no written cell."""
+        if self.bbox is not None:
+            b_min_lat, b_min_lng, b_max_lat, b_max_lng = self.bbox
+            if not (b_min_lat <= min_lat and b_min_lng <= min_lng and max_lat <= b_max_lat and max_lng <= b_max_lng):
+                return False
+        if self.written_cells:
+            row0, row1 = self._cell_rows([min_lat, max_lat])
+            col0, col1 = self._cell_cols([min_lng, max_lng])
+            return not any(row0 <= row <= row1 and col0 <= col <= col1 for row, col in self.written_cells)
+        return True
+
+    def covers_nearest(self, params: NearestToiletsParams) -> bool:
+        return self.covers_bbox(*radius_bbox(params.user_lat, params.user_lng, params.radius_meters))
+
+    def covers_in_view(self, params: ToiletsInViewParams) -> bool:
+        return self.covers_bbox(params.min_lat, params.min_lng, params.max_lat, params.max_lng)
+
+    def covers_deterministic(self, params: ToiletsDeterministicParams) -> bool:
+        # Country inference and the zoomed-out sample need the whole table
+        return self.bbox is None and not self.written_cells
+
+    # --------------------------------------------------------------- queries
+
+    def find_nearest_toilets(self, params: NearestToiletsParams) -> List[ToiletSearchResult]:
+        """Mirror of the find_nearest_toilets SQL function."""
+        lat, lng = params.user_lat, params.user_lng
+        box = radius_bbox(lat, lng, params.radius_meters)
+        positions = self._open(self._within(self._candidates(*box), *box), params.open_at)
+        distances = haversine_meters(lat, lng, self.lats[positions], self.lngs[positions])
+        keep = distances <= params.radius_meters
+        positions, distances = positions[keep], distances[keep]
+
+        order = np.argsort(distances, kind="stable")[:max(params.result_limit, 0)]
+        return [
+            self._search_result(int(positions[i]), float(distances[i]))
+            for i in order
+        ]
+
+    def find_toilets_in_view(self, params: ToiletsInViewParams) -> List[ToiletRead]:
+        """Mirror of the find_toilets_in_view SQL function."""
+        box = (params.min_lat, params.min_lng, params.max_lat, params.max_lng)
+        positions = self._open(self._within(self._candidates(*box), *box), params.open_at)
+        # No ORDER BY in SQL either; return in load order for stable results
+        positions = positions[np.argsort(self._load_position[positions], kind="stable")]
+        return [self._toilet_read(int(p)) for p in positions[:max(params.max_results, 0)]]
+
+    def infer_country(self, lat: float, lng: float) -> str:
+        """Country with most toilets among the K nearest (mode(), enum-order ties)."""
+        with_country = np.flatnonzero(self.country_codes != "")
+        nearest = self._planar_knn(lat, lng, COUNTRY_INFERENCE_K, pool=with_country)
+        if len(nearest) == 0:
+            return DEFAULT_COUNTRY
+        codes = self.country_codes[nearest].tolist()
+        return min(set(codes), key=lambda code: (-codes.count(code), _COUNTRY_ORDER.get(code, len(_COUNTRY_ORDER))))
+
+    def get_toilets_deterministic(
+        self, params: ToiletsDeterministicParams, country_code: Optional[str] = None
+    ) -> List[ToiletRead]:
+        """Mirror of the get_toilets_deterministic_v3 SQL function.
+        
+        ``country_code`` is the map-center country when already known (e.g.
+        from the country boundary lookup); otherwise it is inferred from the
+        nearest toilets.
+        """
+        if not (-90 <= params.center_lat <= 90 and -180 <= params.center_lng <= 180):
+            raise ValueError(
+                f"Invalid map center coordinates provided: {params.center_lat}, {params.center_lng}"
+            )
+        country = country_code or self.infer_country(params.center_lat, params.center_lng)
+        pool = self._by_country.get(country, np.empty(0, dtype=np.int64))
+        limit = max(params.result_limit, 0)
+
+        if params.is_zoomed_in:
+            positions = self._planar_knn(params.center_lat, params.center_lng, limit, pool=pool)
+        else:
+            in_country = np.zeros(len(self), dtype=bool)
+            in_country[pool] = True
+            positions = self._id_order[in_country[self._id_order]][:limit]
+        return [self._toilet_read(int(p)) for p in positions]
+
+    # ---------------------------------------------------------------- mapping
+
+    def _toilet_read(self, position: int) -> ToiletRead:
+        columns = self.columns
+        return ToiletRead(
+            id=columns["id"][position],
+            name=columns["name"][position],
+            lat=float(self.lats[position]),
+            lng=float(self.lngs[position]),
+            accessible=columns["accessible"][position],
+            open_hours=columns["open_hours"][position],
+            address=columns["address"][position],
+            created_at=columns["created_at"][position],
+        )
+
+    def _search_result(self, position: int, distance: float) -> ToiletSearchResult:
+        columns = self.columns
+        return ToiletSearchResult(
+            id=columns["id"][position],
+            name=columns["name"][position],
+            lat=float(self.lats[position]),
+            lng=float(self.lngs[position]),
+            address=columns["address"][position],
+            accessible=columns["accessible"][position],
+            is_free=columns["is_free"][position],
+            type=columns["type"][position],
+            status=columns["status"][position],
+            notes=columns["notes"][position],
+            city=columns["city"][position],
+            open_hours=columns["open_hours"][position],
+            created_at=columns["created_at"][position],
+            distance=distance,
+        )
+
+
+class RefreshingSpatialIndex:
+    """Holds a ToiletSpatialIndex and reloads it from the database periodically.
+
+    Queries are served from the current snapshot; when it is older than
+    ``refresh_seconds`` a background thread rebuilds it while callers keep
+    using the previous one (only the very first load is synchronous). Writes
+    reported through ``mark_written`` bypass the index for their cells
+    until a snapshot loaded after them replaces it.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        refresh_seconds: float = 300.0,
+        bbox: Optional[BBox] = None,
+        cell_degrees: float = 0.05,
+    ):
+        self.session_factory = session_factory
+        self.refresh_seconds = refresh_seconds
+        self.bbox = bbox
+        self.cell_degrees = cell_degrees
+        self._index: Optional[ToiletSpatialIndex] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        # (time, positions) of writes the current snapshot may not contain
+        self._writes: List[Tuple[float, List[Tuple[Optional[float], Optional[float]]]]] = []
+
+    def refresh(self) -> ToiletSpatialIndex:
+        """Reload the index from the database now."""
+        started = time.monotonic()
+        with self.session_factory() as session:
+            index = ToiletSpatialIndex.load(session, bbox=self.bbox, cell_degrees=self.cell_degrees)
+        with self._lock:
+            # Writes made while loading may be missing from the new snapshot
+            self._writes = [(at, positions) for at, positions in self._writes if at >= started]
+            for _, positions in self._writes:
+                index.mark_written(positions)
+            self._index = index
+        return index
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def refresh_async(self) -> Optional[threading.Thread]:
+        """Start a background reload unless one is running; returns its thread."""
+        with self._lock:
+            if self._refreshing:
+                return None
+            self._refreshing = True
+        thread = threading.Thread(target=self._refresh_in_background, name="spatial-index-refresh", daemon=True)
+        thread.start()
+        return thread
+
+    def get(self) -> ToiletSpatialIndex:
+        """Current index; a stale one is served while it reloads in the background."""
+        index = self._index
+        if index is None:
+            with self._load_lock:
+                return self._index or self.refresh()
+        if time.monotonic() - index.loaded_at >= self.refresh_seconds:
+            self.refresh_async()
+        return index
+
+    def mark_written(self, positions: Iterable[Tuple[Optional[float], Optional[float]]]) -> None:
+        """Bypass the index around written positions until the next reload."""
+        positions = list(positions)
+        with self._lock:
+            self._writes.append((time.monotonic(), positions))
+            if self._index is not None:
+                self._index.mark_written(positions)
+
+    def covers_nearest(self, params: NearestToiletsParams) -> bool:
+        return self.get().covers_nearest(params)
+
+    def covers_in_view(self, params: ToiletsInViewParams) -> bool:
+        return self.get().covers_in_view(params)
+
+    def covers_deterministic(self, params: ToiletsDeterministicParams) -> bool:
+        return self.get().covers_deterministic(params)
+
+    def find_nearest_toilets(self, params: NearestToiletsParams) -> List[ToiletSearchResult]:
+        return self.get().find_nearest_toilets(params)
+
+    def find_toilets_in_view(self, params: ToiletsInViewParams) -> List[ToiletRead]:
+        return self.get().find_toilets_in_view(params)
+
+    def get_toilets_deterministic(
+        self, params: ToiletsDeterministicParams, country_code: Optional[str] = None
+    ) -> List[ToiletRead]:
+        return self.get().get_toilets_deterministic(params, country_code)
+
@@ -158,8 +158,9 @@ async function populateFromOsm() {
 
     // --- Insertion Logic ---
     // IMPORTANT: This uses simple INSERT. If you run this script multiple times,
-    // it WILL create duplicate entries unless you clear the table first
-    // or modify the table and script to use UPSERT based on an osm_id column.
+    // it WILL create duplicate entries unless you clear the table first.
+    // For repeatable syncs, save the Overpass response and use the Python
+    // importer instead, which upserts on osm_id: `db-osm-sync overpass.json --country=CH`.
     
     console.warn("Using simple INSERT. Ensure the 'toilet_location' table is empty or duplicates are acceptable/handled.");
     console.log('Attempting to insert data into Supabase...');
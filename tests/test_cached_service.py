@@ -0,0 +1,79 @@
+"""Tests for the query counts of db.services.CachedToiletService."""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from db.cache import QueryCache
+from db.models import ToiletsInViewParams
+from db.results import ToiletRecord
+from db.services import CachedToiletService, TileCache
+
+
+class _Session:
+    """Answers find_toilets_in_view from a list of records, counting calls."""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+
+    def execute(self, statement, bind):
+        self.calls.append(bind)
+        rows = [
+            tuple(record) for record in self.records
+            if bind["min_lat"] <= record.lat <= bind["max_lat"] and bind["min_lng"] <= record.lng <= bind["max_lng"]
+        ]
+        return rows[:bind["max_results"]]
+
+
+def _records(count, lat=47.37, lng=8.54, spread=0.01):
+    created_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        ToiletRecord(uuid.uuid4(), f"WC {i}", lat + spread * (i % 10) / 10, lng + spread * (i // 10) / 10,
+                     None, None, None, created_at)
+        for i in range(count)
+    ]
+
+
+def _service(session):
+    return CachedToiletService(session, cache=QueryCache(), tile_cache=TileCache())
+
+
+VIEW = ToiletsInViewParams(min_lat=47.36, min_lng=8.53, max_lat=47.39, max_lng=8.56, max_results=10)
+
+
+def test_sparse_view_miss_then_hit():
+    session = _Session(_records(5))
+    service = _service(session)
+    first = service.find_toilets_in_view(VIEW)
+    assert len(session.calls) == 1
+    assert service.find_toilets_in_view(VIEW) == first
+    # A nearby view inside the same snapped bbox is answered from the cache
+    service.find_toilets_in_view(VIEW.model_copy(update={"min_lat": 47.361}))
+    assert len(session.calls) == 1
+
+
+def test_dense_view_is_cached_exactly():
+    session = _Session(_records(100))
+    service = _service(session)
+    first = service.find_toilets_in_view(VIEW)
+    assert len(first) == 10
+    # Over-fetch of the snapped bbox, then the view itself
+    assert [call["max_results"] for call in session.calls] == [20, 10]
+    assert service.find_toilets_in_view(VIEW) == first
+    assert len(session.calls) == 2
+    # Another view of the dense bbox skips the over-fetch
+    service.find_toilets_in_view(VIEW.model_copy(update={"min_lat": 47.361}))
+    assert [call["max_results"] for call in session.calls] == [20, 10, 10]
+
+
+@pytest.mark.parametrize("count", [5, 100])
+def test_cached_view_matches_direct_query(count):
+    records = _records(count)
+    cached = _service(_Session(records)).find_toilets_in_view(VIEW)
+    session = _Session(records)
+    direct = [ToiletRecord._make(row) for row in session.execute(None, {
+        "min_lat": VIEW.min_lat, "min_lng": VIEW.min_lng, "max_lat": VIEW.max_lat, "max_lng": VIEW.max_lng,
+        "max_results": VIEW.max_results,
+    })]
+    assert [toilet.id for toilet in cached] == [record.id for record in direct]
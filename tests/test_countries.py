@@ -0,0 +1,109 @@
+"""Tests for db.countries.CountryResolver caching and the deterministic search round trips."""
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from db.countries import CountryResolver
+from db.models import ToiletsDeterministicParams
+from db.results import ToiletRecord
+from db.services import GET_TOILETS_IN_COUNTRY_SQL, GET_TOILETS_IN_INFERRED_COUNTRY_SQL, ToiletService
+
+
+class _Result:
+    def __init__(self, row):
+        self._row = row
+
+    def one(self):
+        return self._row
+
+
+class _Session:
+    """Answers RESOLVE_COUNTRY_SQL: CH west of lng 7.59 (the border), DE east of it."""
+
+    def __init__(self, border_lng=7.59):
+        self.border_lng = border_lng
+        self.binds = []
+
+    def execute(self, statement, bind):
+        self.binds.append(bind)
+        code = "CH" if bind["lng"] < self.border_lng else "DE"
+        inside = bind["max_lng"] < self.border_lng or bind["min_lng"] >= self.border_lng
+        return _Result(SimpleNamespace(country_code=code, cell_inside=inside))
+
+
+def test_resolves_the_point_not_the_cell_center():
+    resolver = CountryResolver(quantum_degrees=0.01)
+    session = _Session()
+    # Both points share the cell centered on lng 7.59; they lie on either side of the border
+    assert resolver.resolve(session, 47.56, 7.588) == "CH"
+    assert resolver.resolve(session, 47.56, 7.592) == "DE"
+    assert session.binds[0]["lng"] == 7.588
+
+
+def test_caches_only_cells_inside_one_country():
+    resolver = CountryResolver(quantum_degrees=0.01)
+    session = _Session()
+    resolver.resolve(session, 47.56, 7.40)
+    resolver.resolve(session, 47.56, 7.401)
+    resolver.resolve(session, 47.56, 7.589)
+    resolver.resolve(session, 47.56, 7.589)
+    assert len(session.binds) == 3
+    assert resolver.hits == 1
+
+
+_InferredRow = namedtuple("_InferredRow", ToiletRecord._fields + ("inferred_country_code", "cell_inside"))
+
+
+class _Rows(list):
+    def all(self):
+        return list(self)
+
+
+class _SearchSession:
+    """Answers the deterministic search statements, counting calls."""
+
+    def __init__(self, code="CH", cell_inside=True):
+        self.code = code
+        self.cell_inside = cell_inside
+        self.calls = []
+        self.record = ToiletRecord(uuid.uuid4(), "WC", 47.37, 8.54, None, None, None,
+                                   datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+    def execute(self, statement, bind):
+        self.calls.append(statement)
+        if statement is GET_TOILETS_IN_INFERRED_COUNTRY_SQL:
+            return _Rows([_InferredRow(*self.record, self.code, self.cell_inside)])
+        assert statement is GET_TOILETS_IN_COUNTRY_SQL and bind["country_code"] == self.code
+        return _Rows([self.record])
+
+
+PARAMS = ToiletsDeterministicParams(center_lat=47.37, center_lng=8.54, is_zoomed_in=True, result_limit=10)
+
+
+def test_deterministic_miss_is_one_statement():
+    session = _SearchSession()
+    service = ToiletService(session, country_resolver=CountryResolver())
+    first = service.get_toilets_deterministic(PARAMS)
+    # The country is inferred by the search statement itself, then cached
+    assert session.calls == [GET_TOILETS_IN_INFERRED_COUNTRY_SQL]
+    assert service.get_toilets_deterministic(PARAMS) == first
+    assert session.calls == [GET_TOILETS_IN_INFERRED_COUNTRY_SQL, GET_TOILETS_IN_COUNTRY_SQL]
+
+
+def test_deterministic_border_cell_is_not_cached():
+    session = _SearchSession(cell_inside=False)
+    service = ToiletService(session, country_resolver=CountryResolver())
+    service.get_toilets_deterministic(PARAMS)
+    service.get_toilets_deterministic(PARAMS)
+    assert session.calls == [GET_TOILETS_IN_INFERRED_COUNTRY_SQL] * 2
+
+
+def test_deterministic_rejects_invalid_center_without_queries():
+    session = _SearchSession()
+    service = ToiletService(session, country_resolver=CountryResolver())
+    with pytest.raises(ValueError):
+        service.get_toilets_deterministic(PARAMS.model_copy(update={"center_lat": 91.0}))
+    assert session.calls == []
@@ -0,0 +1,50 @@
+"""Tests for db.dedup."""
+import math
+import random
+
+import pytest
+
+from db.dedup import DedupPoint, candidate_pairs, haversine_m
+
+THRESHOLD_M = 15.0
+
+
+def cluster(lat: float, lng: float, n: int = 800, spread_m: float = 200.0, seed: int = 1):
+    rng = random.Random(seed)
+    meters_per_degree = math.radians(1) * 6_371_008.8
+    return [
+        DedupPoint(
+            str(index),
+            lat + rng.uniform(-1, 1) * spread_m / meters_per_degree,
+            lng + rng.uniform(-1, 1) * spread_m / (meters_per_degree * math.cos(math.radians(lat))),
+            None, None, None, None, None, None, None, None,
+        )
+        for index in range(n)
+    ]
+
+
+def brute_force(points, threshold_m):
+    return {
+        (i, j)
+        for i in range(len(points))
+        for j in range(i + 1, len(points))
+        if haversine_m(points[i].lat, points[i].lng, points[j].lat, points[j].lng) <= threshold_m
+    }
+
+
+@pytest.mark.parametrize(
+    "lat, lng",
+    [(47.37, 8.54), (40.35, 18.17), (40.0, -100.0), (-33.87, 151.21), (64.15, -21.94)],
+    ids=["zurich", "lecce", "kansas", "sydney", "reykjavik"],
+)
+def test_candidate_pairs_match_brute_force(lat, lng):
+    points = cluster(lat, lng)
+    found = {(min(i, j), max(i, j)) for i, j, _ in candidate_pairs(points, THRESHOLD_M)}
+    assert found == brute_force(points, THRESHOLD_M)
+
+
+def test_candidate_pairs_across_latitudes():
+    # One run spanning several countries shares a single longitude scale
+    points = cluster(36.0, 14.5, n=300, seed=2) + cluster(47.8, 9.2, n=300, seed=3)
+    found = {(min(i, j), max(i, j)) for i, j, _ in candidate_pairs(points, THRESHOLD_M)}
+    assert found == brute_force(points, THRESHOLD_M)
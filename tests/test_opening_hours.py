@@ -0,0 +1,143 @@
+"""Tests for db.opening_hours and its SQL twin toilet_open_minutes."""
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from db.opening_hours import MINUTES_PER_DAY, is_open, minute_of_week, parse_opening_hours
+
+MO, TU, WE, TH, FR, SA, SU = (day * MINUTES_PER_DAY for day in range(7))
+
+# Values exercised by both the parser tests and the SQL parity check
+SAMPLES = [
+    "24/7",
+    "Mo-Fr 08:00-18:00",
+    "Mo-Fr 08:00-18:00; Sa 10:00-14:00",
+    "Mo-Su 08:00-20:00; Su off",
+    "Mo-Fr 08:00-18:00 || Sa 09:00-12:00",
+    "Fr-Mo 10:00-12:00",
+    "Mo-Fr 22:00-02:00",
+    "Su 23:00-01:00",
+    "Mo 20:00-26:00",
+    "Mo-Fr",
+    "sa,su 09:00-12:00, 13:00 - 17:00",
+    "PH off; Mo 08:00-09:00",
+    "Mo-Su off",
+    "",
+    "Jan-Mar Mo 08:00-10:00",
+    "Mo 08:00+",
+    "sunrise-sunset",
+    "Mo 25:00-26:00",
+    "Mo-Fr 08:00-18:00 \"by appointment\"",
+]
+
+
+def test_full_week():
+    assert parse_opening_hours("24/7") == ((0, 7 * MINUTES_PER_DAY),)
+
+
+def test_later_rule_overrides_selected_days():
+    assert parse_opening_hours("Mo-Su 08:00-20:00; Su off") == tuple(
+        (day + 480, day + 1200) for day in (MO, TU, WE, TH, FR, SA)
+    )
+    assert parse_opening_hours("Mo-Fr 08:00-18:00; Fr 08:00-12:00")[-1] == (FR + 480, FR + 720)
+
+
+def test_wrapping_day_range():
+    assert parse_opening_hours("Fr-Mo 10:00-12:00") == tuple(
+        (day + 600, day + 720) for day in (MO, FR, SA, SU)
+    )
+
+
+def test_overnight_spans():
+    assert parse_opening_hours("Mo 22:00-02:00") == ((MO + 1320, TU + 120),)
+    assert parse_opening_hours("Mo 20:00-26:00") == ((MO + 1200, TU + 120),)
+    # Sunday night runs into Monday morning
+    assert parse_opening_hours("Su 23:00-01:00") == ((0, 60), (SU + 1380, 7 * MINUTES_PER_DAY))
+
+
+def test_selector_without_times_is_all_day():
+    assert parse_opening_hours("Mo-Fr") == ((MO, SA),)
+
+
+def test_normalization():
+    assert parse_opening_hours("sa , su  09:00 - 12:00") == parse_opening_hours("Sa,Su 09:00-12:00")
+
+
+def test_holiday_rules_are_ignored():
+    assert parse_opening_hours("PH off; Mo 08:00-09:00") == ((MO + 480, MO + 540),)
+
+
+def test_closed_all_week_is_known_and_empty():
+    assert parse_opening_hours("Mo-Su off") == ()
+
+
+@pytest.mark.parametrize(
+    "value",
+    [None, "", "Jan-Mar Mo 08:00-10:00", "Mo 08:00+", "sunrise-sunset", "Mo 25:00-26:00",
+     "Mo-Fr 08:00-18:00 \"by appointment\""],
+)
+def test_unsupported_or_missing_is_unknown(value):
+    assert parse_opening_hours(value) is None
+
+
+def test_minute_of_week_is_local_time():
+    # Saturday 2026-10-17 10:00 UTC is 12:00 in Zurich (CEST)
+    assert minute_of_week(datetime(2026, 10, 17, 10, 0, tzinfo=timezone.utc)) == SA + 720
+    # Naive datetimes are UTC; Monday 2026-01-05 00:30 UTC is 01:30 CET
+    assert minute_of_week(datetime(2026, 1, 5, 0, 30)) == MO + 90
+
+
+def test_is_open():
+    at = datetime(2026, 10, 17, 10, 0, tzinfo=timezone.utc)  # Saturday 12:00 local
+    assert is_open("Mo-Su 08:00-20:00", at)
+    assert not is_open("Mo-Fr 08:00-20:00", at)
+    assert not is_open("Mo-Su off", at)
+    assert not is_open("sunrise-sunset", at)
+    assert not is_open(None, at)
+
+
+# Parity with the SQL functions of migration 7e2d9b4c1a68; needs a migrated
+# database in TEST_DATABASE_URL
+@pytest.fixture(scope="module")
+def connection():
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from sqlalchemy import create_engine
+
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        yield connection
+    engine.dispose()
+
+
+def _multirange(intervals):
+    if intervals is None:
+        return None
+    return "{" + ",".join(f"[{start},{end})" for start, end in intervals) + "}"
+
+
+@pytest.mark.parametrize("value", SAMPLES)
+def test_sql_parser_parity(connection, value):
+    from sqlalchemy import text
+
+    compiled = connection.execute(text("SELECT toilet_open_minutes(:value)::text"), {"value": value}).scalar()
+    assert compiled == _multirange(parse_opening_hours(value))
+
+
+@pytest.mark.parametrize(
+    "at",
+    [
+        datetime(2026, 10, 17, 10, 0, tzinfo=timezone.utc),
+        datetime(2026, 10, 25, 0, 59, tzinfo=timezone.utc),
+        datetime(2026, 10, 25, 1, 0, tzinfo=timezone.utc),
+        datetime(2026, 3, 29, 1, 30, tzinfo=timezone.utc),
+        datetime(2026, 1, 4, 23, 30, tzinfo=timezone.utc),
+    ],
+)
+def test_sql_minute_of_week_parity(connection, at):
+    from sqlalchemy import text
+
+    minute = connection.execute(text("SELECT toilet_minute_of_week(:at)"), {"at": at}).scalar()
+    assert minute == minute_of_week(at)
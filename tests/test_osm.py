@@ -0,0 +1,134 @@
+"""Tests for the streaming OSM readers and the tag mapping of db.osm."""
+import io
+import json
+from functools import partial
+
+import pytest
+
+from db import osm
+from db.osm import _JsonArrayStream, osm_node_to_toilet, read_osm_xml, read_overpass_json
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1 << 16]
+
+NODES = [
+    {
+        "type": "node", "id": 1001, "lat": 47.3769, "lon": 8.5417, "version": 3,
+        "tags": {
+            "amenity": "toilets", "name": "Zürich HB", "wheelchair": "yes", "fee": "no",
+            "opening_hours": "24/7", "addr:street": "Bahnhofplatz", "addr:housenumber": "15",
+            "addr:postcode": "8001", "addr:city": "Zürich", "operator": "SBB",
+        },
+    },
+    {"type": "way", "id": 2002, "nodes": [1, 2, 3], "tags": {"amenity": "toilets"}},
+    {
+        "type": "node", "id": 1002, "lat": -33.8688, "lon": 151.2093, "version": 12,
+        "tags": {
+            "disused:amenity": "toilets", "wheelchair": "limited", "fee": "yes",
+            "toilets:position": "seated", "addr:city": "Sydney", "note": "closed \"for now\"",
+        },
+    },
+    {"type": "node", "id": 1003, "lat": 46.2044, "lon": 6.1432, "tags": {"amenity": "toilets"}},
+]
+
+
+def _document(indent=None):
+    return json.dumps(
+        {"version": 0.6, "generator": "Overpass API", "osm3s": {"copyright": "ODbL"}, "elements": NODES,
+         "remark": None, "complete": True},
+        ensure_ascii=False,
+        indent=indent,
+    )
+
+
+def _xml():
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6" generator="test">']
+    for element in NODES:
+        if element["type"] != "node":
+            lines.append(f'  <way id="{element["id"]}"><nd ref="1"/><tag k="amenity" v="toilets"/></way>')
+            continue
+        version = f' version="{element["version"]}"' if "version" in element else ""
+        lines.append(f'  <node id="{element["id"]}" lat="{element["lat"]}" lon="{element["lon"]}"{version}>')
+        for key, value in element["tags"].items():
+            value = value.replace("&", "&amp;").replace('"', "&quot;")
+            lines.append(f'    <tag k="{key}" v="{value}"/>')
+        lines.append("  </node>")
+    lines.append("</osm>")
+    return "\n".join(lines).encode("utf-8")
+
+
+class _ChunkedReader(io.BytesIO):
+    """Binary file that returns at most chunk_size bytes per read."""
+
+    def __init__(self, data, chunk_size):
+        super().__init__(data)
+        self.chunk_size = chunk_size
+
+    def read(self, size=-1):
+        return super().read(self.chunk_size if size is None or size < 0 else min(size, self.chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("indent", [None, 2])
+def test_json_stream_at_any_chunk_size(chunk_size, indent):
+    stream = _JsonArrayStream(io.StringIO(_document(indent)), chunk_size)
+    assert list(stream.iter_object_key("elements")) == NODES
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("value", [0.6, -12.5e-3, 1e10, 0, 123456789, True, False, None, "0.6", [1.5, 2], {}])
+def test_json_stream_scalars_at_buffer_edges(chunk_size, value):
+    document = json.dumps({"before": value, "elements": [value, value], "after": value})
+    stream = _JsonArrayStream(io.StringIO(document), chunk_size)
+    assert list(stream.iter_object_key("elements")) == [value, value]
+
+
+def test_json_stream_rejects_truncated_input():
+    with pytest.raises(ValueError):
+        list(_JsonArrayStream(io.StringIO('{"elements": [{"id": 1}, {"id"'), 4).iter_object_key("elements"))
+
+
+def test_tag_mapping():
+    toilet = osm_node_to_toilet(1001, 47.3769, 8.5417, NODES[0]["tags"], 3, "CH")
+    assert toilet.name == "Zürich HB"
+    assert toilet.accessible is True
+    assert toilet.is_free is True
+    assert toilet.open_hours == "24/7"
+    assert toilet.address == "Bahnhofplatz 15 8001 Zürich"
+    assert toilet.notes == "Operator: SBB"
+    assert toilet.type == "Unknown"
+    assert toilet.status == "in Betrieb"
+    assert (toilet.osm_id, toilet.osm_version, toilet.country_code) == (1001, 3, "CH")
+
+    disused = osm_node_to_toilet(1002, -33.8688, 151.2093, NODES[2]["tags"])
+    assert disused.name == "Public Toilet"
+    assert disused.accessible is None
+    assert disused.is_free is False
+    assert disused.type == "Position: seated"
+    assert disused.status == "Disused"
+    assert disused.address == "Sydney"
+    assert disused.notes == 'Note: closed "for now"'
+
+    assert osm_node_to_toilet(1003, None, 6.1432, {}) is None
+
+
+def _expected(country_code=None):
+    return [
+        osm_node_to_toilet(node["id"], node["lat"], node["lon"], node["tags"], node.get("version"), country_code)
+        for node in NODES
+        if node["type"] == "node"
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_read_overpass_json(tmp_path, monkeypatch, chunk_size):
+    path = tmp_path / "toilets.json"
+    path.write_text(_document(), encoding="utf-8")
+    monkeypatch.setattr(osm, "_JsonArrayStream", partial(_JsonArrayStream, chunk_size=chunk_size))
+    assert list(read_overpass_json(path, "CH")) == _expected("CH")
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_read_osm_xml(monkeypatch, chunk_size):
+    data = _xml()
+    monkeypatch.setattr(osm, "_open_binary", lambda path: _ChunkedReader(data, chunk_size))
+    assert list(read_osm_xml("toilets.osm", "CH")) == _expected("CH")
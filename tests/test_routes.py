@@ -0,0 +1,61 @@
+"""Tests for the route inputs of find_toilets_along_route."""
+import pytest
+
+from db.models import ToiletsAlongRouteParams
+from db.services import decode_polyline, toilets_along_route_bind
+
+# Reference example of the encoded polyline algorithm format documentation
+REFERENCE_POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+REFERENCE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def _flat(points):
+    return [value for point in points for value in point]
+
+
+def test_decode_reference_example():
+    assert _flat(decode_polyline(REFERENCE_POLYLINE)) == pytest.approx(_flat(REFERENCE_POINTS))
+
+
+def test_decode_precision_6():
+    # The same deltas at precision 6 (OSRM polyline6) are ten times smaller
+    assert _flat(decode_polyline(REFERENCE_POLYLINE, precision=6)) == pytest.approx(
+        [value / 10 for value in _flat(REFERENCE_POINTS)]
+    )
+
+
+def test_decode_empty():
+    assert decode_polyline("") == []
+
+
+@pytest.mark.parametrize("encoded", [REFERENCE_POLYLINE[:-1], REFERENCE_POLYLINE[:5], "_p~iF", "_p~iF~ps|U_"])
+def test_decode_truncated(encoded):
+    with pytest.raises(ValueError):
+        decode_polyline(encoded)
+
+
+@pytest.mark.parametrize("encoded", ["_p~iF~ps|U\n", "_p~iF ~ps|U", "_p~iF~ps|Ué"])
+def test_decode_invalid_characters(encoded):
+    with pytest.raises(ValueError):
+        decode_polyline(encoded)
+
+
+def test_bind_from_polyline_or_points():
+    from_polyline = toilets_along_route_bind(ToiletsAlongRouteParams(polyline=REFERENCE_POLYLINE))
+    from_points = toilets_along_route_bind(ToiletsAlongRouteParams(route=REFERENCE_POINTS))
+    assert from_polyline["route_lats"] == pytest.approx(from_points["route_lats"])
+    assert from_polyline["route_lngs"] == pytest.approx(from_points["route_lngs"])
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        ToiletsAlongRouteParams(),
+        ToiletsAlongRouteParams(route=REFERENCE_POINTS, polyline=REFERENCE_POLYLINE),
+        ToiletsAlongRouteParams(route=REFERENCE_POINTS[:1]),
+        ToiletsAlongRouteParams(polyline="_p~iF~ps|U"),
+    ],
+)
+def test_bind_rejects_invalid_routes(params):
+    with pytest.raises(ValueError):
+        toilets_along_route_bind(params)
@@ -0,0 +1,60 @@
+"""Tests for db.routing.ReplicaSet health checks."""
+import time
+from contextlib import contextmanager
+
+from sqlalchemy.exc import OperationalError
+
+from db.routing import ReplicaSet
+
+
+class _Result:
+    def __init__(self, value):
+        self._value = value
+
+    def scalar_one(self):
+        return self._value
+
+
+class _Engine:
+    """Replica stub: answers the lag query after delay seconds, or fails."""
+
+    def __init__(self, lag=0.0, delay=0.0, down=False):
+        self.lag = lag
+        self.delay = delay
+        self.down = down
+
+    @contextmanager
+    def connect(self):
+        time.sleep(self.delay)
+        if self.down:
+            raise OperationalError("connect", {}, Exception("connection timed out"))
+        yield self
+
+    def execute(self, statement):
+        return _Result(self.lag)
+
+
+def test_checks_do_not_block_choose():
+    slow, ok = _Engine(delay=0.5, down=True), _Engine()
+    replicas = ReplicaSet([slow, ok], check_interval=60)
+    started = time.monotonic()
+    # Unchecked replicas get no reads: the first choice is the primary
+    assert replicas.choose() is None
+    assert time.monotonic() - started < 0.2
+
+    for _ in range(100):
+        if replicas.status[1].lag_seconds is not None:
+            break
+        time.sleep(0.01)
+    assert [replicas.choose() for _ in range(3)] == [ok, ok, ok]
+    assert time.monotonic() - started < 0.5
+
+
+def test_skips_down_and_lagging_replicas():
+    down, lagging, ok = _Engine(down=True), _Engine(lag=120), _Engine(lag=1)
+    replicas = ReplicaSet([down, lagging, ok], max_lag_seconds=30)
+    for thread in replicas._refresh_due():
+        thread.join()
+    assert [status.healthy for status in replicas.status] == [False, False, True]
+    assert replicas.status[1].error == "lagging 120.0s"
+    assert replicas.choose() is ok
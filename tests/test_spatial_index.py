@@ -0,0 +1,97 @@
+"""Tests for the write bypass and background refresh of db.spatial_index."""
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from db.models import ToiletsInViewParams  # noqa: E402
+from db.spatial_index import RefreshingSpatialIndex, ToiletSpatialIndex  # noqa: E402
+
+ZURICH = ToiletsInViewParams(min_lat=47.36, min_lng=8.53, max_lat=47.39, max_lng=8.56)
+GENEVA = ToiletsInViewParams(min_lat=46.19, min_lng=6.13, max_lat=46.22, max_lng=6.16)
+
+
+def _rows(points):
+    created_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(id=uuid.uuid4(), name="WC", lat=lat, lng=lng, address=None, accessible=None,
+                        is_free=None, type=None, status=None, notes=None, city=None, open_hours=None,
+                        country_code="CH", created_at=created_at)
+        for lat, lng in points
+    ]
+
+
+def test_written_cells_bypass_the_index():
+    index = ToiletSpatialIndex(_rows([(47.37, 8.54), (46.2, 6.14)]))
+    assert index.covers_in_view(ZURICH) and index.covers_in_view(GENEVA)
+    index.mark_written([(47.375, 8.545), (None, None)])
+    assert not index.covers_in_view(ZURICH)
+    assert index.covers_in_view(GENEVA)
+    assert not index.covers_deterministic(None)
+
+
+class _Loader:
+    """Stands in for ToiletSpatialIndex.load; blocks until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.loads = 0
+
+    def __call__(self, session, bbox=None, cell_degrees=0.05):
+        self.loads += 1
+        self.release.wait(5)
+        return ToiletSpatialIndex(_rows([(47.37, 8.54)]), cell_degrees=cell_degrees, bbox=bbox)
+
+
+@pytest.fixture
+def loader(monkeypatch):
+    loader = _Loader()
+    monkeypatch.setattr(ToiletSpatialIndex, "load", loader)
+    return loader
+
+
+def test_stale_index_is_served_while_reloading(loader):
+    holder = RefreshingSpatialIndex(nullcontext, refresh_seconds=60)
+    first = holder.get()
+    first.loaded_at -= 120
+    loader.release.clear()
+
+    started = time.monotonic()
+    assert holder.get() is first
+    assert holder.get() is first
+    assert time.monotonic() - started < 0.5
+
+    loader.release.set()
+    for _ in range(100):
+        if holder.get() is not first:
+            break
+        time.sleep(0.01)
+    assert holder.get() is not first
+    assert loader.loads == 2
+
+
+def test_writes_bypass_until_a_later_reload(loader):
+    holder = RefreshingSpatialIndex(nullcontext, refresh_seconds=60)
+    holder.get()
+    holder.mark_written([(47.375, 8.545)])
+    assert not holder.covers_in_view(ZURICH)
+
+    # A reload that started before the write may not contain it
+    loader.release.clear()
+    thread = holder.refresh_async()
+    time.sleep(0.05)
+    holder.mark_written([(46.2, 6.14)])
+    loader.release.set()
+    thread.join()
+    assert holder.covers_in_view(ZURICH)
+    assert not holder.covers_in_view(GENEVA)
+
+    holder.refresh()
+    assert holder.covers_in_view(GENEVA)